@@ -2,19 +2,36 @@
 SeracTECH-FREE Scraper Package
 
 A collection of async scrapers for UK council planning application portals.
+
+Public names are resolved lazily (PEP 562), so commands that only work on
+the shard files (export, merge, compact, ...) don't import aiohttp or
+BeautifulSoup.
 """
+import importlib
+
+_LAZY_ATTRS = {
+    'BaseScraper': '.base',
+    'IdoxScraper': '.idox',
+    'NorthgateScraper': '.northgate',
+    'PlanningDataAPIScraper': '.planning_api',
+    'Geocoder': '.geocoder',
+    'RateLimiter': '.rate_limiter',
+    'RetryConfig': '.rate_limiter',
+    'create_scraper': '.registry',
+    'load_councils': '.registry',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+    return value
+
 
-from .base import BaseScraper
-from .idox import IdoxScraper
-from .northgate import NorthgateScraper
-from .geocoder import Geocoder
-from .rate_limiter import RateLimiter, RetryConfig
-
-__all__ = [
-    'BaseScraper',
-    'IdoxScraper', 
-    'NorthgateScraper',
-    'Geocoder',
-    'RateLimiter',
-    'RetryConfig'
-]
+def __dir__():
+    return sorted(list(globals()) + __all__)
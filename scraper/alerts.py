@@ -0,0 +1,218 @@
+"""
+Saved-search alerting.
+
+Saved searches (a point + radius, keywords, or both) are kept in a grid
+index keyed by lat/lng cell. After each council is scraped, only the newly
+stored applications are matched: each one looks up the searches registered
+in its own cell, so the cost scales with new records times nearby searches
+rather than total data times total searches. Matches are appended to a
+local JSON-lines outbox for a notifier to deliver.
+
+Usage:
+    python -m scraper.alerts DIR add --id me --lat 50.80 --lng -1.09 --radius 2 --keywords "loft conversion"
+    python -m scraper.alerts DIR list
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from .search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+CELL_DEGREES = 0.1  # Grid cell size (~11km north-south)
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return math.floor(lat / CELL_DEGREES), math.floor(lng / CELL_DEGREES)
+
+
+class SavedSearch:
+    """A user's standing query."""
+
+    def __init__(self, id: str, lat: Optional[float] = None, lng: Optional[float] = None,
+                 radius_km: Optional[float] = None, keywords: str = ""):
+        self.id = id
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+        self.keywords = keywords
+        self.terms: Set[str] = set(tokenize(keywords))
+
+    @property
+    def is_spatial(self) -> bool:
+        return self.lat is not None and self.lng is not None and self.radius_km is not None
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'lat': self.lat, 'lng': self.lng,
+                'radius_km': self.radius_km, 'keywords': self.keywords}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SavedSearch':
+        return cls(data['id'], data.get('lat'), data.get('lng'), data.get('radius_km'), data.get('keywords', ''))
+
+
+class AlertEngine:
+    """
+    Matches new applications against saved searches and writes notifications.
+    """
+
+    def __init__(self, alerts_dir: str):
+        self.alerts_dir = alerts_dir
+        self.searches: Dict[str, SavedSearch] = {}
+        self._grid: Dict[Tuple[int, int], List[SavedSearch]] = {}
+        self._keyword_only: List[SavedSearch] = []
+        self._load()
+
+    @property
+    def searches_path(self) -> str:
+        return os.path.join(self.alerts_dir, 'searches.json')
+
+    @property
+    def outbox_path(self) -> str:
+        return os.path.join(self.alerts_dir, 'outbox.jsonl')
+
+    def _load(self):
+        if os.path.exists(self.searches_path):
+            with open(self.searches_path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    self._register(SavedSearch.from_dict(data))
+
+    def save(self):
+        os.makedirs(self.alerts_dir, exist_ok=True)
+        with open(self.searches_path, 'w', encoding='utf-8') as f:
+            json.dump([search.to_dict() for search in self.searches.values()], f, indent=2)
+
+    def _register(self, search: SavedSearch):
+        self.searches[search.id] = search
+        if not search.is_spatial:
+            self._keyword_only.append(search)
+            return
+
+        # Register in every cell the search circle's bounding box touches
+        dlat = math.degrees(search.radius_km / EARTH_RADIUS_KM)
+        dlng = dlat / max(math.cos(math.radians(search.lat)), 1e-6)
+        min_cell = _cell(search.lat - dlat, search.lng - dlng)
+        max_cell = _cell(search.lat + dlat, search.lng + dlng)
+        for x in range(min_cell[0], max_cell[0] + 1):
+            for y in range(min_cell[1], max_cell[1] + 1):
+                self._grid.setdefault((x, y), []).append(search)
+
+    def add(self, search: SavedSearch):
+        """Add (or replace) a saved search."""
+        if search.id in self.searches:
+            self.remove(search.id)
+        self._register(search)
+
+    def remove(self, search_id: str):
+        search = self.searches.pop(search_id, None)
+        if search is None:
+            return
+        self._keyword_only = [s for s in self._keyword_only if s.id != search_id]
+        for cell, searches in list(self._grid.items()):
+            remaining = [s for s in searches if s.id != search_id]
+            if remaining:
+                self._grid[cell] = remaining
+            else:
+                del self._grid[cell]
+
+    def _candidates(self, app: Dict) -> List[SavedSearch]:
+        candidates = list(self._keyword_only)
+        lat, lng = app.get('lat'), app.get('lng')
+        if lat and lng and app.get('geo_precision') != 'none':
+            candidates.extend(self._grid.get(_cell(lat, lng), ()))
+        return candidates
+
+    def match(self, apps: List[Dict], council: str = "") -> List[Dict]:
+        """Return notification records for the applications that match."""
+        notifications = []
+        now = datetime.now().isoformat(timespec='seconds')
+
+        for app in apps:
+            candidates = self._candidates(app)
+            if not candidates:
+                continue
+            terms = set(tokenize(f"{app.get('desc', '')} {app.get('addr', '')}"))
+
+            for search in candidates:
+                distance = None
+                if search.is_spatial:
+                    distance = haversine_km(search.lat, search.lng, app['lat'], app['lng'])
+                    if distance > search.radius_km:
+                        continue
+                if not search.terms <= terms:
+                    continue
+
+                notifications.append({
+                    'search': search.id,
+                    'council': council,
+                    'id': app.get('id'),
+                    'desc': app.get('desc'),
+                    'addr': app.get('addr'),
+                    'link': app.get('link'),
+                    'distance_km': round(distance, 2) if distance is not None else None,
+                    'matched_at': now,
+                })
+
+        return notifications
+
+    def process(self, apps: List[Dict], council: str = "") -> int:
+        """Match new applications and append any notifications to the outbox."""
+        if not self.searches or not apps:
+            return 0
+
+        notifications = self.match(apps, council)
+        if notifications:
+            os.makedirs(self.alerts_dir, exist_ok=True)
+            with open(self.outbox_path, 'a', encoding='utf-8') as f:
+                for notification in notifications:
+                    f.write(json.dumps(notification, separators=(',', ':')) + '\n')
+            logger.info(f"Queued {len(notifications)} alert notifications for {council}")
+        return len(notifications)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage saved-search alerts")
+    parser.add_argument('alerts_dir')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="Add or replace a saved search")
+    add.add_argument('--id', required=True)
+    add.add_argument('--lat', type=float)
+    add.add_argument('--lng', type=float)
+    add.add_argument('--radius', type=float, help="Radius in km")
+    add.add_argument('--keywords', default="")
+
+    remove = commands.add_parser('remove', help="Remove a saved search")
+    remove.add_argument('--id', required=True)
+
+    commands.add_parser('list', help="List saved searches")
+
+    args = parser.parse_args(argv)
+    engine = AlertEngine(args.alerts_dir)
+
+    if args.command == 'add':
+        engine.add(SavedSearch(args.id, args.lat, args.lng, args.radius, args.keywords))
+        engine.save()
+    elif args.command == 'remove':
+        engine.remove(args.id)
+        engine.save()
+    else:
+        for search in engine.searches.values():
+            print(json.dumps(search.to_dict()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
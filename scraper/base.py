@@ -1,32 +1,77 @@
 import aiohttp
 import asyncio
-import json
-import os
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
+from .known_ids import KnownIds
+from .page_cache import PageCache, fingerprint
+from .rate_limiter import RateLimiter
+from .sharding import council_key
+from .shards import LAYOUT_SECTOR, load_shard, save_applications
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+REQUEST_TIMEOUT = 60.0  # Seconds per request unless the registry sets request_timeout
+
 class BaseScraper(ABC):
     """
     Abstract base class for planning application scrapers.
     Implements the Strategy Pattern and handles async requests.
     """
 
-    def __init__(self, base_url: str, council_name: str):
+    # Whether records link to detail pages that DetailFetcher can enrich from
+    HAS_DETAIL_PAGES = False
+    # Whether result pages list the newest applications first
+    DATE_ORDERED = False
+
+    def __init__(self, base_url: str, council_name: str, mock_mode: bool = False):
         self.base_url = base_url
         self.council_name = council_name
+        # Return generated data instead of scraping (SCRAPER_MOCK_MODE)
+        self.mock_mode = mock_mode
         self.session: Optional[aiohttp.ClientSession] = None
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # Registry options (see configure)
+        self.parser = 'html.parser'
+        self.concurrency = 1
+        self.request_timeout = REQUEST_TIMEOUT
+        # Set when the portal could not be scraped (see scraper.health)
+        self.failed = False
+        # Per-council state kept in _metadata.json between runs
+        self.state: Dict = {}
+        # Ids scraped on earlier runs (see _page_is_known)
+        self.known_ids: Optional[KnownIds] = None
+        # Parsed rows of previously seen results pages (see _parse_page)
+        self.page_cache: Optional[PageCache] = None
+        self.date_ordered = self.DATE_ORDERED
+        # Set while iter_applications is consuming pages (see _emit_page)
+        self._page_queue: Optional[asyncio.Queue] = None
+        self._emitted = 0  # Records streamed by the current iter_applications
+
+    @classmethod
+    def from_config(cls, council: Dict, mock_mode: bool = False) -> 'BaseScraper':
+        """Construct a scraper from a council registry entry."""
+        return cls(council.get('url', ''), council['name'], mock_mode=mock_mode)
+
+    def configure(self, council: Dict):
+        """
+        Apply per-council registry options: rate_limit ({rate, burst}),
+        concurrency (requests in flight to the portal) and parser (the
+        BeautifulSoup backend, e.g. "lxml") and request_timeout (seconds).
+        """
+        if council.get('rate_limit'):
+            self.rate_limiter = RateLimiter(**council['rate_limit'])
+        self.concurrency = max(1, int(council.get('concurrency', self.concurrency)))
+        self.parser = council.get('parser') or self.parser
+        self.request_timeout = float(council.get('request_timeout', self.request_timeout))
+        self.date_ordered = bool(council.get('date_ordered', self.date_ordered))
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers=self.headers)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        self.session = aiohttp.ClientSession(headers=self.headers, timeout=timeout)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -38,21 +83,121 @@ class BaseScraper(ABC):
         """
         Fetch planning applications for a given date range.
         Must be implemented by concrete classes (Idox, Northgate, etc.).
+        Pages handed on by _emit_page are not kept, so while streaming only
+        the records that weren't emitted are returned.
         """
         pass
 
+    @property
+    def probe_url(self) -> str:
+        """A cheap page that shows whether the portal is up."""
+        return self.base_url
+
+    async def probe(self, timeout: float) -> bool:
+        """Single short request used by the circuit breaker's half-open state."""
+        try:
+            async with self.session.get(self.probe_url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                return response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.info(f"Probe of {self.probe_url} failed: {e!r}")
+            return False
+
+    def detail_urls(self, app: Dict) -> List[str]:
+        """Detail pages to fetch for a record (see scraper.details)."""
+        return [app['link']] if app.get('link') else []
+
+    def parse_results(self, html: str) -> List[Dict]:
+        """Extract application rows from a results page."""
+        raise NotImplementedError
+
+    def _parse_page(self, html: str) -> List[Dict]:
+        """parse_results, skipped when the same page was parsed before."""
+        if self.page_cache is None:
+            return self.parse_results(html)
+        key = fingerprint(self.base_url, html)
+        rows = self.page_cache.get(key)
+        if rows is None:
+            rows = self.parse_results(html)
+            if rows:
+                self.page_cache.put(key, rows)
+        return rows
+
+    def _page_is_known(self, apps: List[Dict]) -> bool:
+        """
+        True when every record on a newest-first results page was scraped on
+        an earlier run, so the remaining pages can only hold older ones.
+        """
+        if not self.date_ordered or not self.known_ids or not apps:
+            return False
+        if all(app.get('id') in self.known_ids for app in apps):
+            logger.info(f"{self.council_name}: page already known, stopping pagination")
+            return True
+        return False
+
+    async def _emit_page(self, apps: List[Dict]) -> bool:
+        """
+        Hand a freshly parsed results page to iter_applications, if streaming.
+        Blocks while the downstream queue is full, which applies backpressure
+        to the scraper. Returns whether the page went downstream; if so the
+        scraper should not keep it.
+        """
+        if self._page_queue is None:
+            return False
+        if apps:
+            self._emitted += len(apps)
+            await self._page_queue.put(apps)
+        return True
+
+    async def iter_applications(self, start_date: str, end_date: str, max_pending: int = 2) -> AsyncIterator[List[Dict]]:
+        """
+        Yield applications in batches as they are scraped.
+
+        Scrapers that call _emit_page stream each results page as soon as it
+        is parsed; whatever fetch_applications returns (records it did not
+        emit: mock data, fallbacks) is yielded once it completes.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._page_queue = queue
+        self._emitted = 0
+        task = asyncio.ensure_future(self.fetch_applications(start_date, end_date))
+        getter: Optional[asyncio.Future] = None
+
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                break
+
+            while not queue.empty():
+                yield queue.get_nowait()
+
+            remaining = task.result() or []
+            if remaining and self.failed:
+                # Placeholder data returned after an error is not worth saving
+                logger.warning(f"Discarding {len(remaining)} fallback records from failed scrape of {self.council_name}")
+            elif remaining:
+                yield remaining
+        finally:
+            if getter is not None and not getter.done():
+                getter.cancel()
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            self._page_queue = None
+
     async def get_existing_data(self, filepath: str) -> List[Dict]:
         """
         Load existing JSON data to support incremental scraping.
+        Read in a worker thread; a missing or corrupt file gives [].
         """
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                logger.warning(f"Corrupt JSON found at {filepath}. Starting fresh.")
-                return []
-        return []
+        return await asyncio.to_thread(load_shard, filepath)
 
     def get_latest_date(self, data: List[Dict]) -> Optional[str]:
         """
@@ -68,62 +213,17 @@ class BaseScraper(ABC):
             
         return max(dates)
 
-    def save_data(self, data: List[Dict], output_dir: str = "data"):
+    def save_data(self, data: List[Dict], output_dir: str = "data", compact: bool = False,
+                  layout: str = LAYOUT_SECTOR, index=None) -> List[Dict]:
         """
         Save data to minified JSON files, sharded by Postcode Sector.
+        With layout='monthly' each sector is split into monthly partitions.
+        With compact=True, pre-compressed and columnar siblings are written too.
+        With an IdIndex, records that changed sector are moved, not duplicated.
+        Returns the applications that were not already stored.
         """
-        # Group by Postcode Sector (e.g., PO1, PO2)
-        shards = {}
-        
-        for app in data:
-            postcode = app.get('postcode')
-            if not postcode:
-                continue
-            
-            # Extract sector: "PO1 2AB" -> "PO1"
-            # Simple logic: Split by space, take first part. 
-            # Better logic might be needed for complex UK postcodes, but this works for standard ones.
-            sector = postcode.split(' ')[0]
-            
-            # Create area folder (e.g., PO)
-            area = sector[:2] # "PO"
-            if area.isdigit(): # Handle cases like "W1" -> "W"
-                 area = sector[:1]
-
-            if sector not in shards:
-                shards[sector] = []
-            shards[sector].append(app)
-
-        # Write shards to disk
-        for sector, apps in shards.items():
-            area = sector[:2]
-            if area[1].isdigit():
-                area = area[0]
-                
-            sector_dir = os.path.join(output_dir, area)
-            os.makedirs(sector_dir, exist_ok=True)
-            
-            filepath = os.path.join(sector_dir, f"{sector}.json")
-            
-            # Merge with existing data if file exists (to avoid overwriting history)
-            existing_apps = []
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    try:
-                        existing_apps = json.load(f)
-                    except:
-                        pass
-            
-            # Deduplicate based on ID
-            existing_ids = {app['id'] for app in existing_apps}
-            new_apps = [app for app in apps if app['id'] not in existing_ids]
-            
-            combined_apps = existing_apps + new_apps
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(combined_apps, f, separators=(',', ':')) # Minified
-            
-            logger.info(f"Saved {len(new_apps)} new applications to {filepath}")
+        return save_applications(data, output_dir, compact=compact, layout=layout,
+                                 index=index, council=council_key(self.council_name))
 
     async def run(self):
         """
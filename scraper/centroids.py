@@ -0,0 +1,129 @@
+"""
+Local postcode centroid table used as a geocoding fallback.
+
+Averages the coordinates of already geocoded applications per postcode
+sector ("PO1 2") and district ("PO1"), so records whose postcode is missing,
+partial or unknown to postcodes.io can still be placed without a network call.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .shards import iter_shards, load_shard, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Precision tiers for the geo_precision field, most precise first
+PRECISION_ADDRESS = 'address'    # Coordinates supplied by the source
+PRECISION_POSTCODE = 'postcode'  # Full postcode geocoded by postcodes.io
+PRECISION_SECTOR = 'sector'      # Centroid of the postcode sector, e.g. "PO1 2"
+PRECISION_DISTRICT = 'district'  # Centroid of the outward code, e.g. "PO1"
+PRECISION_NONE = 'none'
+
+# Records whose points the table is built from: source and postcode
+# coordinates, and legacy records that predate geo_precision. Centroid
+# fallbacks are left out so the table doesn't feed on itself.
+_SOURCE_PRECISIONS = {PRECISION_ADDRESS, PRECISION_POSTCODE, None}
+
+# Postcodes older scrapes filed records under when the address was unknown;
+# their points are fake and never counted
+PLACEHOLDER_POSTCODES = {'DN1 1AA'}
+
+
+def split_postcode(postcode: str) -> Tuple[str, str]:
+    """
+    Return (district, sector) keys for a postcode.
+    "PO1 2AB" -> ("PO1", "PO1 2"); "DN1" -> ("DN1", "").
+    """
+    compact = postcode.upper().replace(" ", "")
+    if len(compact) < 5:
+        # Outward code only
+        return compact, ""
+    outward, inward = compact[:-3], compact[-3:]
+    return outward, f"{outward} {inward[0]}"
+
+
+class CentroidTable:
+    """
+    Running mean of coordinates per postcode district and sector.
+    """
+
+    def __init__(self):
+        # key -> [lat, lng, count]
+        self._districts: Dict[str, List[float]] = {}
+        self._sectors: Dict[str, List[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._districts) + len(self._sectors)
+
+    def add(self, postcode: str, lat: float, lng: float):
+        """Fold a geocoded point into its district and sector centroids."""
+        if not postcode or not lat or not lng or postcode.upper() in PLACEHOLDER_POSTCODES:
+            return
+
+        district, sector = split_postcode(postcode)
+        for table, key in ((self._districts, district), (self._sectors, sector)):
+            if not key:
+                continue
+            entry = table.setdefault(key, [0.0, 0.0, 0])
+            entry[2] += 1
+            entry[0] += (lat - entry[0]) / entry[2]
+            entry[1] += (lng - entry[1]) / entry[2]
+
+    def lookup(self, postcode: str) -> Optional[Tuple[float, float, str]]:
+        """
+        Return (lat, lng, precision) for the most precise centroid known,
+        or None.
+        """
+        if not postcode:
+            return None
+
+        district, sector = split_postcode(postcode)
+        if sector in self._sectors:
+            lat, lng, _ = self._sectors[sector]
+            return lat, lng, PRECISION_SECTOR
+        if district in self._districts:
+            lat, lng, _ = self._districts[district]
+            return lat, lng, PRECISION_DISTRICT
+        return None
+
+    @classmethod
+    def build(cls, output_dir: str) -> 'CentroidTable':
+        """
+        Build the table from the geocoded records in the existing shards.
+        Records without coordinates or on a placeholder postcode are skipped
+        (see add).
+        """
+        table = cls()
+        for _, filepath in iter_shards(output_dir):
+            for app in load_shard(filepath):
+                if app.get('geo_precision') in _SOURCE_PRECISIONS:
+                    table.add(app.get('postcode', ''), app.get('lat', 0), app.get('lng', 0))
+        logger.info(f"Built centroid table with {len(table)} entries from {output_dir}")
+        return table
+
+    @classmethod
+    def load(cls, path: str) -> Optional['CentroidTable']:
+        """Load a saved table, or None if it is missing or unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            logger.warning(f"Could not read centroid table {path}")
+            return None
+
+        table = cls()
+        table._districts = data.get('district', {})
+        table._sectors = data.get('sector', {})
+        return table
+
+    def save(self, path: str):
+        """Save the table as minified JSON."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        write_atomic(path, json.dumps({
+            'district': {k: [round(v[0], 6), round(v[1], 6), v[2]] for k, v in self._districts.items()},
+            'sector': {k: [round(v[0], 6), round(v[1], 6), v[2]] for k, v in self._sectors.items()},
+        }, separators=(',', ':')).encode('utf-8'))
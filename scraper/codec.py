@@ -0,0 +1,207 @@
+"""
+JSON codec for shards, metadata and API payloads.
+
+Encoding and decoding go through the fastest backend installed: orjson,
+then msgspec, then the stdlib json module. All three produce the same
+bytes for the data written here (UTF-8, no escaping of non-ASCII, compact
+separators or a 2-space indent), so sealed partition hashes don't depend
+on which one a worker had. SCRAPER_JSON_CODEC=json|orjson|msgspec pins one.
+
+Shards are checked against the Application record schema. With msgspec a
+typed decode validates them; records are still returned as parsed, with
+their keys in file order, so a rewrite doesn't reorder them. Other backends
+only check the records' shape.
+
+Benchmark the backends over a shard tree with:
+
+    python -m scraper.codec public/data --repeat 5
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Optional dependency
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+Number = Union[int, float]
+
+
+class Application(TypedDict, total=False):
+    """
+    A stored application record. Shards with fields not listed here still
+    load, but skip msgspec's typed decoding, so add new fields here too.
+    """
+    id: Union[str, int]
+    desc: Optional[str]
+    addr: Optional[str]
+    postcode: Optional[str]
+    lat: Optional[Number]
+    lng: Optional[Number]
+    geo_precision: Optional[str]
+    date_received: Optional[str]
+    date_validated: Optional[str]
+    date_decided: Optional[str]
+    status: Optional[str]
+    decision: Optional[str]
+    case_officer: Optional[str]
+    link: Optional[str]
+
+
+class JsonCodec:
+    """The stdlib json module; always available."""
+
+    name = 'json'
+
+    def dumps(self, obj: Any, indent: bool = False) -> bytes:
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+    def decode_applications(self, data: Union[bytes, str]) -> List[Application]:
+        return check_applications(self.loads(data))
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def dumps(self, obj: Any, indent: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    name = 'msgspec'
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+        # A TypedDict would silently drop unknown fields; a strict Struct rejects them
+        fields = [
+            (name, kind) if name == 'id' else (name, Union[kind, msgspec.UnsetType], msgspec.UNSET)
+            for name, kind in Application.__annotations__.items()
+        ]
+        record = msgspec.defstruct('ApplicationRecord', fields, forbid_unknown_fields=True, omit_defaults=True)
+        self._applications = msgspec.json.Decoder(List[record])
+
+    def dumps(self, obj: Any, indent: bool = False) -> bytes:
+        payload = self._encoder.encode(obj)
+        return msgspec.json.format(payload, indent=2) if indent else payload
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._decoder.decode(data)
+
+    def decode_applications(self, data: Union[bytes, str]) -> List[Application]:
+        # The struct only validates: it would return keys in schema order
+        try:
+            self._applications.decode(data)
+        except msgspec.ValidationError as e:
+            # Valid JSON off the schema: keep every record as it is
+            logger.debug(f"Shard doesn't match the record schema ({e})")
+        return check_applications(self.loads(data))
+
+
+CODECS = {'json': JsonCodec}
+if msgspec is not None:
+    CODECS['msgspec'] = MsgspecCodec
+if orjson is not None:
+    CODECS['orjson'] = OrjsonCodec
+
+PREFERENCE = ('orjson', 'msgspec', 'json')
+
+
+def check_applications(data: Any) -> List[Application]:
+    """Reject decoded JSON that isn't a list of records with ids."""
+    if not isinstance(data, list) or not all(isinstance(app, dict) and 'id' in app for app in data):
+        raise ValueError("Expected a list of application records")
+    return data
+
+
+def get_codec(name: Optional[str] = None) -> JsonCodec:
+    """A codec by name, or the preferred installed one."""
+    if name:
+        if name not in CODECS:
+            raise KeyError(f"JSON codec '{name}' is not installed (available: {', '.join(sorted(CODECS))})")
+        return CODECS[name]()
+    return CODECS[next(choice for choice in PREFERENCE if choice in CODECS)]()
+
+
+codec = get_codec(os.environ.get('SCRAPER_JSON_CODEC') or None)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode to UTF-8 JSON: compact, or with a 2-space indent."""
+    return codec.dumps(obj, indent)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON. Errors are ValueErrors whichever backend is in use."""
+    return codec.loads(data)
+
+
+def decode_applications(data: Union[bytes, str]) -> List[Application]:
+    """Decode a shard's records, checked against the Application schema."""
+    return codec.decode_applications(data)
+
+
+def benchmark(output_dir: str, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Time decoding and re-encoding every flat shard under output_dir with
+    each installed backend. Returns {backend: {'decode': s, 'encode': s}},
+    best of `repeat` passes.
+    """
+    # Imported here as shards depends on this module
+    from .shards import iter_shards
+
+    payloads = []
+    for _, filepath in iter_shards(output_dir):
+        with open(filepath, 'rb') as f:
+            payloads.append(f.read())
+    size = sum(len(payload) for payload in payloads)
+    logger.info(f"Benchmarking {len(payloads)} shards ({size / 1024 / 1024:.1f} MB)")
+
+    results = {}
+    for name in sorted(CODECS):
+        backend = get_codec(name)
+        decode = encode = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            decoded = [backend.decode_applications(payload) for payload in payloads]
+            decode = min(decode, time.perf_counter() - started)
+            started = time.perf_counter()
+            for records in decoded:
+                backend.dumps(records)
+            encode = min(encode, time.perf_counter() - started)
+        results[name] = {'decode': decode, 'encode': encode}
+        mb_per_s = size / 1024 / 1024 / max(decode + encode, 1e-9)
+        logger.info(f"{name:8} decode {decode * 1000:8.1f} ms  encode {encode * 1000:8.1f} ms  ({mb_per_s:.0f} MB/s)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the JSON backends over a shard tree")
+    parser.add_argument('output_dir', nargs='?', default=os.environ.get('SCRAPER_OUTPUT_DIR', 'public/data'))
+    parser.add_argument('--repeat', type=int, default=3, help="Passes per backend; the best is reported")
+    args = parser.parse_args(argv)
+    return benchmark(args.output_dir, args.repeat)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main()
@@ -0,0 +1,239 @@
+"""
+Compact shard output.
+
+Alongside each minified SECTOR.json shard this can write:
+  - SECTOR.json.gz / SECTOR.json.br   pre-compressed copies for static hosting
+  - SECTOR.col.json (+ .gz / .br)     a columnar encoding of the same records
+
+The columnar encoding stores one list per field instead of one object per
+record. Repetitive strings (status, postcode) are dictionary coded,
+coordinates are fixed-point integers (1e-6 degrees, so they round-trip
+rounded to 6 decimal places, about 0.1m) and dates are day deltas from the
+previous record, which compresses far better than the row format.
+Brotli output is only written when the `brotli` package is installed.
+"""
+import gzip
+import logging
+import os
+import sys
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+from . import codec
+from .shards import iter_shards, load_shard, write_atomic
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+COORD_SCALE = 1_000_000
+
+# How each known field is encoded; anything else is stored as-is
+FIELD_ENCODINGS = {
+    'status': 'dict',
+    'postcode': 'dict',
+    'geo_precision': 'dict',
+    'lat': 'fixed',
+    'lng': 'fixed',
+    'date_received': 'date',
+}
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _to_days(value) -> Optional[int]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+    # Only canonical dates round-trip exactly
+    if parsed.isoformat() != value:
+        return None
+    return (parsed - _EPOCH).days
+
+
+def _from_days(days: int) -> str:
+    return date.fromordinal(_EPOCH.toordinal() + days).isoformat()
+
+
+def encode_columnar(apps: List[Dict]) -> Dict:
+    """
+    Encode a list of application records into the columnar format.
+    """
+    fields: List[str] = []
+    seen = set()
+    for app in apps:
+        for key in app:
+            if key not in seen:
+                seen.add(key)
+                fields.append(key)
+
+    schema = {field: FIELD_ENCODINGS.get(field, 'plain') for field in fields}
+    columns: Dict[str, List] = {}
+    dictionaries: Dict[str, List] = {}
+    absent: Dict[str, List[int]] = {}
+    raw: Dict[str, Dict[str, object]] = {}
+
+    for field, encoding in schema.items():
+        values = []
+        lookup: Dict[str, int] = {}
+        previous_days = 0
+
+        for index, app in enumerate(apps):
+            if field not in app:
+                absent.setdefault(field, []).append(index)
+                values.append(None)
+                continue
+
+            value = app[field]
+
+            if encoding == 'dict' and isinstance(value, str):
+                if value not in lookup:
+                    lookup[value] = len(lookup)
+                values.append(lookup[value])
+            elif encoding == 'fixed' and isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.append(round(value * COORD_SCALE))
+            elif encoding == 'date' and _to_days(value) is not None:
+                days = _to_days(value)
+                values.append(days - previous_days)
+                previous_days = days
+            elif encoding == 'plain':
+                values.append(value)
+            else:
+                # Doesn't fit the column's encoding; keep the original value
+                raw.setdefault(field, {})[str(index)] = value
+                values.append(None)
+
+        columns[field] = values
+        if encoding == 'dict':
+            dictionaries[field] = list(lookup)
+
+    doc = {
+        'v': FORMAT_VERSION,
+        'n': len(apps),
+        'schema': schema,
+        'cols': columns,
+        'dict': dictionaries,
+    }
+    if absent:
+        doc['absent'] = absent
+    if raw:
+        doc['raw'] = raw
+    return doc
+
+
+def decode_columnar(doc: Dict) -> List[Dict]:
+    """
+    Decode a columnar document back into a list of application records.
+    """
+    if doc.get('v') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar format version: {doc.get('v')}")
+
+    count = doc['n']
+    apps: List[Dict] = [{} for _ in range(count)]
+    absent = {field: set(indexes) for field, indexes in doc.get('absent', {}).items()}
+    raw = doc.get('raw', {})
+
+    for field, encoding in doc['schema'].items():
+        values = doc['cols'][field]
+        missing = absent.get(field, set())
+        overrides = raw.get(field, {})
+        dictionary = doc.get('dict', {}).get(field, [])
+        days = 0
+
+        for index in range(count):
+            if index in missing:
+                continue
+            if str(index) in overrides:
+                apps[index][field] = overrides[str(index)]
+                continue
+
+            value = values[index]
+            if encoding == 'dict':
+                apps[index][field] = dictionary[value]
+            elif encoding == 'fixed':
+                apps[index][field] = value / COORD_SCALE
+            elif encoding == 'date':
+                days += value
+                apps[index][field] = _from_days(days)
+            else:
+                apps[index][field] = value
+
+    return apps
+
+
+def write_compressed(filepath: str, payload: bytes):
+    """
+    Write pre-compressed .gz (and .br, if available) siblings of a file.
+    mtime=0 keeps the gzip output byte-identical when content is unchanged.
+    """
+    write_atomic(f"{filepath}.gz", gzip.compress(payload, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_atomic(f"{filepath}.br", brotli.compress(payload, quality=11))
+
+
+def columnar_path(filepath: str) -> str:
+    """Columnar sibling of a shard: PO/PO1.json -> PO/PO1.col.json"""
+    base, _ = os.path.splitext(filepath)
+    return f"{base}.col.json"
+
+
+def write_compact(filepath: str, apps: List[Dict]):
+    """
+    Write all compact siblings for the shard at `filepath`.
+    """
+    minified = codec.dumps(apps)
+    write_compressed(filepath, minified)
+
+    col_path = columnar_path(filepath)
+    columnar = codec.dumps(encode_columnar(apps))
+    write_atomic(col_path, columnar)
+    write_compressed(col_path, columnar)
+
+
+def read_compact(filepath: str) -> List[Dict]:
+    """
+    Read records from any shard representation: SECTOR.json, SECTOR.col.json,
+    or either of those with a .gz / .br suffix.
+    """
+    with open(filepath, 'rb') as f:
+        payload = f.read()
+
+    name = filepath
+    if name.endswith('.gz'):
+        payload = gzip.decompress(payload)
+        name = name[:-len('.gz')]
+    elif name.endswith('.br'):
+        if brotli is None:
+            raise RuntimeError("Reading .br files requires the 'brotli' package")
+        payload = brotli.decompress(payload)
+        name = name[:-len('.br')]
+
+    data = codec.loads(payload)
+    if name.endswith('.col.json'):
+        return decode_columnar(data)
+    return data
+
+
+def write_compact_tree(output_dir: str) -> int:
+    """
+    (Re)write compact siblings for every shard under output_dir.
+    Returns the number of shards processed.
+    """
+    count = 0
+    for _, filepath in iter_shards(output_dir):
+        write_compact(filepath, load_shard(filepath))
+        count += 1
+    logger.info(f"Wrote compact output for {count} shards in {output_dir}")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    write_compact_tree(sys.argv[1] if len(sys.argv) > 1 else 'public/data')
@@ -0,0 +1,197 @@
+"""
+Detail-page enrichment for list-based scrapers.
+
+Idox and Northgate result lists carry little more than the reference,
+address and description. DetailFetcher follows each record's link to fill in
+the status, decision, key dates and case officer, with a bounded number of
+requests in flight per host.
+
+Fetched details are cached per council in {output_dir}/_details/ together
+with a hash of the list row they came from. On later runs a record whose row
+hasn't changed gets the cached fields back without a request, unless it is
+still undecided and its details are older than REFRESH_DAYS. Refreshed
+fields reach records that are already stored through shards.refresh_record
+(or the store's upsert).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+from .shards import write_atomic
+
+logger = logging.getLogger(__name__)
+
+REFRESH_DAYS = 7  # Re-fetch undecided applications whose details are older than this
+
+# Detail page labels (lower case, without trailing colons) -> record fields
+LABELS = {
+    'status': 'status',
+    'application status': 'status',
+    'decision': 'decision',
+    'decision issued date': 'date_decided',
+    'decision date': 'date_decided',
+    'date of decision': 'date_decided',
+    'application received': 'date_received',
+    'date received': 'date_received',
+    'received date': 'date_received',
+    'application registered': 'date_received',
+    'application validated': 'date_validated',
+    'date valid': 'date_validated',
+    'valid date': 'date_validated',
+    'validated date': 'date_validated',
+    'case officer': 'case_officer',
+    'planning officer': 'case_officer',
+}
+DATE_FIELDS = ('date_received', 'date_validated', 'date_decided')
+_DATE_FORMATS = ('%a %d %b %Y', '%d %b %Y', '%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y')
+
+
+def row_hash(app: Dict) -> str:
+    """Hash of the list-row fields; a change means the details may have too."""
+    row = [app.get(key) for key in ('id', 'desc', 'addr', 'link', 'status')]
+    return hashlib.sha1(json.dumps(row).encode('utf-8')).hexdigest()[:16]
+
+
+def _iso_date(text: str) -> Optional[str]:
+    text = re.sub(r'\s+', ' ', text).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def parse_detail_page(html: str, parser: str = 'html.parser') -> Dict[str, str]:
+    """
+    Pull the known fields out of a detail page. Handles the label/value
+    layouts both portals use: <th>/<td> rows, <dt>/<dd> lists and
+    <span>Label</span> value items.
+    """
+    soup = BeautifulSoup(html, parser)
+    pairs: List[Tuple[str, str]] = []
+
+    for row in soup.find_all('tr'):
+        th, td = row.find('th'), row.find('td')
+        if th and td:
+            pairs.append((th.get_text(' ', strip=True), td.get_text(' ', strip=True)))
+    for dt in soup.find_all('dt'):
+        dd = dt.find_next_sibling('dd')
+        if dd:
+            pairs.append((dt.get_text(' ', strip=True), dd.get_text(' ', strip=True)))
+    for span in soup.find_all('span'):
+        if span.parent is not None and span.parent.name in ('li', 'div'):
+            label = span.get_text(' ', strip=True)
+            value = span.parent.get_text(' ', strip=True)
+            if value.startswith(label):
+                pairs.append((label, value[len(label):].strip()))
+
+    fields: Dict[str, str] = {}
+    for label, value in pairs:
+        field = LABELS.get(label.lower().rstrip(':').strip())
+        if not field or not value or field in fields:
+            continue
+        if field in DATE_FIELDS:
+            value = _iso_date(value)
+            if not value:
+                continue
+        fields[field] = value
+    return fields
+
+
+class DetailFetcher:
+    """
+    Enriches a scraper's records from their detail pages, reusing cached
+    details for rows that haven't changed.
+    """
+
+    def __init__(self, scraper, cache: Optional[Dict[str, Dict]] = None,
+                 per_host: Optional[int] = None, refresh_days: int = REFRESH_DAYS):
+        self.scraper = scraper
+        self.cache = cache if cache is not None else {}
+        self.per_host = per_host or scraper.concurrency
+        self.refresh_days = refresh_days
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self.fetched = 0
+        self.reused = 0
+
+    @classmethod
+    def load(cls, scraper, path: str, **kwargs) -> 'DetailFetcher':
+        cache = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable detail cache {path}: {e}")
+        return cls(scraper, cache, **kwargs)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, json.dumps(self.cache, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    def _is_current(self, entry: Dict, digest: str) -> bool:
+        if entry.get('hash') != digest:
+            return False
+        if entry['fields'].get('decision') or entry['fields'].get('date_decided'):
+            return True  # Decided applications don't change
+        fetched = date.fromisoformat(entry['fetched'])
+        return (date.today() - fetched).days < self.refresh_days
+
+    async def _fetch(self, app: Dict) -> Optional[Dict]:
+        fields: Dict[str, str] = {}
+        for url in self.scraper.detail_urls(app):
+            async with self._slot(url):
+                await self.scraper.rate_limiter.acquire()
+                try:
+                    async with self.scraper.session.get(url) as response:
+                        if response.status != 200:
+                            logger.debug(f"Detail page {url} returned {response.status}")
+                            return None
+                        html = await response.text()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.debug(f"Detail page {url} failed: {e}")
+                    return None
+            fields.update(parse_detail_page(html, self.scraper.parser))
+        return fields
+
+    async def enrich(self, apps: List[Dict]) -> List[Dict]:
+        """Add detail fields to apps in place and return them."""
+        pending = []
+        for app in apps:
+            link = app.get('link')
+            if not link:
+                continue
+            digest = row_hash(app)
+            entry = self.cache.get(link)
+            if entry and self._is_current(entry, digest):
+                app.update(entry['fields'])
+                self.reused += 1
+            else:
+                pending.append((app, digest))
+
+        results = await asyncio.gather(*(self._fetch(app) for app, _ in pending))
+
+        today = date.today().isoformat()
+        for (app, digest), fields in zip(pending, results):
+            if fields is None:
+                continue
+            self.cache[app['link']] = {'hash': digest, 'fetched': today, 'fields': fields}
+            app.update(fields)
+            self.fetched += 1
+        return apps
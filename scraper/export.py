@@ -0,0 +1,61 @@
+"""
+Static export step.
+
+Regenerates the published JSON shards from the SQLite application store.
+Only sectors changed since the last export are rewritten unless --all is given.
+Derived static indexes (--search, --tiles) are rebuilt from the exported shards.
+
+Usage:
+    python -m scraper.export --store .cache/scraper/applications.sqlite --output public/data
+    python -m scraper.export --output public/data --search --tiles
+"""
+import argparse
+import logging
+import os
+
+from .shards import LAYOUT_MONTHLY, LAYOUT_SECTOR
+from .search_index import build_index
+from .store import ApplicationStore
+from .tiles import build_tiles
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Export the application store to static shards")
+    parser.add_argument('--store', default=os.environ.get('SCRAPER_STORE', ''),
+                        help="Path to the SQLite store (default: $SCRAPER_STORE)")
+    parser.add_argument('--output', default=os.environ.get('SCRAPER_OUTPUT_DIR', 'public/data'),
+                        help="Shard output directory (default: $SCRAPER_OUTPUT_DIR)")
+    parser.add_argument('--layout', choices=[LAYOUT_SECTOR, LAYOUT_MONTHLY],
+                        default=os.environ.get('SCRAPER_SHARD_LAYOUT', LAYOUT_SECTOR))
+    parser.add_argument('--compact', action='store_true',
+                        help="Also write compressed and columnar siblings")
+    parser.add_argument('--all', action='store_true', help="Export every sector, not just changed ones")
+    parser.add_argument('--search', action='store_true', help="Rebuild the full-text search index")
+    parser.add_argument('--tiles', action='store_true', help="Rebuild the map tile pyramid")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.store or args.search or args.tiles):
+        raise SystemExit("Nothing to do (use --store/SCRAPER_STORE, --search or --tiles)")
+
+    exported = {}
+    if args.store:
+        with ApplicationStore(args.store) as store:
+            exported = store.export(args.output, layout=args.layout, compact=args.compact, everything=args.all)
+
+    if args.search:
+        build_index(args.output)
+
+    if args.tiles:
+        build_tiles(args.output)
+
+    return exported
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
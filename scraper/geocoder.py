@@ -5,10 +5,23 @@ Free, no API key required, rate limited to 100 req/s.
 import aiohttp
 import asyncio
 import logging
-from typing import Dict, Optional, List, Tuple
+import re
+from typing import Dict, Optional, List, Set, Tuple
+from . import codec
+from .centroids import (
+    CentroidTable,
+    PRECISION_ADDRESS,
+    PRECISION_NONE,
+    PRECISION_POSTCODE,
+)
 
 logger = logging.getLogger(__name__)
 
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# A complete UK postcode; partial ones (e.g. "DN1") are only placed by centroid
+FULL_POSTCODE = re.compile(r'^[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}$', re.IGNORECASE)
+
 class Geocoder:
     """
     Geocodes UK postcodes using postcodes.io API.
@@ -17,11 +30,23 @@ class Geocoder:
     
     BASE_URL = "https://api.postcodes.io"
     BULK_LIMIT = 100  # Max postcodes per bulk request
+    BATCH_LINGER = 0.05  # Seconds to wait for a partial batch to fill up
     
-    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None,
+                 centroids: Optional[CentroidTable] = None):
         self._session = session
+        self.centroids = centroids
         self._owns_session = session is None
         self._cache: Dict[str, Tuple[float, float]] = {}
+        self._misses: Set[str] = set()
+        
+        # Single-flight state shared by all concurrent callers
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._linger: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._request_lock = asyncio.Lock()
+        self.requests_made = 0
     
     async def __aenter__(self):
         if self._owns_session:
@@ -29,6 +54,12 @@ class Geocoder:
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._linger is not None:
+            self._linger.cancel()
+            self._linger = None
+        for task in list(self._batches):
+            task.cancel()
+        logger.info(f"Geocoder made {self.requests_made} bulk requests, {len(self._cache)} postcodes cached")
         if self._owns_session and self._session:
             await self._session.close()
     
@@ -37,9 +68,11 @@ class Geocoder:
         Look up a single postcode. Returns (lat, lng) or None.
         """
         # Check cache first
-        normalized = postcode.upper().replace(" ", "")
+        normalized = self._normalize(postcode)
         if normalized in self._cache:
             return self._cache[normalized]
+        if normalized in self._inflight:
+            return await asyncio.shield(self._inflight[normalized])
         
         if not self._session:
             raise RuntimeError("Session not initialized. Use 'async with' context manager.")
@@ -48,7 +81,7 @@ class Geocoder:
             url = f"{self.BASE_URL}/postcodes/{postcode.replace(' ', '%20')}"
             async with self._session.get(url) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await response.json(loads=codec.loads)
                     if data.get('status') == 200 and data.get('result'):
                         lat = data['result']['latitude']
                         lng = data['result']['longitude']
@@ -67,35 +100,86 @@ class Geocoder:
         """
         Look up multiple postcodes in bulk. Returns dict of postcode -> (lat, lng).
         More efficient than single lookups for large datasets.
+
+        Lookups are coalesced across concurrent callers: a postcode that is
+        already being looked up shares the in-flight request, and uncached
+        postcodes from all callers are micro-batched into full bulk requests.
         """
         if not self._session:
             raise RuntimeError("Session not initialized. Use 'async with' context manager.")
         
         results: Dict[str, Tuple[float, float]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
         
-        # Filter out cached postcodes
-        uncached = []
         for pc in postcodes:
-            normalized = pc.upper().replace(" ", "")
+            normalized = self._normalize(pc)
             if normalized in self._cache:
                 results[pc] = self._cache[normalized]
+            elif normalized in self._misses:
+                continue
+            elif normalized in self._inflight:
+                waiting[pc] = self._inflight[normalized]
             else:
-                uncached.append(pc)
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[normalized] = future
+                self._pending.append(pc)
+                waiting[pc] = future
+                
+                if len(self._pending) >= self.BULK_LIMIT:
+                    self._dispatch(self.BULK_LIMIT)
         
-        if not uncached:
-            return results
+        # Give other callers a moment to top up a partial batch
+        if self._pending and self._linger is None:
+            self._linger = asyncio.get_running_loop().call_later(self.BATCH_LINGER, self._dispatch, 0)
         
-        # Process in batches of BULK_LIMIT
-        for i in range(0, len(uncached), self.BULK_LIMIT):
-            batch = uncached[i:i + self.BULK_LIMIT]
-            
+        if waiting:
+            # Shield so a cancelled caller doesn't cancel lookups others share
+            coords = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+            for pc, value in zip(waiting.keys(), coords):
+                if value:
+                    results[pc] = value
+        
+        return results
+    
+    def _normalize(self, postcode: str) -> str:
+        return postcode.upper().replace(" ", "")
+    
+    def _dispatch(self, minimum: int):
+        """
+        Send pending postcodes as bulk requests. With minimum > 0 only full
+        batches are sent; with 0 everything pending is flushed.
+        """
+        if minimum == 0 and self._linger is not None:
+            self._linger = None
+        
+        while self._pending and len(self._pending) >= max(minimum, 1):
+            batch = self._pending[:self.BULK_LIMIT]
+            self._pending = self._pending[self.BULK_LIMIT:]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+        
+        if not self._pending and self._linger is not None:
+            self._linger.cancel()
+            self._linger = None
+    
+    async def _run_batch(self, batch: List[str]):
+        """
+        Perform one bulk request and resolve the futures waiting on it.
+        """
+        found: Dict[str, Tuple[float, float]] = {}
+        failed = False
+        
+        # One bulk request at a time, with a small gap to be polite
+        async with self._request_lock:
             try:
                 url = f"{self.BASE_URL}/postcodes"
                 payload = {"postcodes": batch}
+                self.requests_made += 1
                 
-                async with self._session.post(url, json=payload) as response:
+                async with self._session.post(url, data=codec.dumps(payload), headers=JSON_HEADERS) as response:
                     if response.status == 200:
-                        data = await response.json()
+                        data = await response.json(loads=codec.loads)
                         
                         if data.get('status') == 200 and data.get('result'):
                             for item in data['result']:
@@ -103,51 +187,76 @@ class Geocoder:
                                 result = item.get('result')
                                 
                                 if result:
-                                    lat = result['latitude']
-                                    lng = result['longitude']
-                                    normalized = query.upper().replace(" ", "")
-                                    self._cache[normalized] = (lat, lng)
-                                    results[query] = (lat, lng)
+                                    found[self._normalize(query)] = (result['latitude'], result['longitude'])
                     else:
+                        failed = True
                         logger.warning(f"Bulk geocode error: {response.status}")
                         
             except Exception as e:
+                failed = True
                 logger.error(f"Bulk geocode exception: {e}")
-            
-            # Small delay between batches to be polite
-            if i + self.BULK_LIMIT < len(uncached):
+            finally:
                 await asyncio.sleep(0.1)
         
-        return results
+        for pc in batch:
+            normalized = self._normalize(pc)
+            value = found.get(normalized)
+            if value:
+                self._cache[normalized] = value
+            elif not failed:
+                # Unknown to postcodes.io - don't ask again this run
+                self._misses.add(normalized)
+            
+            future = self._inflight.pop(normalized, None)
+            if future and not future.done():
+                future.set_result(value)
     
     async def enrich_applications(self, applications: List[Dict]) -> List[Dict]:
         """
-        Add lat/lng coordinates to a list of applications.
-        Uses bulk lookup for efficiency.
+        Add lat/lng coordinates and a geo_precision tier to a list of applications.
+        Uses bulk lookup for efficiency, then falls back to the local centroid
+        table for postcodes that are partial or could not be resolved.
         """
         # Collect postcodes that need geocoding
         postcodes_to_lookup = []
         for app in applications:
-            if app.get('postcode') and (app.get('lat', 0) == 0 or app.get('lng', 0) == 0):
+            if app.get('lat', 0) != 0 and app.get('lng', 0) != 0:
+                # Coordinates came with the record
+                app.setdefault('geo_precision', PRECISION_ADDRESS)
+            elif app.get('postcode') and FULL_POSTCODE.match(app['postcode']):
                 postcodes_to_lookup.append(app['postcode'])
         
-        if not postcodes_to_lookup:
-            return applications
-        
-        # Deduplicate
-        unique_postcodes = list(set(postcodes_to_lookup))
-        logger.info(f"Geocoding {len(unique_postcodes)} unique postcodes...")
-        
-        # Bulk lookup
-        coords = await self.lookup_bulk(unique_postcodes)
+        coords: Dict[str, Tuple[float, float]] = {}
+        if postcodes_to_lookup:
+            # Deduplicate
+            unique_postcodes = list(set(postcodes_to_lookup))
+            logger.info(f"Geocoding {len(unique_postcodes)} unique postcodes...")
+            
+            # Bulk lookup
+            coords = await self.lookup_bulk(unique_postcodes)
         
         # Apply coordinates to applications
         enriched = 0
+        fallback = 0
         for app in applications:
+            if app.get('lat', 0) != 0 and app.get('lng', 0) != 0:
+                continue
+            
             pc = app.get('postcode')
             if pc and pc in coords:
                 app['lat'], app['lng'] = coords[pc]
+                app['geo_precision'] = PRECISION_POSTCODE
+                if self.centroids is not None:
+                    self.centroids.add(pc, app['lat'], app['lng'])
                 enriched += 1
+                continue
+            
+            centroid = self.centroids.lookup(pc) if self.centroids is not None and pc else None
+            if centroid:
+                app['lat'], app['lng'], app['geo_precision'] = centroid
+                fallback += 1
+            else:
+                app['geo_precision'] = PRECISION_NONE
         
-        logger.info(f"Enriched {enriched} applications with coordinates")
+        logger.info(f"Enriched {enriched} applications with coordinates ({fallback} from centroids)")
         return applications
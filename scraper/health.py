@@ -0,0 +1,89 @@
+"""
+Per-council circuit breaker.
+
+Each council's health is kept in its _metadata.json entry:
+
+    "health": {"state": "open", "failures": 3, "host": "...",
+               "last_failure": "2026-01-05T02:14:00", "last_error": "..."}
+
+A council whose runs fail FAILURE_THRESHOLD times in a row is opened. Open
+councils are not scraped; on later runs a single cheap request to the portal
+(the half-open probe) decides whether to try a full scrape again. A
+successful run closes the breaker. Probes are shared per host within a run,
+so councils on the same dead server cost one probe between them.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = 3  # Consecutive failed runs before the breaker opens
+PROBE_TIMEOUT = 10.0  # Seconds allowed for the half-open probe
+
+# Probe results for this process, by host
+_probed_hosts: Dict[str, bool] = {}
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+class CircuitBreaker:
+    """Health state for one council, stored in its metadata entry."""
+
+    def __init__(self, entry: Dict, host: str = ""):
+        self.health = entry.setdefault('health', {'state': CLOSED, 'failures': 0})
+        self.host = host or self.health.get('host', '')
+        if host:
+            self.health['host'] = host
+
+    @property
+    def state(self) -> str:
+        return self.health.get('state', CLOSED)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    async def allow(self, scraper) -> bool:
+        """
+        Whether to scrape this run. Closed breakers always allow; open ones
+        allow only if the half-open probe reaches the portal.
+        """
+        if not self.is_open:
+            return True
+
+        if self.host not in _probed_hosts:
+            _probed_hosts[self.host] = await scraper.probe(PROBE_TIMEOUT)
+        if not _probed_hosts[self.host]:
+            self.record_failure("probe failed")
+            return False
+
+        self.health['state'] = HALF_OPEN
+        logger.info(f"{scraper.council_name}: probe succeeded, trying a full scrape")
+        return True
+
+    def record_success(self):
+        if self.is_open:
+            logger.info(f"Circuit closed for {self.host or 'council'}")
+        self.health.update({'state': CLOSED, 'failures': 0})
+        self.health.pop('last_error', None)
+
+    def record_failure(self, error: Optional[str] = None):
+        failures = self.health.get('failures', 0) + 1
+        self.health.update({
+            'failures': failures,
+            'last_failure': datetime.now().isoformat(timespec='seconds'),
+            'last_error': (error or 'unknown error')[:200],
+        })
+        # A failed half-open attempt reopens immediately
+        if self.state == HALF_OPEN or failures >= FAILURE_THRESHOLD:
+            if self.state != OPEN:
+                logger.warning(f"Circuit opened for {self.host or 'council'} after {failures} failures")
+            self.health['state'] = OPEN
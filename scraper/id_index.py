@@ -0,0 +1,224 @@
+"""
+Global application id index.
+
+Shards only deduplicate within a sector, so a record whose postcode is
+corrected (or re-geocoded into another sector) would otherwise be stored
+twice, and finding an id meant opening every shard. IdIndex keeps, for every
+stored record, where it lives:
+
+    id, council -> sector, shard (path relative to the tree), offset, content hash
+
+in a SQLite table keyed by (id, council), so lookups are B-tree searches.
+save_applications consults it to move records between sectors and updates
+it for every shard it rewrites.
+
+Rows seeded from an existing tree belong to no council (the "?{sector}"
+placeholder ApplicationStore uses too); a council claims them when it writes
+the same record again. An unclaimed row is only
+treated as the same application as an incoming record if the stored record
+has the same link, since references repeat across councils.
+
+Usage:
+    python -m scraper.id_index public/data --index .cache/scraper/ids.sqlite --rebuild
+    python -m scraper.id_index public/data --index .cache/scraper/ids.sqlite 23/00501/FUL
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .shards import iter_shards, load_shard, relative_shard
+from .store import content_hash, imported_council
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_INDEX = '_index.sqlite'  # Kept by partial workers so merge knows each record's council
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    id TEXT NOT NULL,
+    council TEXT NOT NULL,
+    sector TEXT NOT NULL,
+    shard TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (id, council)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_locations_sector ON locations (sector);
+"""
+
+# (council, sector, shard, offset, content_hash)
+Location = Tuple[str, str, str, int, str]
+
+
+def is_unclaimed(council: str) -> bool:
+    return council.startswith('?')
+
+
+class IdIndex:
+    """id -> location index for one shard tree. Safe to share between writer threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0]
+
+    def lookup(self, app_id: str) -> List[Location]:
+        """Every stored record with this id (one per council)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT council, sector, shard, offset, content_hash FROM locations WHERE id = ?",
+                (str(app_id),)
+            ).fetchall()
+
+    def owners(self) -> Dict[Tuple[str, int], str]:
+        """
+        {(shard, offset): council} for claimed rows, e.g. to attribute a
+        partial tree's records. Keyed by location, as an id alone may belong
+        to several councils.
+        """
+        with self._lock:
+            return {(shard, offset): council for shard, offset, council in self.conn.execute(
+                "SELECT shard, offset, council FROM locations WHERE council NOT LIKE '?%'"
+            )}
+
+    def previous_sector(self, output_dir: str, council: str, app: Dict, sector: str) -> Optional[str]:
+        """
+        The sector this application is already stored in, if it isn't `sector`.
+        Matches the council's own row, else an unclaimed row whose stored
+        record has the same link.
+        """
+        unclaimed = []
+        for owner, stored_sector, shard, offset, _ in self.lookup(app['id']):
+            if owner == council and council:
+                return stored_sector if stored_sector != sector else None
+            if is_unclaimed(owner) and stored_sector != sector:
+                unclaimed.append((stored_sector, shard, offset))
+
+        link = app.get('link')
+        if not link:
+            return None
+        for stored_sector, shard, offset in unclaimed:
+            records = load_shard(os.path.join(output_dir, shard))
+            stored = records[offset] if offset < len(records) else None
+            if stored and stored.get('id') == app['id'] and stored.get('link') == link:
+                return stored_sector
+        return None
+
+    def update_sector(self, sector: str, written: Dict[str, List[Dict]], current: Iterable[str],
+                      council: str = '', incoming: Set[str] = frozenset()):
+        """
+        Record the shards just written for a sector. `written` maps relative
+        shard paths to their records, `current` lists every shard the sector
+        now has (rows pointing elsewhere are stale). Records with ids in
+        `incoming` were written by `council` and are claimed by it.
+        """
+        current = set(current)
+        with self._lock, self.conn:
+            known: Dict[str, Tuple[str, str]] = {}
+            stale = []
+            for app_id, owner, shard, digest in self.conn.execute(
+                "SELECT id, council, shard, content_hash FROM locations WHERE sector = ?", (sector,)
+            ):
+                if shard in written or shard not in current:
+                    stale.append((app_id, owner))
+                    if not is_unclaimed(owner) or app_id not in known:
+                        known[app_id] = (owner, digest)
+            self.conn.executemany("DELETE FROM locations WHERE id = ? AND council = ?", stale)
+
+            rows = {}
+            for shard, records in written.items():
+                for offset, app in enumerate(records):
+                    app_id = str(app['id'])
+                    owner, digest = known.get(app_id, (imported_council(sector), None))
+                    if app_id in incoming:
+                        if council and is_unclaimed(owner):
+                            owner = council
+                        digest = None  # May have moved in with new content
+                    # A repeated id keeps its first location, as in rebuild
+                    if (app_id, owner) not in rows:
+                        rows[app_id, owner] = (app_id, owner, sector, shard, offset, digest or content_hash(app))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO locations (id, council, sector, shard, offset, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                list(rows.values())
+            )
+
+    def rebuild(self, output_dir: str) -> int:
+        """Index every record of a shard tree from scratch. Returns the count."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM locations")
+            count = 0
+            for sector, filepath in iter_shards(output_dir):
+                shard = relative_shard(output_dir, filepath)
+                rows = [
+                    (str(app['id']), imported_council(sector), sector, shard, offset, content_hash(app))
+                    for offset, app in enumerate(load_shard(filepath))
+                ]
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO locations (id, council, sector, shard, offset, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                count += len(rows)
+        logger.info(f"Indexed {count} applications from {output_dir} into {self.path}")
+        return count
+
+
+def open_id_index(path: Optional[str], output_dir: str) -> Optional[IdIndex]:
+    """
+    Open the index at `path`, building it from the shards on first use.
+    Returns None when no path is configured.
+    """
+    if not path:
+        return None
+    index = IdIndex(path)
+    if len(index) == 0:
+        index.rebuild(output_dir)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the global application id index")
+    parser.add_argument('output_dir')
+    parser.add_argument('ids', nargs='*', help="Application ids to look up")
+    parser.add_argument('--index', default=os.environ.get('SCRAPER_ID_INDEX', ''),
+                        help="Path to the SQLite index (default: $SCRAPER_ID_INDEX)")
+    parser.add_argument('--rebuild', action='store_true', help="Re-index the whole tree")
+    args = parser.parse_args(argv)
+    if not args.index:
+        raise SystemExit("No index path (use --index or SCRAPER_ID_INDEX)")
+
+    with IdIndex(args.index) as index:
+        if args.rebuild or len(index) == 0:
+            index.rebuild(args.output_dir)
+        for app_id in args.ids:
+            locations = index.lookup(app_id)
+            if not locations:
+                print(f"{app_id}: not found")
+            for council, _, shard, offset, digest in locations:
+                print(f"{app_id}: {shard}[{offset}] council={council} hash={digest[:12]}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -1,27 +1,100 @@
 import aiohttp
 import asyncio
 from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple
+from datetime import date, datetime, timedelta
 import logging
 import re
 import os
+import time
 import urllib.parse
+import html as html_lib
 from .base import BaseScraper
+from .page_cache import VOLATILE_FIELDS
 from .rate_limiter import RateLimiter, RetryConfig
 
 logger = logging.getLogger(__name__)
 
+ADVANCED = 'advanced'
+WEEKLY_LIST = 'weeklyList'
+STRATEGIES = (ADVANCED, WEEKLY_LIST)
+REPROBE_RUNS = 7  # Runs on the preferred strategy before the other is tried again
+
+# Idox pages shown when a form token or session is no longer accepted
+_REJECTED_PAGE = re.compile(r'session (?:has )?(?:timed out|expired)|invalid (?:token|request)', re.IGNORECASE)
+
+
+class FormTemplate:
+    """
+    A parsed Idox search form: where it posts to, the default and hidden
+    field values, and (for the weekly list) the weeks on offer.
+    """
+
+    def __init__(self, action: str, fields: Dict[str, str], referer: str,
+                 weeks: Optional[List[Tuple[str, datetime]]] = None, fetched_on: Optional[date] = None):
+        self.action = action
+        self.fields = fields
+        self.referer = referer
+        self.weeks = weeks or []
+        self.fetched_on = fetched_on or date.today()
+
+    @property
+    def reusable(self) -> bool:
+        """Whether the form can be submitted in a later session (it carries no per-session token)."""
+        return bool(self.action) and not any(name in VOLATILE_FIELDS for name in self.fields)
+
+    def to_dict(self) -> Dict:
+        return {
+            'action': self.action,
+            'fields': self.fields,
+            'referer': self.referer,
+            'weeks': [[value, week_date.strftime('%Y-%m-%d')] for value, week_date in self.weeks],
+            'fetched_on': self.fetched_on.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FormTemplate':
+        weeks = [(value, datetime.strptime(week_date, '%Y-%m-%d')) for value, week_date in data.get('weeks', [])]
+        return cls(data['action'], data['fields'], data['referer'], weeks,
+                   date.fromisoformat(data['fetched_on']))
+
+    def latest_week(self) -> datetime:
+        """Last day covered by the newest week in the list."""
+        if not self.weeks:
+            return datetime.min
+        return max(week_date for _, week_date in self.weeks) + timedelta(days=6)
+
+
+_ANCHOR_TAG = re.compile(r'<a\s[^>]*>', re.IGNORECASE)
+_NEXT_CLASS = re.compile(r'class\s*=\s*["\'][^"\']*\bnext\b', re.IGNORECASE)
+_HREF = re.compile(r'href\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+
+
+def _next_page_href(html: str) -> Optional[str]:
+    """href of the results pager's <a class="next"> link, if any."""
+    for tag in _ANCHOR_TAG.finditer(html):
+        if _NEXT_CLASS.search(tag.group(0)):
+            href = _HREF.search(tag.group(0))
+            return html_lib.unescape(href.group(1)) if href else None
+    return None
+
+
+
 class IdoxScraper(BaseScraper):
     """
     Scraper for Idox Public Access systems.
     """
     
+    HAS_DETAIL_PAGES = True
+    DATE_ORDERED = True
+    
     def __init__(self, base_url: str, council_name: str, mock_mode: bool = False):
-        super().__init__(base_url, council_name)
-        self.mock_mode = mock_mode
+        super().__init__(base_url, council_name, mock_mode)
         self.rate_limiter = RateLimiter(rate=0.5, burst=2)
         self.retry_config = RetryConfig(max_retries=3, base_delay=2.0)
+        self._forms: Dict[str, FormTemplate] = {}
+        # Ids the streamed search handed on, collected during a re-probe
+        self._streamed_ids: Optional[Set[str]] = None
 
     async def fetch_applications(self, start_date: str, end_date: str) -> List[Dict]:
         if not self.session:
@@ -33,32 +106,124 @@ class IdoxScraper(BaseScraper):
         
         logger.info(f"Fetching {self.council_name} applications from {start_date} to {end_date}")
         
-        # Try Advanced Search
-        try:
-            apps = await self._search_advanced(start_date, end_date)
-            if apps:
-                return apps
-        except Exception as e:
-            logger.error(f"Advanced search failed for {self.council_name}: {e}")
+        # Start with whichever strategy worked last time; every REPROBE_RUNS
+        # runs, also try the other in case it has become faster or more complete
+        preferred = self.state.get('preferred', ADVANCED)
+        order = [preferred] + [name for name in STRATEGIES if name != preferred]
+        reprobe = self.state.get('runs_since_probe', 0) >= REPROBE_RUNS
+        searches = {ADVANCED: self._search_advanced, WEEKLY_LIST: self._search_weekly_list}
         
-        # Fallback to Weekly List
-        logger.info("Falling back to Weekly List search")
-        try:
-            return await self._search_weekly_list(start_date, end_date)
-        except Exception as e:
-            logger.error(f"Weekly list search failed for {self.council_name}: {e}")
+        # Per search: records found, and those not streamed (see _emit_page)
+        counts: Dict[str, int] = {}
+        results: Dict[str, List[Dict]] = {}
+        streamed: Optional[str] = None  # The search whose records went downstream
+        seen: Set[str] = set()  # Its ids, when a re-probe compares another search
+        self._streamed_ids = set() if reprobe else None
+        for name in order:
+            if any(counts.values()) and not reprobe:
+                break
+            if name != preferred:
+                logger.info(f"{'Re-probing' if reprobe else 'Falling back to'} {name} search")
+            
+            # Once a search has streamed records, a re-probe's results are only
+            # compared, so those are held until the end of the run
+            page_queue = self._page_queue
+            if streamed is not None:
+                self._page_queue = None
+            emitted = self._emitted
+            started = time.monotonic()
+            try:
+                apps = await searches[name](start_date, end_date)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # The portal itself is unreachable; the other strategy won't fare better
+                logger.error(f"{name} search failed for {self.council_name}: {e!r}")
+                self.failed = True
+                return []
+            except Exception as e:
+                logger.error(f"{name} search failed for {self.council_name}: {e}")
+                self._record_strategy(name, None, 0)
+                continue
+            finally:
+                self._page_queue = page_queue
+            counts[name] = len(apps) + self._emitted - emitted
+            results[name] = apps
+            self._record_strategy(name, time.monotonic() - started, counts[name])
+            if counts[name] and streamed is None:
+                streamed = name
+                if self._streamed_ids is not None:
+                    seen = self._streamed_ids | {app['id'] for app in apps}
+                    self._streamed_ids = None
+        
+        if not results:
+            self.failed = True
             return []
+        
+        # Most complete wins, then fastest
+        best = max(counts, key=lambda name: (counts[name], -self.state['strategies'][name]['latency']))
+        if best != preferred and counts[best]:
+            logger.info(f"{self.council_name}: switching preferred search to {best}")
+            self.state['preferred'] = best
+        self.state['runs_since_probe'] = 0 if len(results) == len(STRATEGIES) else self.state.get('runs_since_probe', 0) + 1
+        
+        if streamed is None or best == streamed:
+            return results[best]
+        # Pass on only what the streamed search missed, so no record is saved twice
+        missed = [app for app in results[best] if app['id'] not in seen]
+        if await self._emit_page(missed):
+            return results[streamed]
+        return results[streamed] + missed
 
-    async def _search_advanced(self, start_date: str, end_date: str) -> List[Dict]:
-        # 1. Get search page to establish session and get form token
-        search_url = f"{self.base_url}/search.do?action=advanced"
-        async with self.session.get(search_url) as response:
+    async def _emit_page(self, apps: List[Dict]) -> bool:
+        if self._page_queue is not None and self._streamed_ids is not None:
+            self._streamed_ids.update(app['id'] for app in apps)
+        return await super()._emit_page(apps)
+
+    def _record_strategy(self, name: str, latency: Optional[float], count: int):
+        """Note a strategy's outcome in the per-council state (None latency = failed)."""
+        self.state.setdefault('strategies', {})[name] = {
+            'ok': latency is not None,
+            'latency': round(latency, 1) if latency is not None else None,
+            'count': count,
+            'checked': date.today().isoformat(),
+        }
+
+    async def _form_template(self, kind: str, refresh: bool = False) -> FormTemplate:
+        """
+        Return the parsed search form for `kind` (ADVANCED or WEEKLY_LIST),
+        fetching it only if it isn't cached or refresh is set. Forms without
+        per-session tokens are kept in the page cache across runs.
+        """
+        key = f"{self.base_url}\0{kind}"
+        if not refresh:
+            if kind in self._forms:
+                return self._forms[kind]
+            saved = self.page_cache.get_form(key) if self.page_cache is not None else None
+            if saved:
+                self._forms[kind] = FormTemplate.from_dict(saved)
+                return self._forms[kind]
+
+        url = f"{self.base_url}/search.do?action={kind}"
+        await self.rate_limiter.acquire()
+        async with self.session.get(url) as response:
             if response.status != 200:
-                raise Exception(f"Failed to load search page: {response.status}")
+                raise Exception(f"Failed to load {kind} search page: {response.status}")
             html = await response.text()
-        
-        # 2. Parse form
-        soup = BeautifulSoup(html, 'html.parser')
+
+        soup = BeautifulSoup(html, self.parser)
+        if kind == ADVANCED:
+            template = self._parse_advanced_form(soup, url)
+        else:
+            template = self._parse_weekly_list_form(soup, url)
+
+        self._forms[kind] = template
+        if self.page_cache is not None:
+            if template.reusable:
+                self.page_cache.put_form(key, template.to_dict())
+            else:
+                self.page_cache.forget_form(key)
+        return template
+
+    def _parse_advanced_form(self, soup: BeautifulSoup, url: str) -> FormTemplate:
         form = soup.find('form', {'name': 'searchCriteriaForm'}) or soup.find('form', {'id': 'searchCriteriaForm'})
         if not form:
             # Try finding any form with action containing search.do
@@ -67,10 +232,6 @@ class IdoxScraper(BaseScraper):
         if not form:
             raise Exception("Could not find search form")
             
-        action = form.get('action', '')
-        if not action.startswith('http'):
-            action = urllib.parse.urljoin(self.base_url, action)
-            
         data = {}
         for input_tag in form.find_all(['input', 'select']):
             name = input_tag.get('name')
@@ -83,122 +244,147 @@ class IdoxScraper(BaseScraper):
                 value = selected.get('value') if selected else ''
             
             data[name] = value
-            
-        # 3. Update with our criteria
+
+        return FormTemplate(self._form_action(form), data, url)
+
+    def _parse_weekly_list_form(self, soup: BeautifulSoup, url: str) -> FormTemplate:
+        form = soup.find('form', {'name': 'weeklyListForm'}) or soup.find('form', {'id': 'weeklyListForm'})
+        week_select = soup.find('select', {'name': 'week'})
+
+        weeks = []
+        if week_select:
+            for option in week_select.find_all('option'):
+                val = option.get('value')
+                text = option.get_text(strip=True)
+                if not val: continue
+                
+                try:
+                    # Text format: "25 Sep 2023" or "Week beginning 25 Sep 2023"
+                    date_text = text.replace("Week beginning", "").strip()
+                    weeks.append((val, datetime.strptime(date_text, '%d %b %Y')))
+                except Exception as e:
+                    logger.debug(f"Failed to parse week date {text}: {e}")
+                    continue
+
+        if not form:
+            # No form to submit; an empty template keeps callers simple
+            return FormTemplate('', {}, url, weeks)
+
+        data = {}
+        for input_tag in form.find_all('input', type='hidden'):
+            data[input_tag.get('name')] = input_tag.get('value', '')
+        
+        # Handle radio buttons (e.g. dateType)
+        for input_tag in form.find_all('input', type='radio'):
+            name = input_tag.get('name')
+            if name:
+                if input_tag.get('checked'):
+                    data[name] = input_tag.get('value')
+                elif name == 'dateType' and 'dateType' not in data:
+                    # Prefer Validated over Decided
+                    if input_tag.get('value') == 'DC_Validated':
+                        data[name] = 'DC_Validated'
+        
+        # Default dateType if still missing
+        if 'dateType' not in data:
+            data['dateType'] = 'DC_Validated'
+        data['searchType'] = 'Application'
+
+        return FormTemplate(self._form_action(form), data, url, weeks)
+
+    def _form_action(self, form) -> str:
+        action = form.get('action', '')
+        if not action.startswith('http'):
+            action = urllib.parse.urljoin(self.base_url, action)
+        return action
+
+    @staticmethod
+    def _rejected(response: aiohttp.ClientResponse, html: str) -> bool:
+        """
+        Whether the portal refused a submission made from a cached template:
+        an error status, a bounce back to the search form, or an expired
+        session message.
+        """
+        if response.status != 200:
+            return True
+        if 'action=advanced' in str(response.url) or 'action=weeklyList' in str(response.url):
+            return True
+        return bool(_REJECTED_PAGE.search(html))
+
+    async def _submit(self, kind: str, criteria: Dict[str, str]) -> Optional[str]:
+        """
+        POST a search built from the cached form template. If the portal
+        rejects it, refresh the template once and resubmit.
+        Returns the results page HTML, or None if it was still rejected.
+        """
+        for attempt in range(2):
+            template = await self._form_template(kind, refresh=attempt > 0)
+            if not template.action:
+                return None
+
+            data = dict(template.fields)
+            data.update(criteria)
+            logger.debug(f"Submitting form to {template.action} with data: {data}")
+
+            # Headers for politeness/anti-bot
+            headers = {
+                'Referer': template.referer,
+                'Origin': self.base_url
+            }
+            await self.rate_limiter.acquire()
+            async with self.session.post(template.action, data=data, headers=headers) as response:
+                html = await response.text() if response.status == 200 else ''
+                if not self._rejected(response, html):
+                    return html
+                status = response.status
+
+            logger.info(f"{self.council_name} rejected the {kind} search form ({status}), refreshing it")
+
+        return None
+
+    async def _search_advanced(self, start_date: str, end_date: str) -> List[Dict]:
         s_date = datetime.strptime(start_date, '%Y-%m-%d').strftime('%d/%m/%Y')
         e_date = datetime.strptime(end_date, '%Y-%m-%d').strftime('%d/%m/%Y')
         
-        data.update({
+        results_html = await self._submit(ADVANCED, {
             'searchType': 'Application',
             'searchCriteria.caseType': 'Application',
             'date(applicationReceivedStart)': s_date,
             'date(applicationReceivedEnd)': e_date
         })
-        
-        logger.debug(f"Submitting form to {action} with data: {data}")
-
-        # 4. Submit form
-        headers = {
-            'Referer': search_url,
-            'Origin': self.base_url
-        }
-        async with self.session.post(action, data=data, headers=headers) as response:
-            if response.status != 200:
-                raise Exception(f"Search submission failed: {response.status}")
-            results_html = await response.text()
+        if results_html is None:
+            raise Exception("Search submission failed")
             
         return await self._parse_all_pages(results_html)
 
     async def _search_weekly_list(self, start_date: str, end_date: str) -> List[Dict]:
-        url = f"{self.base_url}/search.do?action=weeklyList"
-        async with self.session.get(url) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to load weekly list page: {response.status}")
-            html = await response.text()
-            
-        soup = BeautifulSoup(html, 'html.parser')
-        form = soup.find('form', {'name': 'weeklyListForm'}) or soup.find('form', {'id': 'weeklyListForm'})
-        
-        # If no form, maybe we are already on the results page for the current week?
-        # Or maybe the form has a different name.
-        if not form:
-             # Try to find the select directly
-             pass
-             
-        week_select = soup.find('select', {'name': 'week'})
-        if not week_select:
-            logger.warning("Could not find week select in weekly list page")
-            return []
-            
-        target_weeks = []
         s_date = datetime.strptime(start_date, '%Y-%m-%d')
         e_date = datetime.strptime(end_date, '%Y-%m-%d')
-        
-        for option in week_select.find_all('option'):
-            val = option.get('value')
-            text = option.get_text(strip=True)
-            if not val: continue
+
+        template = await self._form_template(WEEKLY_LIST)
+        # The week list grows over time; refetch a cached copy that predates the range
+        if template.fetched_on < datetime.now().date() and template.latest_week() < e_date:
+            template = await self._form_template(WEEKLY_LIST, refresh=True)
+
+        if not template.weeks:
+            logger.warning("Could not find week select in weekly list page")
+            return []
             
-            try:
-                # Text format: "25 Sep 2023" or "Week beginning 25 Sep 2023"
-                date_text = text.replace("Week beginning", "").strip()
-                week_date = datetime.strptime(date_text, '%d %b %Y')
-                
-                week_end = week_date + timedelta(days=6)
-                
-                if (week_date <= e_date and week_end >= s_date):
-                    target_weeks.append(val)
-            except Exception as e:
-                logger.debug(f"Failed to parse week date {text}: {e}")
-                continue
-        
+        target_weeks = [
+            val for val, week_date in template.weeks
+            if week_date <= e_date and week_date + timedelta(days=6) >= s_date
+        ]
         logger.info(f"Found {len(target_weeks)} weeks matching date range")
         
         all_apps = []
-        if not form:
-             # If no form, we can't submit. But maybe we can construct URL?
-             # Usually it's a POST.
-             return []
-
-        action = form.get('action', '')
-        if not action.startswith('http'):
-            action = urllib.parse.urljoin(self.base_url, action)
-
         for week_val in target_weeks:
-            data = {}
-            for input_tag in form.find_all('input', type='hidden'):
-                data[input_tag.get('name')] = input_tag.get('value', '')
-            
-            # Handle radio buttons (e.g. dateType)
-            for input_tag in form.find_all('input', type='radio'):
-                name = input_tag.get('name')
-                if name:
-                    if input_tag.get('checked'):
-                        data[name] = input_tag.get('value')
-                    elif name == 'dateType' and 'dateType' not in data:
-                        # Prefer Validated over Decided
-                        if input_tag.get('value') == 'DC_Validated':
-                            data[name] = 'DC_Validated'
-            
-            # Default dateType if still missing
-            if 'dateType' not in data:
-                data['dateType'] = 'DC_Validated'
-
-            data['week'] = week_val
-            data['searchType'] = 'Application'
-            
-            # Headers for politeness/anti-bot
-            headers = {
-                'Referer': url,
-                'Origin': self.base_url
-            }
-            
-            async with self.session.post(action, data=data, headers=headers) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    apps = await self._parse_all_pages(html)
-                    logger.info(f"Weekly list week {week_val}: found {len(apps)} apps")
-                    all_apps.extend(apps)
+            html = await self._submit(WEEKLY_LIST, {'week': week_val})
+            if html is None:
+                continue
+            emitted = self._emitted
+            apps = await self._parse_all_pages(html)
+            logger.info(f"Weekly list week {week_val}: found {len(apps) + self._emitted - emitted} apps")
+            all_apps.extend(apps)
                     
         return all_apps
 
@@ -208,18 +394,16 @@ class IdoxScraper(BaseScraper):
         page = 1
         
         while True:
-            apps = self.parse_results(current_html)
+            apps = self._parse_page(current_html)
             if not apps:
                 break
-            all_apps.extend(apps)
-            
-            # Find next link
-            soup = BeautifulSoup(current_html, 'html.parser')
-            next_link = soup.find('a', class_='next')
-            if not next_link:
+            if not await self._emit_page(apps):
+                all_apps.extend(apps)
+            if self._page_is_known(apps):
                 break
-                
-            href = next_link.get('href')
+            
+            # Find next link (a regex scan, so cached pages aren't parsed at all)
+            href = _next_page_href(current_html)
             if not href:
                 break
                 
@@ -236,8 +420,15 @@ class IdoxScraper(BaseScraper):
                 
         return all_apps
 
+    def detail_urls(self, app: Dict) -> List[str]:
+        # Status and dates are on the summary tab, the case officer on "Further Information"
+        link = app.get('link', '')
+        if 'activeTab=summary' in link:
+            return [link, link.replace('activeTab=summary', 'activeTab=details')]
+        return super().detail_urls(app)
+
     def parse_results(self, html: str) -> List[Dict]:
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = BeautifulSoup(html, self.parser)
         results = []
         
         items = soup.find_all('li', class_='searchresult')
@@ -0,0 +1,47 @@
+"""
+Per-council index of application references already scraped.
+
+Kept as a sorted text file (one id per line) under {output_dir}/_ids/ so it
+diffs cleanly in git, and searched with bisect. Scrapers whose results come
+newest first use it to stop paginating once a whole page is already known.
+"""
+import os
+from bisect import bisect_left
+from typing import Iterable, List
+
+from .shards import write_atomic
+
+
+class KnownIds:
+    """Sorted set of ids with O(log n) membership tests."""
+
+    def __init__(self, ids: Iterable[str] = ()):
+        self._ids: List[str] = sorted(set(ids))
+        self._added: set = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._added)
+
+    def __contains__(self, app_id: str) -> bool:
+        if app_id in self._added:
+            return True
+        i = bisect_left(self._ids, app_id)
+        return i < len(self._ids) and self._ids[i] == app_id
+
+    def update(self, ids: Iterable[str]):
+        """Add ids; they are merged into the sorted list on save."""
+        self._added.update(app_id for app_id in ids if app_id and app_id not in self)
+
+    @classmethod
+    def load(cls, path: str) -> 'KnownIds':
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(line.rstrip('\n') for line in f if line.strip())
+
+    def save(self, path: str):
+        if self._added:
+            self._ids = sorted(set(self._ids) | self._added)
+            self._added = set()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, ''.join(f"{app_id}\n" for app_id in self._ids).encode('utf-8'))
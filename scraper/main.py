@@ -1,12 +1,28 @@
+import argparse
 import asyncio
 import logging
 import os
-import json
+import time
 from datetime import datetime, timedelta
-from scraper.idox import IdoxScraper
-from scraper.northgate import NorthgateScraper
-from scraper.planning_api import PlanningDataAPIScraper, COUNCIL_ORG_ENTITIES
+from typing import Optional
+from scraper import codec
 from scraper.geocoder import Geocoder
+from scraper.centroids import CentroidTable
+from scraper.pipeline import run_pipeline
+from scraper.details import DetailFetcher
+from scraper.health import CircuitBreaker, host_of
+from scraper.scheduler import RunScheduler, is_due, record_run
+from scraper.store import ApplicationStore, open_store
+from scraper.shards import LAYOUT_MONTHLY, details_path, known_ids_path, seal_closed_months, write_atomic
+from scraper.writer import ShardWriter
+from scraper.known_ids import KnownIds
+from scraper.id_index import PARTIAL_INDEX, IdIndex, open_id_index
+from scraper.page_cache import PageCache
+from scraper.search_index import build_index
+from scraper.tiles import build_tiles
+from scraper.alerts import AlertEngine
+from scraper.registry import create_scraper, load_councils
+from scraper.sharding import council_key as get_council_key, parse_shard_spec, partition_councils
 
 # Configure logging
 logging.basicConfig(
@@ -19,149 +35,35 @@ logger = logging.getLogger(__name__)
 MOCK_MODE = os.environ.get('SCRAPER_MOCK_MODE', 'false').lower() == 'true'
 OUTPUT_DIR = os.environ.get('SCRAPER_OUTPUT_DIR', 'public/data') # Default to public/data in root
 DAYS_TO_SCRAPE = int(os.environ.get('SCRAPER_DAYS', '30'))
+COMPACT_OUTPUT = os.environ.get('SCRAPER_COMPACT_OUTPUT', 'false').lower() == 'true' # .gz/.br + columnar siblings
+SHARD_LAYOUT = os.environ.get('SCRAPER_SHARD_LAYOUT', 'sector') # 'sector' or 'monthly'
+STORE_PATH = os.environ.get('SCRAPER_STORE', '') # SQLite store; empty writes shards directly
+SEARCH_INDEX = os.environ.get('SCRAPER_SEARCH_INDEX', 'false').lower() == 'true' # Rebuild _search/ after scraping
+MAP_TILES = os.environ.get('SCRAPER_MAP_TILES', 'false').lower() == 'true' # Rebuild _tiles/ after scraping
+ALERTS_DIR = os.environ.get('SCRAPER_ALERTS_DIR', '') # Saved searches + notification outbox
+CONCURRENCY = max(1, int(os.environ.get('SCRAPER_CONCURRENCY', '1'))) # Councils scraped at once
+DETAIL_PAGES = os.environ.get('SCRAPER_DETAIL_PAGES', 'false').lower() == 'true' # Enrich Idox/Northgate records from detail pages
+COUNCIL_DEADLINE = float(os.environ.get('SCRAPER_COUNCIL_DEADLINE', '900')) # Seconds before a council's scrape is abandoned
+TIME_BUDGET = float(os.environ.get('SCRAPER_TIME_BUDGET', '0')) # Seconds for the whole run; 0 is unlimited
+ADAPTIVE_FREQUENCY = os.environ.get('SCRAPER_ADAPTIVE', 'true').lower() == 'true' # Scrape quiet councils every 3/7 days
+PAGE_CACHE = os.environ.get('SCRAPER_PAGE_CACHE', '') # SQLite cache of parsed results pages and Idox forms; empty disables
+PAGE_CACHE_MB = int(os.environ.get('SCRAPER_PAGE_CACHE_MB', '64')) # Size bound before LRU eviction
+COUNCILS_PATH = os.environ.get('SCRAPER_COUNCILS', '') # Council registry JSON; empty uses scraper/councils.json
+WRITER_THREADS = max(1, int(os.environ.get('SCRAPER_WRITER_THREADS', '2'))) # Threads rewriting shards off the event loop
+ID_INDEX = os.environ.get('SCRAPER_ID_INDEX', '') # SQLite id -> shard index; moves records between sectors. Empty disables
 
-# UK Councils to scrape
-COUNCILS = [
-    # --- API Accessible Councils ---
-    {
-        "name": "Doncaster",
-        "type": "api",
-        "enabled": True
-    },
-    
-    # --- Major Cities (Idox) ---
-    {
-        "name": "Leeds",
-        "type": "idox",
-        "url": "https://publicaccess.leeds.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Manchester",
-        "type": "idox",
-        "url": "https://pa.manchester.gov.uk/online-applications",
-        "enabled": True
-    },
-    # Westminster removed due to connection issues
-    {
-        "name": "Bristol",
-        "type": "idox",
-        "url": "https://planningonline.bristol.gov.uk/online-applications",
-        "enabled": True
-    },
-
-    # --- London Boroughs (Idox) ---
-    {
-        "name": "Lambeth",
-        "type": "idox",
-        "url": "https://planning.lambeth.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Tower Hamlets",
-        "type": "idox",
-        "url": "https://development.towerhamlets.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Bromley",
-        "type": "idox",
-        "url": "https://searchapplications.bromley.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Croydon",
-        "type": "idox",
-        "url": "https://publicaccess3.croydon.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Ealing",
-        "type": "idox",
-        "url": "https://pam.ealing.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Greenwich",
-        "type": "idox",
-        "url": "https://planning.royalgreenwich.gov.uk/online-applications",
-        "enabled": True
-    },
+# UK Councils to scrape (see scraper/councils.json)
+COUNCILS = load_councils(COUNCILS_PATH or None)
 
-    # --- Other Major Cities (Idox) ---
-    {
-        "name": "Nottingham",
-        "type": "idox",
-        "url": "https://publicaccess.nottinghamcity.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Glasgow",
-        "type": "idox",
-        "url": "https://publicaccess.glasgow.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Newcastle",
-        "type": "idox",
-        "url": "https://publicaccessapplications.newcastle.gov.uk/online-applications",
-        "enabled": True
-    },
 
-    # --- Local Councils (Hampshire/South) ---
-    {
-        "name": "Portsmouth",
-        "type": "idox",
-        "url": "https://publicaccess.portsmouth.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Southampton", 
-        "type": "idox",
-        "url": "https://planningpublicaccess.southampton.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Fareham",
-        "type": "northgate", 
-        "url": "http://www.fareham.gov.uk/casetrackerplanning",
-        "enabled": True
-    },
-    {
-        "name": "Havant",
-        "type": "idox",
-        "url": "https://planningpublicaccess.havant.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Gosport",
-        "type": "idox", 
-        "url": "https://publicaccess.gosport.gov.uk/online-applications",
-        "enabled": True
-    },
-    {
-        "name": "Winchester",
-        "type": "idox",
-        "url": "https://planningapps.winchester.gov.uk/online-applications",
-        "enabled": False
-    },
-    {
-        "name": "Eastleigh",
-        "type": "idox",
-        "url": "https://planning.eastleigh.gov.uk/s/public-register", # Salesforce?
-        "enabled": False
-    },
-    {
-        "name": "Buckinghamshire",
-        "type": "api",
-        "enabled": False # Replaced by Doncaster
-    },
-]
+def get_metadata_path(output_dir: str = OUTPUT_DIR) -> str:
+    """Get path to the scraper metadata file."""
+    return os.path.join(output_dir, '_metadata.json')
 
 
-def get_metadata_path() -> str:
-    """Get path to the scraper metadata file."""
-    return os.path.join(OUTPUT_DIR, '_metadata.json')
+def get_centroids_path() -> str:
+    """Get path to the postcode centroid table."""
+    return os.path.join(OUTPUT_DIR, '_centroids.json')
 
 
 def load_metadata() -> dict:
@@ -169,27 +71,55 @@ def load_metadata() -> dict:
     path = get_metadata_path()
     if os.path.exists(path):
         try:
-            with open(path, 'r') as f:
-                return json.load(f)
+            with open(path, 'rb') as f:
+                return codec.loads(f.read())
         except:
             pass
     return {}
 
 
-def save_metadata(metadata: dict):
+def encode_metadata(metadata: dict) -> bytes:
+    return codec.dumps(metadata, indent=True)
+
+
+def save_metadata(metadata: dict, output_dir: str = OUTPUT_DIR):
     """Save scraper metadata."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    path = get_metadata_path()
-    with open(path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    os.makedirs(output_dir, exist_ok=True)
+    write_atomic(get_metadata_path(output_dir), encode_metadata(metadata))
+
+
+async def checkpoint(writer: ShardWriter, metadata: dict, output_dir: str = OUTPUT_DIR):
+    """
+    Make the shards written so far durable, then the metadata describing
+    them. The metadata is encoded here, on the event loop, as other councils
+    keep updating it while the writer thread saves it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    await writer.checkpoint({get_metadata_path(output_dir): encode_metadata(metadata)})
+
+
+async def save_cache(writer: Optional[ShardWriter], cache, path: str):
+    """Save a per-council cache atomically, in the writer's threads when there is one."""
+    if writer is not None:
+        await writer.run(cache.save, path)
+    else:
+        await asyncio.to_thread(cache.save, path)
 
 
-async def scrape_council(council: dict, geocoder: Geocoder, metadata: dict) -> int:
+async def scrape_council(council: dict, geocoder: Geocoder, metadata: dict,
+                         store: Optional[ApplicationStore] = None,
+                         alerts: Optional[AlertEngine] = None,
+                         output_dir: str = OUTPUT_DIR,
+                         time_limit: float = COUNCIL_DEADLINE,
+                         page_cache: Optional[PageCache] = None,
+                         writer: Optional[ShardWriter] = None) -> int:
     """
     Scrape a single council and return number of applications found.
+    `time_limit` may be shorter than COUNCIL_DEADLINE when the run's time
+    budget is nearly used up.
     """
     council_name = council["name"]
-    council_key = council_name.lower().replace(" ", "_")
+    council_key = get_council_key(council_name)
     
     # Determine date range
     last_scrape = metadata.get(council_key, {}).get('last_scrape')
@@ -205,98 +135,241 @@ async def scrape_council(council: dict, geocoder: Geocoder, metadata: dict) -> i
     
     end_date = datetime.now().strftime('%Y-%m-%d')
     
-    # Create appropriate scraper
-    if council["type"] == "api":
-        scraper = PlanningDataAPIScraper(council_name, mock_mode=MOCK_MODE)
-    elif council["type"] == "idox":
-        scraper = IdoxScraper(council.get("url", ""), council_name, mock_mode=MOCK_MODE)
-    elif council["type"] == "northgate":
-        scraper = NorthgateScraper(council.get("url", ""), council_name, mock_mode=MOCK_MODE)
-    else:
-        logger.warning(f"Unknown scraper type: {council['type']}")
+    # Create appropriate scraper (backends are imported on first use)
+    try:
+        scraper = create_scraper(council, mock_mode=MOCK_MODE)
+    except KeyError as e:
+        logger.warning(str(e))
         return 0
     
+    # Detail cache is read from the published tree and written next to the shards
+    details = None
+    if DETAIL_PAGES and scraper.HAS_DETAIL_PAGES and not scraper.mock_mode:
+        details = DetailFetcher.load(scraper, details_path(OUTPUT_DIR, council_key))
+    
+    entry = metadata.setdefault(council_key, {})
+    breaker = CircuitBreaker(entry, host_of(scraper.probe_url))
+    scraper.state = entry.setdefault('scraper', {})
+    scraper.known_ids = KnownIds.load(known_ids_path(OUTPUT_DIR, council_key))
+    scraper.page_cache = page_cache
+    
+    started = None  # Set once a real scrape starts; skipped runs don't count towards durations
     try:
         async with scraper:
-            # Fetch applications
-            applications = await scraper.fetch_applications(start_date, end_date)
+            # Portals that keep failing only get a quick probe
+            if not await breaker.allow(scraper):
+                logger.warning(f"Skipping {council_name}: circuit open ({breaker.health.get('last_error')})")
+                return 0
+            
+            started = time.monotonic()
+            # Stream pages through geocoding into the sharded JSON files
+            stats = await asyncio.wait_for(run_pipeline(
+                scraper, geocoder, start_date, end_date, output_dir,
+                save_options={'compact': COMPACT_OUTPUT, 'layout': SHARD_LAYOUT},
+                store=store, details=details, writer=writer, keep_new=alerts is not None
+            ), time_limit)
+            
+            if scraper.failed:
+                breaker.record_failure("scrape failed")
+            else:
+                breaker.record_success()
+                new_count = stats.new_count
+                if output_dir != OUTPUT_DIR:
+                    # A partial tree starts empty, so count arrivals against the published ids
+                    new_count = sum(1 for app_id in stats.scraped_ids if str(app_id) not in scraper.known_ids)
+                record_run(entry, end_date, new_count, start_date)
+                scraper.known_ids.update(stats.scraped_ids)
+                await save_cache(writer, scraper.known_ids, known_ids_path(output_dir, council_key))
             
-            if not applications:
+            if details is not None:
+                await save_cache(writer, details, details_path(output_dir, council_key))
+                logger.info(f"{council_name} details: {details.fetched} fetched, {details.reused} reused")
+            
+            if not stats.scraped:
                 logger.info(f"No applications found for {council_name}")
                 return 0
             
-            logger.info(f"Found {len(applications)} applications for {council_name}")
-            
-            # Geocode applications
-            applications = await geocoder.enrich_applications(applications)
+            logger.info(f"Found {stats.scraped} applications for {council_name}")
             
-            # Save to sharded JSON files
-            scraper.save_data(applications, OUTPUT_DIR)
+            # Match only what this run added against saved searches
+            if alerts is not None:
+                alerts.process(stats.new_applications, council_name)
             
-            # Update metadata
-            metadata[council_key] = {
+            # Update metadata (a failed run is retried from the same date)
+            if scraper.failed:
+                return stats.scraped
+            entry.update({
                 'last_scrape': end_date,
-                'last_count': len(applications),
-                'total_scraped': metadata.get(council_key, {}).get('total_scraped', 0) + len(applications)
-            }
+                'last_count': stats.scraped,
+                'total_scraped': entry.get('total_scraped', 0) + stats.scraped
+            })
             
-            return len(applications)
+            return stats.scraped
             
+    except asyncio.TimeoutError:
+        if time_limit < COUNCIL_DEADLINE:
+            # Cut short by the run's time budget, not the portal's fault
+            logger.warning(f"{council_name} stopped at the run deadline after {time_limit:.0f}s")
+        else:
+            logger.error(f"{council_name} exceeded its {COUNCIL_DEADLINE:.0f}s deadline")
+            breaker.record_failure("council deadline exceeded")
+        return 0
     except Exception as e:
         logger.error(f"Error scraping {council_name}: {e}")
+        breaker.record_failure(str(e))
         return 0
+    finally:
+        # Used to balance shards and fit the time budget (see scraper.sharding)
+        if started is not None:
+            duration = time.monotonic() - started
+            entry['last_duration'] = round(duration, 1)
+            entry['avg_duration'] = round(0.7 * entry.get('avg_duration', duration) + 0.3 * duration, 1)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scrape planning applications")
+    parser.add_argument('--shard', type=parse_shard_spec, metavar='i/N',
+                        help="Only scrape this worker's share of the councils")
+    parser.add_argument('--partial-dir',
+                        help="Write shards and metadata here for a later scraper.merge")
+    return parser.parse_args(argv)
 
 
-async def main():
+async def main(argv=None):
     """
     Main orchestration script for scraping all enabled councils.
     """
+    args = parse_args(argv)
+    # Partial runs write to their own directory; the merge step publishes
+    write_dir = args.partial_dir or OUTPUT_DIR
+    partial = args.partial_dir is not None
+    
     logger.info("=" * 60)
     logger.info("SeracTECH-FREE Scraper Starting")
     logger.info(f"Mock Mode: {MOCK_MODE}")
     logger.info(f"Output Directory: {OUTPUT_DIR}")
     logger.info(f"Days to Scrape: {DAYS_TO_SCRAPE}")
+    logger.info(f"Concurrency: {CONCURRENCY}")
+    if TIME_BUDGET:
+        logger.info(f"Time Budget: {TIME_BUDGET:.0f}s")
+    if args.shard:
+        logger.info(f"Shard: {args.shard[0]}/{args.shard[1]} -> {write_dir}")
     logger.info("=" * 60)
     
     # Load metadata
-    metadata = load_metadata()
+    metadata = await asyncio.to_thread(load_metadata)
+    scheduler = RunScheduler(metadata, TIME_BUDGET)
+    
+    # Optional SQLite source of truth (for partial runs, scraper.merge upserts into it
+    # and runs the alerts, search index and tiles)
+    store = open_store(STORE_PATH, OUTPUT_DIR) if not partial else None
+    
+    alerts = AlertEngine(ALERTS_DIR) if ALERTS_DIR and not partial else None
     
-    # Track stats
-    total_applications = 0
-    councils_scraped = 0
+    page_cache = PageCache(PAGE_CACHE, PAGE_CACHE_MB * 1024 * 1024) if PAGE_CACHE else None
     
-    # Create geocoder (shared across all scrapers)
-    async with Geocoder() as geocoder:
+    # Where every stored id lives; partial runs index their own output for the merge
+    id_index = None
+    if partial:
+        id_index = IdIndex(os.path.join(write_dir, PARTIAL_INDEX))
+    elif store is None:
+        id_index = await asyncio.to_thread(open_id_index, ID_INDEX, OUTPUT_DIR)
+    
+    # Shard and metadata writes run in threads so they don't stall requests
+    writer = ShardWriter(write_dir, COMPACT_OUTPUT, SHARD_LAYOUT, WRITER_THREADS, id_index)
+    
+    # Centroid fallback for postcodes that can't be geocoded
+    centroids = CentroidTable.load(get_centroids_path()) or CentroidTable.build(OUTPUT_DIR)
+    
+    # Create geocoder (shared across all scrapers so lookups are coalesced)
+    async with Geocoder(centroids=centroids) as geocoder:
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+        
+        async def process(council: dict) -> int:
+            async with semaphore:
+                if not scheduler.admit(council):
+                    return 0
+                
+                logger.info(f"\n{'='*40}")
+                logger.info(f"Processing: {council['name']}")
+                logger.info(f"{'='*40}")
+                
+                count = await scrape_council(council, geocoder, metadata, store, alerts, write_dir,
+                                             scheduler.time_limit(COUNCIL_DEADLINE), page_cache, writer)
+                
+                # Checkpoint so progress survives the job being killed
+                await checkpoint(writer, metadata, write_dir)
+                
+                # Small delay between councils to be polite
+                await asyncio.sleep(1)
+                return count
         
         # Process each enabled council
+        enabled = []
         for council in COUNCILS:
             if not council.get("enabled", True):
                 logger.info(f"Skipping disabled council: {council['name']}")
                 continue
-            
-            logger.info(f"\n{'='*40}")
-            logger.info(f"Processing: {council['name']}")
-            logger.info(f"{'='*40}")
-            
-            count = await scrape_council(council, geocoder, metadata)
-            total_applications += count
-            
-            if count > 0:
-                councils_scraped += 1
-            
-            # Small delay between councils to be polite
-            await asyncio.sleep(1)
+            enabled.append(council)
+        
+        if ADAPTIVE_FREQUENCY:
+            not_due = [council['name'] for council in enabled if not is_due(council, metadata)]
+            if not_due:
+                logger.info(f"Not due today: {', '.join(not_due)}")
+            enabled = [council for council in enabled if is_due(council, metadata)]
+        
+        if args.shard:
+            index, count = args.shard
+            enabled = partition_councils(enabled, metadata, count)[index]
+            logger.info(f"Shard {index}/{count} councils: {', '.join(c['name'] for c in enabled)}")
+        if partial:
+            metadata['_shard'] = {
+                'index': args.shard[0] if args.shard else 0,
+                'count': args.shard[1] if args.shard else 1,
+                'councils': [get_council_key(council['name']) for council in enabled],
+            }
+        
+        # Highest priority, then stalest first
+        enabled = scheduler.order(enabled)
+        
+        counts = await asyncio.gather(*(process(council) for council in enabled))
+        total_applications = sum(counts)
+        councils_scraped = sum(1 for count in counts if count > 0)
+    
+    if page_cache is not None:
+        page_cache.close()
+    await writer.flush()
+    
+    # Regenerate the shards that changed
+    if store is not None:
+        store.export(OUTPUT_DIR, layout=SHARD_LAYOUT, compact=COMPACT_OUTPUT)
+        store.close()
+    
+    # Seal months that closed in sectors this run didn't write (merge does it for partial runs)
+    if SHARD_LAYOUT == LAYOUT_MONTHLY and not partial:
+        await writer.run(seal_closed_months, OUTPUT_DIR, COMPACT_OUTPUT, id_index)
+    
+    if SEARCH_INDEX and not partial:
+        build_index(OUTPUT_DIR)
+    if MAP_TILES and not partial:
+        build_tiles(OUTPUT_DIR)
     
     # Save updated metadata
     metadata['last_run'] = datetime.now().isoformat()
     metadata['last_run_total'] = total_applications
-    save_metadata(metadata)
+    if not partial:
+        await writer.run(centroids.save, get_centroids_path())
+    await writer.close({get_metadata_path(write_dir): encode_metadata(metadata)})
+    if id_index is not None:
+        id_index.close()
     
     # Summary
     logger.info("\n" + "=" * 60)
     logger.info("SCRAPE COMPLETE")
     logger.info(f"Councils Scraped: {councils_scraped}")
     logger.info(f"Total Applications: {total_applications}")
+    if scheduler.deferred:
+        logger.info(f"Deferred to next run: {', '.join(scheduler.deferred)}")
     logger.info("=" * 60)
     
     return total_applications
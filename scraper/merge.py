@@ -0,0 +1,180 @@
+"""
+Merge partial outputs from sharded scrape workers.
+
+Each worker (python -m scraper.main --shard i/N --partial-dir DIR) writes
+its councils' shards and a _metadata.json to its own directory. This step
+folds them into the published tree in a fixed order, so the result does not
+depend on which worker finished first. The steps a single-process run does
+after scraping (store upsert and export, search index, map tiles, alerts)
+happen here for sharded runs.
+
+Usage:
+    python -m scraper.merge public/data partials/*
+"""
+import argparse
+import logging
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from . import codec
+from .alerts import AlertEngine
+from .centroids import CentroidTable
+from .id_index import PARTIAL_INDEX, IdIndex, open_id_index
+from .registry import load_councils
+from .search_index import build_index
+from .sharding import council_key
+from .shards import (
+    LAYOUT_MONTHLY, LAYOUT_SECTOR, details_path, iter_shards, known_ids_path, load_shard,
+    relative_shard, save_applications, seal_closed_months, sync_written, write_atomic
+)
+from .store import ApplicationStore, open_store
+from .tiles import build_tiles
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = '_metadata.json'
+SHARD_INFO_KEY = '_shard'  # Set in a worker's metadata: index, count, councils
+
+
+def _load_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        return codec.loads(f.read())
+
+
+def merge_metadata(metadata: Dict, partial: Dict) -> Dict:
+    """
+    Fold one worker's metadata into the canonical metadata. Only the councils
+    that worker was assigned are taken from it.
+    """
+    info = partial.get(SHARD_INFO_KEY, {})
+    for key in info.get('councils', []):
+        if key in partial:
+            metadata[key] = partial[key]
+
+    if partial.get('last_run') and partial['last_run'] > metadata.get('last_run', ''):
+        metadata['last_run'] = partial['last_run']
+    return metadata
+
+
+def merge_partials(output_dir: str, partial_dirs: List[str], layout: str = LAYOUT_SECTOR,
+                   compact: bool = False, index: Optional[IdIndex] = None,
+                   store: Optional[ApplicationStore] = None, search_index: bool = False,
+                   map_tiles: bool = False) -> List[Dict]:
+    """
+    Merge worker outputs into output_dir. Returns the applications that were
+    new to the published tree. Records are attributed to councils from each
+    worker's own id index. With a store, they are upserted into it and the
+    changed sectors exported; otherwise they are written to the shards
+    directly, moved between sectors if `index` is given. `search_index` and
+    `map_tiles` rebuild _search/ and _tiles/ from the merged tree.
+    """
+    metadata_path = os.path.join(output_dir, METADATA_FILE)
+    metadata = _load_json(metadata_path)
+    run_total = 0
+    added: List[Dict] = []
+    # The store keys rows by council name, workers' indexes by council key
+    names: Dict[str, str] = {}
+    if store is not None:
+        names = {council_key(council['name']): council['name']
+                 for council in load_councils(os.environ.get('SCRAPER_COUNCILS') or None)}
+
+    for partial_dir in sorted(partial_dirs):
+        owners: Dict[Tuple[str, int], str] = {}
+        if os.path.exists(os.path.join(partial_dir, PARTIAL_INDEX)):
+            with IdIndex(os.path.join(partial_dir, PARTIAL_INDEX)) as worker_index:
+                owners = worker_index.owners()
+        # Attributed by where each record is stored, as references repeat across councils
+        by_council: Dict[str, List[Dict]] = {}
+        count = 0
+        for _, filepath in iter_shards(partial_dir):
+            shard = relative_shard(partial_dir, filepath)
+            for offset, app in enumerate(load_shard(filepath)):
+                by_council.setdefault(owners.get((shard, offset), ''), []).append(app)
+                count += 1
+        for council, apps in by_council.items():
+            if store is not None:
+                added.extend(store.upsert_many(names.get(council, council) or None, apps))
+            else:
+                added.extend(save_applications(apps, output_dir, compact=compact, layout=layout,
+                                               index=index, council=council))
+
+        partial = _load_json(os.path.join(partial_dir, METADATA_FILE))
+        merge_metadata(metadata, partial)
+        for key in partial.get(SHARD_INFO_KEY, {}).get('councils', []):
+            # Per-council caches written by the worker replace the published ones
+            for path in (details_path, known_ids_path):
+                if os.path.exists(path(partial_dir, key)):
+                    os.makedirs(os.path.dirname(path(output_dir, key)), exist_ok=True)
+                    shutil.copyfile(path(partial_dir, key), path(output_dir, key))
+        run_total += partial.get('last_run_total', 0)
+        logger.info(f"Merged {count} applications from {partial_dir}")
+
+    if store is not None:
+        store.export(output_dir, layout=layout, compact=compact)
+    if layout == LAYOUT_MONTHLY:
+        seal_closed_months(output_dir, compact=compact, index=index)
+
+    metadata['last_run_total'] = run_total
+    metadata.pop(SHARD_INFO_KEY, None)
+    os.makedirs(output_dir, exist_ok=True)
+    sync_written()  # Shards first, so the metadata never runs ahead of them
+    write_atomic(metadata_path, codec.dumps(metadata, indent=True))
+    sync_written()
+
+    # Workers don't publish centroids; rebuild from the merged tree
+    CentroidTable.build(output_dir).save(os.path.join(output_dir, '_centroids.json'))
+    sync_written()
+
+    if search_index:
+        build_index(output_dir)
+    if map_tiles:
+        build_tiles(output_dir)
+
+    logger.info(f"Merge complete: {len(added)} new applications from {len(partial_dirs)} workers")
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge sharded scrape outputs")
+    parser.add_argument('output_dir')
+    parser.add_argument('partial_dirs', nargs='+')
+    parser.add_argument('--layout', choices=[LAYOUT_SECTOR, LAYOUT_MONTHLY],
+                        default=os.environ.get('SCRAPER_SHARD_LAYOUT', LAYOUT_SECTOR))
+    parser.add_argument('--compact', action='store_true',
+                        default=os.environ.get('SCRAPER_COMPACT_OUTPUT', 'false').lower() == 'true')
+    parser.add_argument('--alerts-dir', default=os.environ.get('SCRAPER_ALERTS_DIR', ''),
+                        help="Match the merged new applications against saved searches")
+    parser.add_argument('--id-index', default=os.environ.get('SCRAPER_ID_INDEX', ''),
+                        help="SQLite id index of the output tree (default: $SCRAPER_ID_INDEX)")
+    parser.add_argument('--store', default=os.environ.get('SCRAPER_STORE', ''),
+                        help="SQLite store to upsert into and export from (default: $SCRAPER_STORE)")
+    parser.add_argument('--search-index', action='store_true',
+                        default=os.environ.get('SCRAPER_SEARCH_INDEX', 'false').lower() == 'true',
+                        help="Rebuild _search/ from the merged tree")
+    parser.add_argument('--map-tiles', action='store_true',
+                        default=os.environ.get('SCRAPER_MAP_TILES', 'false').lower() == 'true',
+                        help="Rebuild _tiles/ from the merged tree")
+    args = parser.parse_args(argv)
+
+    # As in scraper.main, the store replaces the id index as the source of truth
+    store = open_store(args.store, args.output_dir)
+    index = open_id_index(args.id_index, args.output_dir) if store is None else None
+    try:
+        added = merge_partials(args.output_dir, args.partial_dirs, layout=args.layout,
+                               compact=args.compact, index=index, store=store,
+                               search_index=args.search_index, map_tiles=args.map_tiles)
+    finally:
+        if index is not None:
+            index.close()
+        if store is not None:
+            store.close()
+    if args.alerts_dir:
+        AlertEngine(args.alerts_dir).process(added)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -1,15 +1,58 @@
 import aiohttp
-from bs4 import BeautifulSoup
-from typing import List, Dict, Optional
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 import re
 import os
+import html as html_lib
 from .base import BaseScraper
 from .rate_limiter import RateLimiter, RetryConfig
 
 logger = logging.getLogger(__name__)
 
+ASPNET_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION', '__VIEWSTATEENCRYPTED')
+
+# One pass over the page visits every <input> tag and <a>...</a> element
+_TAGS = re.compile(r'<input\b[^>]*>|<a\b([^>]*)>(.*?)</a\s*>', re.IGNORECASE | re.DOTALL)
+_ATTR = re.compile(r'([\w:.$-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_INNER_TAG = re.compile(r'<[^>]+>')
+_NEXT_TEXT = re.compile(r'Next|>', re.IGNORECASE)
+_POSTBACK = re.compile(r"__doPostBack\('([^']+)','([^']*)'\)")
+_RESULTS_TABLE = SoupStrainer('table', class_=re.compile(r'\brgMasterTable\b'))
+
+
+def _attrs(tag: str) -> Dict[str, str]:
+    return {name.lower(): html_lib.unescape(double or single)
+            for name, double, single in _ATTR.findall(tag)}
+
+
+def scan_aspnet_page(html: str) -> Tuple[Dict[str, str], Optional[Tuple[str, str]]]:
+    """
+    Pull the ASP.NET hidden fields and the pager's "Next" postback
+    (event target, argument) out of a page in a single linear scan,
+    without building a document tree.
+    """
+    fields: Dict[str, str] = {}
+    postback = None
+
+    for match in _TAGS.finditer(html):
+        if match.group(1) is None:
+            attrs = _attrs(match.group(0))
+            if attrs.get('name') in ASPNET_FIELDS:
+                fields[attrs['name']] = attrs.get('value', '')
+        elif postback is None:
+            text = html_lib.unescape(_INNER_TAG.sub('', match.group(2)))
+            if not _NEXT_TEXT.search(text):
+                continue
+            # The first "Next" link decides; it may not be a postback
+            href = _attrs(match.group(1)).get('href', '')
+            found = _POSTBACK.search(href)
+            postback = (found.group(1), found.group(2)) if found else ('', '')
+
+    return fields, postback if postback and postback[0] else None
+
+
 class NorthgateScraper(BaseScraper):
     """
     Scraper for Northgate Planning Explorer systems.
@@ -18,12 +61,28 @@ class NorthgateScraper(BaseScraper):
     Northgate systems use ASP.NET WebForms with ViewState.
     """
     
+    HAS_DETAIL_PAGES = True
+    DATE_ORDERED = True
+    
+    # Search form control names; these vary by council and can be
+    # overridden with a "fields" entry in the council registry
+    DEFAULT_FIELDS = {
+        'date_from': 'ctl00$MainContent$txtDateReceivedFrom',
+        'date_to': 'ctl00$MainContent$txtDateReceivedTo',
+        'search_button': 'ctl00$MainContent$btnSearch',
+    }
+    
     def __init__(self, base_url: str, council_name: str, mock_mode: bool = False):
-        super().__init__(base_url, council_name)
+        super().__init__(base_url, council_name, mock_mode)
         self.mock_mode = mock_mode or os.environ.get('SCRAPER_MOCK_MODE', 'false').lower() == 'true'
         self.search_url = f"{self.base_url}/PlanningSearch.aspx"
         self.rate_limiter = RateLimiter(rate=1.0, burst=3)
         self.retry_config = RetryConfig(max_retries=3, base_delay=2.0)
+        self.fields = dict(self.DEFAULT_FIELDS)
+
+    def configure(self, council: Dict):
+        super().configure(council)
+        self.fields.update(council.get('fields', {}))
 
     async def fetch_applications(self, start_date: str, end_date: str) -> List[Dict]:
         """
@@ -39,6 +98,7 @@ class NorthgateScraper(BaseScraper):
             return self.generate_mock_data(start_date)
         
         all_applications = []
+        found = 0
         
         try:
             # Step 1: Get the search page to establish session and get ViewState
@@ -46,22 +106,21 @@ class NorthgateScraper(BaseScraper):
             async with self.session.get(self.search_url) as response:
                 if response.status != 200:
                     logger.error(f"Failed to load search page: {response.status}")
-                    return self.generate_mock_data(start_date)
+                    self.failed = True
+                    return []
                 search_html = await response.text()
             
             # Step 2: Extract ASP.NET form fields (ViewState, EventValidation, etc.)
-            soup = BeautifulSoup(search_html, 'html.parser')
-            form_data = self._extract_aspnet_fields(soup)
+            form_data, _ = scan_aspnet_page(search_html)
             
             # Step 3: Add search parameters
             s_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
             e_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
             
-            # Northgate field names vary by council but commonly include:
             form_data.update({
-                'ctl00$MainContent$txtDateReceivedFrom': s_date_obj.strftime('%d/%m/%Y'),
-                'ctl00$MainContent$txtDateReceivedTo': e_date_obj.strftime('%d/%m/%Y'),
-                'ctl00$MainContent$btnSearch': 'Search',
+                self.fields['date_from']: s_date_obj.strftime('%d/%m/%Y'),
+                self.fields['date_to']: e_date_obj.strftime('%d/%m/%Y'),
+                self.fields['search_button']: 'Search',
             })
             
             # Step 4: Submit search
@@ -69,26 +128,24 @@ class NorthgateScraper(BaseScraper):
             async with self.session.post(self.search_url, data=form_data) as response:
                 if response.status != 200:
                     logger.error(f"Search POST failed: {response.status}")
-                    return self.generate_mock_data(start_date)
+                    self.failed = True
+                    return []
                 results_html = await response.text()
             
             # Step 5: Parse results and handle pagination
             page = 1
             while True:
                 logger.info(f"Parsing page {page}...")
-                apps = self.parse_results(results_html)
-                all_applications.extend(apps)
-                
-                # Check for next page in Northgate's grid pager
-                soup = BeautifulSoup(results_html, 'html.parser')
-                next_btn = soup.find('a', string=re.compile(r'Next|>', re.IGNORECASE))
-                
-                if not next_btn:
+                apps = self._parse_page(results_html)
+                found += len(apps)
+                if not await self._emit_page(apps):
+                    all_applications.extend(apps)
+                if self._page_is_known(apps):
                     break
                 
-                # Northgate uses __doPostBack for pagination
-                href = next_btn.get('href', '')
-                if '__doPostBack' not in href:
+                # Check for next page in Northgate's grid pager, which uses __doPostBack
+                form_data, postback = scan_aspnet_page(results_html)
+                if not postback:
                     break
                 
                 page += 1
@@ -96,18 +153,8 @@ class NorthgateScraper(BaseScraper):
                     logger.warning("Reached page limit (50)")
                     break
                 
-                # Extract postback arguments
-                postback_match = re.search(r"__doPostBack\('([^']+)','([^']*)'\)", href)
-                if not postback_match:
-                    break
-                
-                event_target = postback_match.group(1)
-                event_argument = postback_match.group(2)
-                
                 # Update form data for postback
-                form_data = self._extract_aspnet_fields(soup)
-                form_data['__EVENTTARGET'] = event_target
-                form_data['__EVENTARGUMENT'] = event_argument
+                form_data['__EVENTTARGET'], form_data['__EVENTARGUMENT'] = postback
                 
                 await self.rate_limiter.acquire()
                 async with self.session.post(self.search_url, data=form_data) as response:
@@ -115,32 +162,22 @@ class NorthgateScraper(BaseScraper):
                         break
                     results_html = await response.text()
             
-            logger.info(f"Total applications found: {len(all_applications)}")
+            logger.info(f"Total applications found: {found}")
             
         except Exception as e:
             logger.error(f"Scraping error: {e}")
-            return self.generate_mock_data(start_date)
+            self.failed = True
+            return []
         
-        return all_applications if all_applications else self.generate_mock_data(start_date)
+        # An empty result is real: mock data is only for mock mode
+        return all_applications
     
-    def _extract_aspnet_fields(self, soup: BeautifulSoup) -> Dict[str, str]:
-        """
-        Extract ASP.NET hidden form fields (ViewState, EventValidation, etc.).
-        """
-        form_data = {}
-        
-        for field_name in ['__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION', '__VIEWSTATEENCRYPTED']:
-            field = soup.find('input', {'name': field_name})
-            if field:
-                form_data[field_name] = field.get('value', '')
-        
-        return form_data
-
     def parse_results(self, html: str) -> List[Dict]:
         """
         Parses the search results page for Northgate systems.
         """
-        soup = BeautifulSoup(html, 'html.parser')
+        # Only the results grid is built into a tree, not the ViewState-heavy rest
+        soup = BeautifulSoup(html, self.parser, parse_only=_RESULTS_TABLE)
         results = []
         
         # Northgate results are usually in a GridView table
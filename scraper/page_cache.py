@@ -0,0 +1,118 @@
+"""
+Cache of parsed results pages.
+
+Results pages are often byte-for-byte the same as on the previous run once
+per-request noise (session ids in links, ASP.NET ViewState/EventValidation,
+form tokens) is removed. PageCache maps a hash of that normalised body to
+the rows parse_results extracted, so an unchanged page is not parsed again.
+
+Entries live in a small SQLite file and the least recently used ones are
+evicted once the stored rows exceed max_bytes. The same file keeps parsed
+search forms (see IdoxScraper) so a nightly run doesn't refetch them.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_SESSION_ID = re.compile(r'jsessionid=[^"\'&?#;>\s]*', re.IGNORECASE)
+# Per-request form fields: never part of a page's identity, never worth reusing
+VOLATILE_FIELDS = (
+    '__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION', '__VIEWSTATEENCRYPTED',
+    '__REQUESTDIGEST', '_csrf', 'org.apache.struts.taglib.html.TOKEN',
+)
+_VOLATILE_INPUT = re.compile(
+    r'<input[^>]*name="(?:' + '|'.join(re.escape(name) for name in VOLATILE_FIELDS) + r')"[^>]*>',
+    re.IGNORECASE
+)
+
+
+def fingerprint(base_url: str, html: str) -> str:
+    """Hash of a page with its per-request tokens removed."""
+    normalised = _VOLATILE_INPUT.sub('', _SESSION_ID.sub('', html))
+    return hashlib.sha1(f"{base_url}\0{normalised}".encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Size-bounded LRU of page fingerprint -> parsed rows, stored on disk."""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, rows TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages (used)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS forms (key TEXT PRIMARY KEY, form TEXT NOT NULL)")
+        self._total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Rows cached for a page, or None. Each call decodes a fresh copy, so
+        callers may modify the rows freely.
+        """
+        row = self.conn.execute("SELECT rows FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.conn.execute("UPDATE pages SET used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, rows: List[Dict]):
+        payload = json.dumps(rows, separators=(',', ':'))
+        previous = self.conn.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (key, rows, size, used) VALUES (?, ?, ?, ?)",
+            (key, payload, len(payload), time.time())
+        )
+        self._total += len(payload) - (previous[0] if previous else 0)
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def get_form(self, key: str) -> Optional[Dict]:
+        """A saved search form, or None. Forms are tiny and never evicted."""
+        row = self.conn.execute("SELECT form FROM forms WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_form(self, key: str, form: Dict):
+        self.conn.execute("INSERT OR REPLACE INTO forms (key, form) VALUES (?, ?)",
+                          (key, json.dumps(form, separators=(',', ':'))))
+
+    def forget_form(self, key: str):
+        self.conn.execute("DELETE FROM forms WHERE key = ?", (key,))
+
+    def _evict(self):
+        """Drop least recently used pages until the cache is back under its bound."""
+        excess = self._total - self.max_bytes
+        doomed = []
+        for key, size in self.conn.execute("SELECT key, size FROM pages ORDER BY used"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+            self._total -= size
+        self.conn.executemany("DELETE FROM pages WHERE key = ?", doomed)
+        logger.debug(f"Evicted {len(doomed)} cached pages")
+
+    def close(self):
+        if self.hits or self.misses:
+            logger.info(f"Page cache: {self.hits} hits, {self.misses} misses")
+        self.conn.close()
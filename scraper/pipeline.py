@@ -0,0 +1,206 @@
+"""
+Streaming scrape pipeline.
+
+Runs scrape -> geocode -> write as async stages connected by bounded queues,
+so geocode batches fire as soon as a full batch of postcodes is buffered and
+shards are written while later result pages are still being fetched. With a
+ShardWriter the writes happen in its thread pool, off the event loop.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set
+
+from .base import BaseScraper
+from .details import DetailFetcher
+from .geocoder import Geocoder
+from .sharding import council_key
+from .store import ApplicationStore
+from .writer import ShardWriter
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class PipelineStats:
+    """
+    Counters collected while a pipeline runs. The new records themselves are
+    only kept when asked for (keep_new, e.g. for alerts).
+    """
+
+    def __init__(self, keep_new: bool = False):
+        self.started = time.monotonic()
+        self.scraped = 0
+        self.written = 0
+        self.new_count = 0
+        self.new_applications: Optional[List[Dict]] = [] if keep_new else None
+        self.scraped_ids: Set[str] = set()
+        self.first_write_latency: Optional[float] = None
+
+
+async def _scrape_stage(scraper: BaseScraper, start_date: str, end_date: str,
+                        out_queue: asyncio.Queue, stats: PipelineStats):
+    async for page in scraper.iter_applications(start_date, end_date):
+        stats.scraped += len(page)
+        stats.scraped_ids.update(app['id'] for app in page if app.get('id'))
+        await out_queue.put(page)
+    await out_queue.put(_DONE)
+
+
+async def _detail_stage(details: DetailFetcher, in_queue: asyncio.Queue, out_queue: asyncio.Queue):
+    while True:
+        page = await in_queue.get()
+        if page is _DONE:
+            break
+        await out_queue.put(await details.enrich(page))
+    await out_queue.put(_DONE)
+
+
+async def _geocode_stage(geocoder: Geocoder, in_queue: asyncio.Queue, out_queue: asyncio.Queue,
+                         buffer_size: int):
+    buffer: List[Dict] = []
+    postcodes = set()
+
+    async def flush():
+        nonlocal buffer, postcodes
+        if buffer:
+            await out_queue.put(await geocoder.enrich_applications(buffer))
+        buffer, postcodes = [], set()
+
+    while True:
+        page = await in_queue.get()
+        if page is _DONE:
+            break
+
+        lookups = {
+            app['postcode'] for app in page
+            if app.get('postcode') and (app.get('lat', 0) == 0 or app.get('lng', 0) == 0)
+        }
+        if not lookups:
+            # Nothing to fetch: pass the page on rather than holding it back
+            await out_queue.put(await geocoder.enrich_applications(page))
+            continue
+
+        for app in page:
+            postcode = app.get('postcode')
+            if postcode in lookups and postcode not in postcodes:
+                # Fire as soon as the batch is full rather than waiting for the scrape
+                if len(postcodes) >= Geocoder.BULK_LIMIT:
+                    await flush()
+                postcodes.add(postcode)
+            buffer.append(app)
+        # Bound memory even when most records share a few postcodes
+        if len(buffer) >= buffer_size:
+            await flush()
+
+    await flush()
+    await out_queue.put(_DONE)
+
+
+async def _write_stage(scraper: BaseScraper, in_queue: asyncio.Queue, output_dir: str,
+                       flush_size: int, save_options: Dict, store: Optional[ApplicationStore],
+                       writer: Optional[ShardWriter], stats: PipelineStats):
+    buffer: List[Dict] = []
+    saving: List[asyncio.Future] = []
+
+    def record(saved: List[Dict], count: int):
+        stats.new_count += len(saved)
+        if stats.new_applications is not None:
+            stats.new_applications.extend(saved)
+        stats.written += count
+        if stats.first_write_latency is None:
+            stats.first_write_latency = time.monotonic() - stats.started
+
+    async def save(batch: List[Dict]):
+        record(await writer.save(batch, council_key(scraper.council_name)), len(batch))
+
+    def flush():
+        nonlocal buffer
+        if not buffer:
+            return
+        if store is not None:
+            # The store is the source of truth; shards are exported later
+            record(store.upsert_many(scraper.council_name, buffer), len(buffer))
+        elif writer is not None:
+            # Don't wait: batches queued while a shard is busy are merged into one write
+            saving.append(asyncio.ensure_future(save(buffer)))
+        else:
+            record(scraper.save_data(buffer, output_dir, **save_options), len(buffer))
+        buffer = []
+
+    try:
+        while True:
+            batch = await in_queue.get()
+            if batch is _DONE:
+                break
+            buffer.extend(batch)
+            if len(buffer) >= flush_size:
+                flush()
+
+        flush()
+        await asyncio.gather(*saving)
+    finally:
+        for task in saving:
+            task.cancel()
+
+
+async def run_pipeline(
+    scraper: BaseScraper,
+    geocoder: Geocoder,
+    start_date: str,
+    end_date: str,
+    output_dir: str,
+    queue_size: int = 4,
+    flush_size: int = 500,
+    save_options: Optional[Dict] = None,
+    store: Optional[ApplicationStore] = None,
+    details: Optional[DetailFetcher] = None,
+    writer: Optional[ShardWriter] = None,
+    keep_new: bool = False
+) -> PipelineStats:
+    """
+    Scrape, geocode and save applications for one council as a stream.
+
+    Each queue holds at most `queue_size` batches, so a slow stage applies
+    backpressure to the ones before it; the geocode stage holds at most
+    `flush_size` records while it fills a lookup batch. If any stage fails or the caller is
+    cancelled, the remaining stages are cancelled before returning.
+    `save_options` are passed through to scraper.save_data. If a store is
+    given, batches are inserted into it instead of being written as shards;
+    otherwise, given a writer, shards are written through it (its own output
+    directory and options then apply instead).
+    If `details` is given, pages are enriched from detail pages before
+    geocoding. With keep_new, the records that weren't stored before are
+    collected in stats.new_applications; otherwise only counted.
+    """
+    stats = PipelineStats(keep_new)
+    scraped: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    geocoded: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    tasks = [asyncio.ensure_future(_scrape_stage(scraper, start_date, end_date, scraped, stats))]
+    if details is not None:
+        enriched: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        tasks.append(asyncio.ensure_future(_detail_stage(details, scraped, enriched)))
+        scraped = enriched
+    tasks += [
+        asyncio.ensure_future(_geocode_stage(geocoder, scraped, geocoded, flush_size)),
+        asyncio.ensure_future(_write_stage(scraper, geocoded, output_dir, flush_size, save_options or {},
+                                            store, writer, stats)),
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    if stats.first_write_latency is not None:
+        logger.info(
+            f"{scraper.council_name}: first write after {stats.first_write_latency:.1f}s, "
+            f"{stats.written} applications written"
+        )
+    return stats
@@ -13,8 +13,10 @@ import logging
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import os
+from . import codec
 from .base import BaseScraper
 from .rate_limiter import RateLimiter
+from .centroids import PRECISION_ADDRESS
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +49,18 @@ class PlanningDataAPIScraper(BaseScraper):
     BASE_URL = "https://www.planning.data.gov.uk"
     
     def __init__(self, council_name: str, mock_mode: bool = False):
-        super().__init__(self.BASE_URL, council_name)
+        super().__init__(self.BASE_URL, council_name, mock_mode)
         self.mock_mode = mock_mode or os.environ.get('SCRAPER_MOCK_MODE', 'false').lower() == 'true'
         self.rate_limiter = RateLimiter(rate=2.0, burst=5)  # API is more tolerant
         self.org_entity = COUNCIL_ORG_ENTITIES.get(council_name)
+
+    @property
+    def probe_url(self) -> str:
+        return f"{self.BASE_URL}/entity.json?dataset=planning-application&limit=1"
+
+    @classmethod
+    def from_config(cls, council: Dict, mock_mode: bool = False) -> 'PlanningDataAPIScraper':
+        return cls(council['name'], mock_mode=mock_mode)
         
     async def fetch_applications(self, start_date: str, end_date: str) -> List[Dict]:
         """
@@ -71,6 +81,7 @@ class PlanningDataAPIScraper(BaseScraper):
             logger.info(f"Organisation entity: {self.org_entity}")
         
         all_applications = []
+        found = 0
         offset = 0
         limit = 100
         
@@ -100,9 +111,10 @@ class PlanningDataAPIScraper(BaseScraper):
                 async with self.session.get(url) as response:
                     if response.status != 200:
                         logger.error(f"API request failed: {response.status}")
+                        self.failed = offset == 0
                         break
                     
-                    data = await response.json()
+                    data = await response.json(loads=codec.loads)
                 
                 entities = data.get('entities', [])
                 
@@ -110,10 +122,16 @@ class PlanningDataAPIScraper(BaseScraper):
                     break
                 
                 # Convert to our standard format
+                page_apps = []
                 for entity in entities:
                     app = self._convert_entity(entity)
                     if app:
-                        all_applications.append(app)
+                        page_apps.append(app)
+                found += len(page_apps)
+                if not await self._emit_page(page_apps):
+                    all_applications.extend(page_apps)
+                if self._page_is_known(page_apps):
+                    break
                 
                 logger.info(f"Fetched {len(entities)} entities (offset {offset})")
                 
@@ -132,10 +150,12 @@ class PlanningDataAPIScraper(BaseScraper):
             logger.error(f"API error: {e}")
             import traceback
             traceback.print_exc()
-            return self._generate_mock_data(start_date)
+            self.failed = True
+            return []
         
-        logger.info(f"Total applications from API: {len(all_applications)}")
-        return all_applications if all_applications else self._generate_mock_data(start_date)
+        # An empty result is real: mock data is only for mock mode
+        logger.info(f"Total applications from API: {found}")
+        return all_applications
     
     def _convert_entity(self, entity: Dict) -> Optional[Dict]:
         """
@@ -159,10 +179,11 @@ class PlanningDataAPIScraper(BaseScraper):
             # API often puts description in 'description' field, not name
             description = entity.get('description', '') or entity.get('name', '')
 
-            # If address is missing but we know the council, use a placeholder
+            # If address is missing but we know the council, file it under the
+            # town centre district; the geocoder places it by district centroid
             if not address and self.council_name == "Doncaster":
                 address = "Doncaster, UK (Address not provided by API)"
-                postcode = "DN1 1AA" # Placeholder for Doncaster center
+                postcode = "DN1"
 
             # Try to extract postcode using regex
             import re
@@ -174,7 +195,7 @@ class PlanningDataAPIScraper(BaseScraper):
             if postcode_match:
                 postcode = postcode_match.group(0).upper()
             
-            return {
+            app = {
                 'id': entity.get('reference', entity.get('entity', '')),
                 'desc': description[:500],  # Truncate long descriptions
                 'addr': address,
@@ -185,6 +206,9 @@ class PlanningDataAPIScraper(BaseScraper):
                 'status': self._normalize_status(entity.get('planning-permission-status', 'Unknown')),
                 'link': f"https://www.planning.data.gov.uk/entity/{entity.get('entity', '')}"
             }
+            if lat and lng:
+                app['geo_precision'] = PRECISION_ADDRESS
+            return app
         except Exception as e:
             logger.error(f"Error converting entity: {e}")
             return None
@@ -320,7 +344,7 @@ def create_scraper(council_name: str, mock_mode: bool = False) -> BaseScraper:
     Create the appropriate scraper for a council.
     Prefers the Planning Data API when available.
     """
-    if council_name in COUNCIL_ORG_CODES:
+    if COUNCIL_ORG_ENTITIES.get(council_name):
         return PlanningDataAPIScraper(council_name, mock_mode)
     else:
         # Fall back to Idox scraper
@@ -0,0 +1,284 @@
+"""
+Vectorized query engine over the application data.
+
+Loads lat/lng/date/status columns for every record into NumPy arrays, cached
+as .npy files that are memory-mapped on later runs, and answers radius,
+bounding-box and date-range queries without looping over dicts in Python.
+The cache records each shard's size and mtime and is rebuilt once any of
+them change, since rows point at shard offsets.
+If SciPy is installed, build_tree() adds a KD-tree for repeated radius queries.
+
+Usage:
+    python -m scraper.query public/data .cache/scraper/columns --radius 50.80 -1.09 2
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Optional dependency
+    cKDTree = None
+
+from .shards import iter_shards, load_shard
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+NO_DATE = -1
+
+_EPOCH = date(1970, 1, 1)
+_COLUMNS = ('lat', 'lng', 'date', 'status', 'shard', 'offset')
+
+
+def date_to_days(value) -> int:
+    """Days since 1970-01-01 for "YYYY-MM-DD" or "DD/MM/YYYY", else NO_DATE."""
+    if isinstance(value, str):
+        for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                return (datetime.strptime(value.strip(), fmt).date() - _EPOCH).days
+            except ValueError:
+                continue
+    return NO_DATE
+
+
+def fingerprint(output_dir: str) -> List[List]:
+    """[path, mtime_ns, size] for every shard, to tell when a cache is stale."""
+    entries = []
+    for _, filepath in iter_shards(output_dir):
+        stat = os.stat(filepath)
+        entries.append([os.path.relpath(filepath, output_dir), stat.st_mtime_ns, stat.st_size])
+    return entries
+
+
+def _save_array(path: str, array: np.ndarray):
+    # Replaced rather than truncated: an open cache may still have it mapped
+    with open(f"{path}.tmp", 'wb') as f:
+        np.save(f, array)
+    os.replace(f"{path}.tmp", path)
+
+
+class ColumnCache:
+    """
+    Columnar copy of the shard tree: one .npy file per column plus meta.json
+    with the status dictionary and shard list needed to map rows back.
+    """
+
+    def __init__(self, cache_dir: str, columns: Dict[str, np.ndarray], meta: Dict):
+        self.cache_dir = cache_dir
+        self.columns = columns
+        self.statuses: List[str] = meta['statuses']
+        self.shards: List[str] = meta['shards']
+        self.output_dir: str = meta['output_dir']
+
+    def __len__(self) -> int:
+        return len(self.columns['lat'])
+
+    @classmethod
+    def build(cls, output_dir: str, cache_dir: str) -> 'ColumnCache':
+        """Scan the shard tree once and write the column files."""
+        lat, lng, days, status, shard, offset = [], [], [], [], [], []
+        statuses: Dict[str, int] = {}
+        shards: List[str] = []
+        # Taken first, so a shard rewritten during the scan makes the cache stale
+        stamp = fingerprint(output_dir)
+
+        for _, filepath in iter_shards(output_dir):
+            shard_id = len(shards)
+            shards.append(os.path.relpath(filepath, output_dir))
+            for index, app in enumerate(load_shard(filepath)):
+                has_coords = app.get('lat') and app.get('lng') and app.get('geo_precision') != 'none'
+                lat.append(app['lat'] if has_coords else np.nan)
+                lng.append(app['lng'] if has_coords else np.nan)
+                days.append(date_to_days(app.get('date_received')))
+                status.append(statuses.setdefault(app.get('status') or 'Unknown', len(statuses)))
+                shard.append(shard_id)
+                offset.append(index)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = {
+            'lat': np.asarray(lat, dtype=np.float64),
+            'lng': np.asarray(lng, dtype=np.float64),
+            'date': np.asarray(days, dtype=np.int32),
+            'status': np.asarray(status, dtype=np.int16),
+            'shard': np.asarray(shard, dtype=np.int32),
+            'offset': np.asarray(offset, dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            _save_array(os.path.join(cache_dir, f"{name}.npy"), array)
+
+        meta = {'output_dir': output_dir, 'statuses': list(statuses), 'shards': shards, 'fingerprint': stamp}
+        meta_path = os.path.join(cache_dir, 'meta.json')
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+        logger.info(f"Built column cache of {len(lat)} records in {cache_dir}")
+        return cls.open(cache_dir)
+
+    @classmethod
+    def open(cls, cache_dir: str) -> 'ColumnCache':
+        """Memory-map an existing cache."""
+        with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        columns = {
+            name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode='r')
+            for name in _COLUMNS
+        }
+        return cls(cache_dir, columns, meta)
+
+    @classmethod
+    def is_current(cls, output_dir: str, cache_dir: str) -> bool:
+        """Whether the cache exists and was built from the shards as they are now."""
+        try:
+            with open(os.path.join(cache_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return meta.get('output_dir') == output_dir and meta.get('fingerprint') == fingerprint(output_dir)
+
+    @classmethod
+    def open_or_build(cls, output_dir: str, cache_dir: str) -> 'ColumnCache':
+        """Open the cache, rebuilding it if the shard tree changed since it was built."""
+        if cls.is_current(output_dir, cache_dir):
+            return cls.open(cache_dir)
+        return cls.build(output_dir, cache_dir)
+
+
+class QueryEngine:
+    """
+    Radius, bounding-box, date and status queries over a ColumnCache.
+    Every method returns row indexes into the cache.
+    """
+
+    def __init__(self, cache: ColumnCache):
+        self.cache = cache
+        self.lat = np.asarray(cache.columns['lat'])
+        self.lng = np.asarray(cache.columns['lng'])
+        self._lat_rad = np.radians(self.lat)
+        self._lng_rad = np.radians(self.lng)
+        self._cos_lat = np.cos(self._lat_rad)
+        self._tree = None
+
+    def distances_km(self, lat: float, lng: float, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Haversine distance from a point to every row (or the given rows)."""
+        lat_rad, lng_rad, cos_lat = self._lat_rad, self._lng_rad, self._cos_lat
+        if rows is not None:
+            lat_rad, lng_rad, cos_lat = lat_rad[rows], lng_rad[rows], cos_lat[rows]
+
+        lat0, lng0 = np.radians(lat), np.radians(lng)
+        a = (np.sin((lat_rad - lat0) / 2) ** 2
+             + np.cos(lat0) * cos_lat * np.sin((lng_rad - lng0) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> np.ndarray:
+        mask = (self.lat >= min_lat) & (self.lat <= max_lat) & (self.lng >= min_lng) & (self.lng <= max_lng)
+        return np.flatnonzero(mask)
+
+    def radius(self, lat: float, lng: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows within radius_km of a point, closest first.
+        Returns (rows, distances_km).
+        """
+        if self._tree is not None:
+            rows = np.asarray(self._tree.query_ball_point(self._unit_vector(lat, lng),
+                                                         self._chord(radius_km)), dtype=np.int64)
+            rows = self._valid_rows[rows]
+        else:
+            # Cheap bounding-box prefilter before the exact distance
+            dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+            dlng = dlat / max(np.cos(np.radians(lat)), 1e-6)
+            rows = self.bbox(lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+        distances = self.distances_km(lat, lng, rows)
+        keep = distances <= radius_km
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+    def date_range(self, start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        days = np.asarray(self.cache.columns['date'])
+        mask = days != NO_DATE
+        if start:
+            mask &= days >= date_to_days(start)
+        if end:
+            mask &= days <= date_to_days(end)
+        return np.flatnonzero(mask)
+
+    def with_status(self, status: str) -> np.ndarray:
+        if status not in self.cache.statuses:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.asarray(self.cache.columns['status']) == self.cache.statuses.index(status))
+
+    def build_tree(self) -> bool:
+        """
+        Build a KD-tree over the geocoded rows for repeated radius queries.
+        Returns False (and keeps using the vectorized scan) without SciPy.
+        """
+        if cKDTree is None:
+            return False
+        self._valid_rows = np.flatnonzero(~np.isnan(self.lat))
+        lat, lng = self._lat_rad[self._valid_rows], self._lng_rad[self._valid_rows]
+        points = np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+        self._tree = cKDTree(points)
+        return True
+
+    @staticmethod
+    def _unit_vector(lat: float, lng: float) -> np.ndarray:
+        lat, lng = np.radians(lat), np.radians(lng)
+        return np.array([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+    @staticmethod
+    def _chord(radius_km: float) -> float:
+        return 2 * np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+    def records(self, rows: np.ndarray) -> List[Dict]:
+        """Load the records for a set of rows from their shards."""
+        shards = np.asarray(self.cache.columns['shard'])[rows]
+        offsets = np.asarray(self.cache.columns['offset'])[rows]
+        loaded: Dict[int, List[Dict]] = {}
+        results = []
+        for shard, offset in zip(shards.tolist(), offsets.tolist()):
+            if shard not in loaded:
+                loaded[shard] = load_shard(os.path.join(self.cache.output_dir, self.cache.shards[shard]))
+            results.append(loaded[shard][offset])
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query applications by location and date")
+    parser.add_argument('output_dir')
+    parser.add_argument('cache_dir')
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the column cache")
+    parser.add_argument('--radius', nargs=3, type=float, metavar=('LAT', 'LNG', 'KM'))
+    parser.add_argument('--since', help="Only applications received on or after YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        cache = ColumnCache.build(args.output_dir, args.cache_dir)
+    else:
+        cache = ColumnCache.open_or_build(args.output_dir, args.cache_dir)
+    engine = QueryEngine(cache)
+
+    rows = np.arange(len(cache))
+    distances = None
+    if args.radius:
+        rows, distances = engine.radius(*args.radius)
+    if args.since:
+        keep = np.isin(rows, engine.date_range(start=args.since))
+        rows = rows[keep]
+        distances = distances[keep] if distances is not None else None
+
+    for i, app in enumerate(engine.records(rows)):
+        distance = f"{distances[i]:.2f}km " if distances is not None else ""
+        print(f"{distance}{app.get('date_received', '')} {app.get('id', '')} {app.get('addr', '')}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
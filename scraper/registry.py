@@ -0,0 +1,93 @@
+"""
+Council registry and scraper backend loader.
+
+Councils are declared in a JSON file (scraper/councils.json by default):
+
+    {
+      "defaults": {"enabled": true, "priority": 0, "concurrency": 1, "parser": "html.parser"},
+      "councils": [
+        {"name": "Fareham", "type": "northgate", "url": "...",
+         "rate_limit": {"rate": 1.0, "burst": 3},
+         "fields": {"date_from": "ctl00$MainContent$txtDateReceivedFrom"}}
+      ]
+    }
+
+Each council's "type" names a scraper backend. The built-in backends are
+listed below as "module:Class" strings and other packages can add their own
+under the "seractech_free.scrapers" entry point group; either way a backend
+module is only imported when a council actually uses it.
+"""
+import importlib
+import json
+import logging
+import os
+from importlib.metadata import entry_points
+from typing import Dict, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'seractech_free.scrapers'
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(__file__), 'councils.json')
+
+BUILTIN_BACKENDS = {
+    'api': 'scraper.planning_api:PlanningDataAPIScraper',
+    'idox': 'scraper.idox:IdoxScraper',
+    'northgate': 'scraper.northgate:NorthgateScraper',
+}
+
+_loaded: Dict[str, type] = {}
+
+
+def _entry_point_backends() -> Dict[str, str]:
+    """Backends registered by installed packages, as "module:Class" strings."""
+    try:
+        return {ep.name: ep.value for ep in entry_points(group=ENTRY_POINT_GROUP)}
+    except TypeError:  # Python < 3.10
+        return {ep.name: ep.value for ep in entry_points().get(ENTRY_POINT_GROUP, [])}
+
+
+def available_backends() -> Dict[str, str]:
+    backends = dict(BUILTIN_BACKENDS)
+    backends.update(_entry_point_backends())
+    return backends
+
+
+def load_backend(scraper_type: str) -> Type:
+    """Import and return the scraper class for a council type."""
+    if scraper_type not in _loaded:
+        target = available_backends().get(scraper_type)
+        if target is None:
+            raise KeyError(f"Unknown scraper type: {scraper_type}")
+        module_name, _, class_name = target.partition(':')
+        _loaded[scraper_type] = getattr(importlib.import_module(module_name), class_name)
+    return _loaded[scraper_type]
+
+
+def load_councils(path: Optional[str] = None) -> List[Dict]:
+    """
+    Load the council registry, applying the file's defaults to each entry.
+    Councils are returned highest priority first, then in file order.
+    """
+    path = path or DEFAULT_REGISTRY
+    with open(path, 'r', encoding='utf-8') as f:
+        registry = json.load(f)
+
+    defaults = registry.get('defaults', {})
+    councils = []
+    for entry in registry.get('councils', []):
+        if 'name' not in entry or 'type' not in entry:
+            raise ValueError(f"Council entry in {path} needs a name and a type: {entry}")
+        council = dict(defaults)
+        council.update(entry)
+        councils.append(council)
+
+    councils.sort(key=lambda council: -council.get('priority', 0))
+    return councils
+
+
+def create_scraper(council: Dict, mock_mode: bool = False):
+    """Build and configure the scraper for a registry entry."""
+    scraper_class = load_backend(council['type'])
+    scraper = scraper_class.from_config(council, mock_mode=mock_mode)
+    scraper.configure(council)
+    return scraper
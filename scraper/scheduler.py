@@ -0,0 +1,137 @@
+"""
+Time-budgeted run scheduling.
+
+Given a total budget (SCRAPER_TIME_BUDGET seconds), councils are started
+highest priority first, then stalest first, and only while their estimated
+duration (from previous runs in _metadata.json) still fits in the time left.
+Councils that don't fit are deferred; being stalest, they go first next run.
+A scrape already running when the budget ends is stopped at the deadline.
+
+Councils are also scraped only as often as their activity warrants: the
+arrival rate of new applications, learnt from the run history kept in
+_metadata.json, puts each council on a daily, 3-day or 7-day interval.
+Because each scrape starts from the last one, a longer interval simply
+means a longer window.
+"""
+import logging
+import time
+from datetime import date
+from typing import Dict, List, Optional
+
+from .sharding import council_key, estimated_duration
+
+logger = logging.getLogger(__name__)
+
+RESERVE_SECONDS = 120.0  # Kept back for exports, indexes and saving metadata
+NEVER_SCRAPED = 10_000  # Staleness (days) of councils without a last_scrape
+
+
+def staleness_days(council: Dict, metadata: Dict, today: Optional[date] = None) -> int:
+    """Days since the council was last scraped successfully."""
+    last_scrape = metadata.get(council_key(council['name']), {}).get('last_scrape')
+    if not last_scrape:
+        return NEVER_SCRAPED
+    return ((today or date.today()) - date.fromisoformat(last_scrape)).days
+
+
+class RunScheduler:
+    """Orders councils and admits them while the run's time budget lasts."""
+
+    def __init__(self, metadata: Dict, budget: float = 0.0, reserve: float = RESERVE_SECONDS):
+        self.metadata = metadata
+        self.budget = budget
+        # Small budgets keep at most a tenth back
+        reserve = min(reserve, budget * 0.1)
+        self.deadline = time.monotonic() + budget - reserve if budget > 0 else None
+        self.deferred: List[str] = []
+        self.started = 0
+
+    def order(self, councils: List[Dict]) -> List[Dict]:
+        today = date.today()
+        return sorted(councils, key=lambda council: (
+            -council.get('priority', 0),
+            -staleness_days(council, self.metadata, today),
+            council['name'],
+        ))
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without a budget."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def admit(self, council: Dict) -> bool:
+        """
+        Whether the council is expected to finish before the deadline. The
+        first council always gets what's left, so a run is never empty.
+        """
+        remaining = self.remaining()
+        estimate = estimated_duration(council, self.metadata)
+        if remaining is None or (remaining > 0 and (estimate <= remaining or self.started == 0)):
+            self.started += 1
+            return True
+        logger.info(f"Deferring {council['name']}: needs ~{estimate:.0f}s, {remaining:.0f}s left")
+        self.deferred.append(council['name'])
+        return False
+
+    def time_limit(self, default: float) -> float:
+        """Deadline for a council's scrape: its own limit or the time left."""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+
+# --- Adaptive scrape frequency ---------------------------------------------
+
+HISTORY_RUNS = 20  # Runs kept per council in its metadata history
+MIN_HISTORY_DAYS = 14  # Days observed before a council may be scraped less often
+MAX_INTERVAL = 7  # Days; bounds how stale a quiet council can get
+INTERVALS = (  # (minimum new applications per day, interval in days)
+    (1.0, 1),
+    (0.2, 3),
+)
+
+
+def record_run(entry: Dict, run_date: str, new_count: int, window_start: str):
+    """
+    Append a successful run to a council's history. `days` is the time since
+    the previous recorded run (or the scrape window for the first one), so
+    new / days is the arrival rate however the windows overlapped.
+    """
+    history = entry.get('history', [])
+    since = history[-1]['date'] if history else window_start
+    days = max(1, (date.fromisoformat(run_date) - date.fromisoformat(since)).days)
+    history.append({'date': run_date, 'new': new_count, 'days': days})
+    entry['history'] = history[-HISTORY_RUNS:]
+
+
+def arrival_rate(entry: Dict) -> Optional[float]:
+    """New applications per day over the history, or None if too little is known."""
+    history = entry.get('history', [])
+    days = sum(run['days'] for run in history)
+    if days < MIN_HISTORY_DAYS:
+        return None
+    return sum(run['new'] for run in history) / days
+
+
+def scrape_interval(council: Dict, entry: Dict) -> int:
+    """Days between scrapes: the registry's interval_days, else from the arrival rate."""
+    if council.get('interval_days'):
+        return int(council['interval_days'])
+    rate = arrival_rate(entry)
+    if rate is None:
+        return 1
+    for minimum, interval in INTERVALS:
+        if rate >= minimum:
+            return interval
+    return MAX_INTERVAL
+
+
+def is_due(council: Dict, metadata: Dict, today: Optional[date] = None) -> bool:
+    """Whether enough days have passed since the council's last successful run."""
+    entry = metadata.get(council_key(council['name']), {})
+    history = entry.get('history')
+    last_run = history[-1]['date'] if history else entry.get('last_scrape')
+    if not last_run:
+        return True
+    elapsed = ((today or date.today()) - date.fromisoformat(last_run)).days
+    return elapsed >= scrape_interval(council, entry)
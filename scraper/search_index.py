@@ -0,0 +1,141 @@
+"""
+Static full-text search index over application descriptions and addresses.
+
+Builds an inverted index from the shard tree and writes it as small static
+files under {output_dir}/_search/:
+
+    meta.json        version, shard list and the term files that exist
+    terms/{xx}.json  {term: [shard, offset, shard, offset, ...]} for every
+                     term starting with the two characters "xx"
+
+Postings point at a shard (index into meta.json "shards") and the record's
+offset in that shard's JSON array. Terms are lower-cased, stop words are
+dropped and words are reduced with a light suffix-stripping stemmer; the
+client must apply the same tokenize() and stem() rules to queries. Keys in
+each term file are sorted, so prefix queries ("conv*") are a binary search
+in a single file.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+from typing import Dict, List
+
+from .shards import iter_shards, load_shard
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_DIR = '_search'
+PREFIX_LENGTH = 2  # Term files are split by this many leading characters
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is',
+    'it', 'no', 'of', 'on', 'or', 'the', 'to', 'with', 'uk',
+}
+
+# (suffix, replacement, minimum stem length), tried in order; first match wins
+_SUFFIX_RULES = [
+    ('ational', 'ate', 3),
+    ('ization', 'ize', 3),
+    ('isation', 'ise', 3),
+    ('ations', 'ate', 3),
+    ('ation', 'ate', 3),
+    ('ments', '', 4),
+    ('ment', '', 4),
+    ('ings', '', 3),
+    ('ing', '', 3),
+    ('ies', 'y', 3),
+    ('ied', 'y', 3),
+    ('sses', 'ss', 2),
+    ('ions', '', 3),
+    ('ion', '', 3),
+    ('ed', '', 3),
+    ('es', '', 3),
+    ('s', '', 3),
+]
+
+
+def stem(word: str) -> str:
+    """
+    Reduce a word with a small, deterministic set of suffix rules.
+    "extensions" -> "extens", "converted" -> "convert".
+    """
+    if word.isdigit():
+        return word
+    for suffix, replacement, min_stem in _SUFFIX_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            if suffix == 's' and word.endswith('ss'):
+                return word
+            if suffix == 'es' and not word[:-2].endswith(('ss', 'x', 'z', 'ch', 'sh')):
+                # "houses" -> "house" via the plain 's' rule
+                continue
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into stemmed index terms."""
+    terms = []
+    for word in _TOKEN.findall(text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        terms.append(stem(word))
+    return terms
+
+
+def build_index(output_dir: str) -> Dict[str, List[int]]:
+    """
+    Build {term: [shard, offset, ...]} and write the index files.
+    Returns the in-memory index.
+    """
+    shards: List[str] = []
+    postings: Dict[str, List[int]] = {}
+
+    for _, filepath in iter_shards(output_dir):
+        shard_id = len(shards)
+        shards.append(os.path.relpath(filepath, output_dir).replace(os.sep, '/'))
+
+        for offset, app in enumerate(load_shard(filepath)):
+            text = f"{app.get('desc', '')} {app.get('addr', '')}"
+            for term in sorted(set(tokenize(text))):
+                postings.setdefault(term, []).extend((shard_id, offset))
+
+    write_index(output_dir, shards, postings)
+    return postings
+
+
+def write_index(output_dir: str, shards: List[str], postings: Dict[str, List[int]]):
+    """Write the index files, replacing any previous index."""
+    index_dir = os.path.join(output_dir, INDEX_DIR)
+    terms_dir = os.path.join(index_dir, 'terms')
+    if os.path.isdir(terms_dir):
+        shutil.rmtree(terms_dir)
+    os.makedirs(terms_dir, exist_ok=True)
+
+    buckets: Dict[str, Dict[str, List[int]]] = {}
+    for term in sorted(postings):
+        buckets.setdefault(term[:PREFIX_LENGTH], {})[term] = postings[term]
+
+    for prefix, terms in buckets.items():
+        with open(os.path.join(terms_dir, f"{prefix}.json"), 'w', encoding='utf-8') as f:
+            json.dump(terms, f, separators=(',', ':'))
+
+    with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'v': INDEX_VERSION,
+            'prefix_length': PREFIX_LENGTH,
+            'shards': shards,
+            'term_files': sorted(buckets),
+        }, f, separators=(',', ':'))
+
+    logger.info(f"Wrote search index: {len(postings)} terms in {len(buckets)} files over {len(shards)} shards")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_index(sys.argv[1] if len(sys.argv) > 1 else 'public/data')
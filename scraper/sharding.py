@@ -0,0 +1,55 @@
+"""
+Split the council list across parallel scrape workers.
+
+Councils are bin-packed by their previous run duration (longest first onto
+the least-loaded worker), so every worker computes the same assignment from
+the same _metadata.json and the workers finish at roughly the same time.
+"""
+from typing import Dict, List, Tuple
+
+DEFAULT_DURATION = 60.0  # Seconds assumed for councils never timed
+
+
+def council_key(name: str) -> str:
+    """Metadata key for a council name: "Tower Hamlets" -> "tower_hamlets"."""
+    return name.lower().replace(" ", "_")
+
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """Parse "i/N" into (i, N), with 0 <= i < N."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec {spec!r}, expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec {spec!r}, expected 0 <= i < N")
+    return index, count
+
+
+def estimated_duration(council: Dict, metadata: Dict) -> float:
+    """Average run duration of a council, or the default if never timed."""
+    entry = metadata.get(council_key(council['name']), {})
+    for key in ('avg_duration', 'last_duration'):
+        if entry.get(key) is not None:
+            return entry[key]
+    return DEFAULT_DURATION
+
+
+def partition_councils(councils: List[Dict], metadata: Dict, count: int) -> List[List[Dict]]:
+    """
+    Split councils into `count` groups with balanced estimated durations.
+    Deterministic for a given council list and metadata.
+    """
+    weighted = sorted(
+        councils,
+        key=lambda council: (-estimated_duration(council, metadata), council['name'])
+    )
+
+    groups: List[List[Dict]] = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for council in weighted:
+        target = min(range(count), key=lambda i: (loads[i], i))
+        groups[target].append(council)
+        loads[target] += estimated_duration(council, metadata)
+
+    return groups
@@ -0,0 +1,483 @@
+"""
+Helpers for the sharded JSON data layout.
+
+Applications are stored as data/{AREA}/{SECTOR}.json, e.g. data/PO/PO1.json,
+where "sector" is the outward part of the postcode.
+
+With the monthly layout each sector is instead a folder of partitions,
+data/{AREA}/{SECTOR}/{YYYY-MM}.json, listed in data/{AREA}/{SECTOR}/index.json.
+Only the current month is rewritten in place; closed months get a
+content-hashed name ({YYYY-MM}.{hash}.json) so they can be cached forever,
+either when their sector is next written or by seal_closed_months at the end
+of a run.
+
+Records already stored keep their place; a later scrape only refreshes their
+REFRESHED_FIELDS (status, decision, ...). Files are replaced atomically
+(temp file + rename), so a reader or a killed job never sees half a shard. They are fsynced in batches by sync_written at
+checkpoints rather than one by one.
+"""
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+LAYOUT_SECTOR = 'sector'
+LAYOUT_MONTHLY = 'monthly'
+
+PARTITION_INDEX = 'index.json'
+UNDATED = 'undated'  # Partition for records without a usable date
+DETAILS_DIR = '_details'  # Per-council detail page caches (see scraper.details)
+IDS_DIR = '_ids'  # Per-council known-id indexes (see scraper.known_ids)
+
+# Fields a re-scraped record may update on the stored copy (e.g. from a
+# detail page refresh). date_received is left alone: it picks the partition.
+REFRESHED_FIELDS = ('status', 'decision', 'date_validated', 'date_decided', 'case_officer')
+# Stand-ins list rows use when they don't carry a field (Idox rows always say
+# 'Unknown'); these never overwrite a stored value
+PLACEHOLDER_VALUES = ('Unknown',)
+
+# Files replaced since the last sync_written, from any writer thread
+_unsynced: Set[str] = set()
+_unsynced_lock = threading.Lock()
+_sector_locks: Dict[str, threading.Lock] = {}
+
+
+def postcode_sector(postcode: str) -> str:
+    """
+    Shard key for a postcode: "PO1 2AB" -> "PO1".
+    Simple logic: split by space and take the first part.
+    """
+    return postcode.split(' ')[0]
+
+
+def shard_area(sector: str) -> str:
+    """
+    Area folder for a sector: "PO1" -> "PO", "W1" -> "W".
+    """
+    area = sector[:2]
+    if len(area) > 1 and area[1].isdigit():
+        area = area[0]
+    return area
+
+
+def shard_path(output_dir: str, sector: str) -> str:
+    """Path of the JSON shard for a sector."""
+    return os.path.join(output_dir, shard_area(sector), f"{sector}.json")
+
+
+def relative_shard(output_dir: str, filepath: str) -> str:
+    """A shard's path within the tree: "PO/PO1.json" or "PO/PO1/2026-01.json"."""
+    return os.path.relpath(filepath, output_dir).replace(os.sep, '/')
+
+
+def details_path(output_dir: str, council_key: str) -> str:
+    """Path of a council's detail page cache."""
+    return os.path.join(output_dir, DETAILS_DIR, f"{council_key}.json")
+
+
+def known_ids_path(output_dir: str, council_key: str) -> str:
+    """Path of a council's known-id index."""
+    return os.path.join(output_dir, IDS_DIR, f"{council_key}.txt")
+
+
+def write_atomic(filepath: str, payload: bytes):
+    """
+    Replace a file via a temp file and rename. The data is not fsynced here;
+    sync_written does that for every replaced file at the next checkpoint.
+    """
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, filepath)
+    with _unsynced_lock:
+        _unsynced.add(filepath)
+
+
+def _fsync(path: str, flags: int = os.O_RDONLY):
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_written() -> int:
+    """
+    Flush files replaced by write_atomic, and the directories holding their
+    new names, to disk. Returns the number of files synced.
+    """
+    with _unsynced_lock:
+        paths = sorted(_unsynced)
+        _unsynced.clear()
+
+    directories = set()
+    synced = 0
+    for path in paths:
+        try:
+            _fsync(path)
+        except FileNotFoundError:
+            continue  # Superseded, e.g. a partition renamed on sealing
+        directories.add(os.path.dirname(path) or '.')
+        synced += 1
+    for directory in sorted(directories):
+        try:
+            _fsync(directory)
+        except OSError:
+            pass  # Directories can't be opened for fsync on Windows
+    return synced
+
+
+def _is_shard_file(name: str) -> bool:
+    return (
+        name.endswith('.json')
+        and not name.startswith('_')
+        and not name.endswith('.col.json')  # Derived columnar copy
+        and name != PARTITION_INDEX
+    )
+
+
+def iter_shards(output_dir: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (sector, filepath) for every shard under output_dir, including the
+    monthly partitions of sectors stored in the monthly layout.
+    Files and folders starting with '_' hold metadata and are skipped, as
+    are derived files like the columnar PO1.col.json.
+    """
+    if not os.path.isdir(output_dir):
+        return
+
+    for area in sorted(os.listdir(output_dir)):
+        area_dir = os.path.join(output_dir, area)
+        if area.startswith('_') or not os.path.isdir(area_dir):
+            continue
+
+        for name in sorted(os.listdir(area_dir)):
+            path = os.path.join(area_dir, name)
+            if name.startswith('_'):
+                continue
+            if os.path.isdir(path):
+                for part in sorted(os.listdir(path)):
+                    if _is_shard_file(part):
+                        yield name, os.path.join(path, part)
+            elif _is_shard_file(name):
+                yield name[:-len('.json')], path
+
+
+def load_shard(filepath: str) -> List[Dict]:
+    """
+    Load a shard, returning an empty list if it is missing or corrupt.
+    """
+    if not os.path.exists(filepath):
+        return []
+
+    try:
+        with open(filepath, 'rb') as f:
+            return codec.decode_applications(f.read())
+    except (ValueError, OSError):
+        logger.warning(f"Could not read shard {filepath}")
+        return []
+
+
+def partition_month(date_received) -> str:
+    """
+    Partition key for a record date: "2026-01-15" or "15/01/2026" -> "2026-01".
+    """
+    if isinstance(date_received, str):
+        for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                return datetime.strptime(date_received.strip(), fmt).strftime('%Y-%m')
+            except ValueError:
+                continue
+    return UNDATED
+
+
+def sector_dir(output_dir: str, sector: str) -> str:
+    """Folder holding the monthly partitions of a sector."""
+    return os.path.join(output_dir, shard_area(sector), sector)
+
+
+def load_partition_index(directory: str) -> Dict[str, str]:
+    """Return {month: filename} for a partitioned sector folder."""
+    path = os.path.join(directory, PARTITION_INDEX)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            return codec.loads(f.read()).get('months', {})
+    except (ValueError, OSError):
+        logger.warning(f"Could not read partition index {path}")
+        return {}
+
+
+def is_placeholder(value) -> bool:
+    """Whether a field value says nothing, e.g. '' or a list row's 'Unknown'."""
+    return not value or value in PLACEHOLDER_VALUES
+
+
+def refresh_record(stored: Dict, app: Dict) -> bool:
+    """
+    Copy REFRESHED_FIELDS that app has a real value for and stored lacks or
+    differs on. Returns whether any changed.
+    """
+    changed = False
+    for field in REFRESHED_FIELDS:
+        value = app.get(field)
+        if not is_placeholder(value) and stored.get(field) != value:
+            stored[field] = value
+            changed = True
+    return changed
+
+
+def remove_shard(filepath: str):
+    """Delete a shard together with its compressed/columnar siblings."""
+    base = filepath[:-len('.json')]
+    for path in (filepath, f"{filepath}.gz", f"{filepath}.br",
+                 f"{base}.col.json", f"{base}.col.json.gz", f"{base}.col.json.br"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_partitions(
+    output_dir: str,
+    sector: str,
+    apps: List[Dict],
+    current_month: Optional[str] = None,
+    remove: Optional[Set[str]] = None
+) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+    """
+    Merge applications into a sector's monthly partitions.
+
+    Returns (new_apps, written) where written maps each partition file that
+    was (re)written to its records. Months before `current_month` are closed:
+    they are written under a content-hashed name and left untouched unless a
+    late record arrives for them or a stored record is refreshed (see
+    refresh_record). Records with ids in `remove` are dropped.
+    """
+    current_month = current_month or datetime.now().strftime('%Y-%m')
+    directory = sector_dir(output_dir, sector)
+    os.makedirs(directory, exist_ok=True)
+
+    months = load_partition_index(directory)
+    partitions = {month: load_shard(os.path.join(directory, name)) for month, name in months.items()}
+
+    # First write after switching layouts: fold the flat SECTOR.json in
+    legacy_path = shard_path(output_dir, sector)
+    legacy_apps = load_shard(legacy_path) if not months else []
+    migrate = bool(legacy_apps)
+
+    touched = set()
+    if remove:
+        legacy_apps = [app for app in legacy_apps if app['id'] not in remove]
+        for month, records in partitions.items():
+            kept = [app for app in records if app['id'] not in remove]
+            if len(kept) < len(records):
+                partitions[month] = kept
+                touched.add(month)
+    apps = legacy_apps + apps
+
+    # Deduplicate against the whole sector, not just the target month
+    stored = {app['id']: (month, app) for month, records in partitions.items() for app in records}
+
+    new_apps = []
+    for index, app in enumerate(apps):
+        if app['id'] in stored:
+            month, record = stored[app['id']]
+            if refresh_record(record, app):
+                touched.add(month)
+            continue
+        month = partition_month(app.get('date_received'))
+        stored[app['id']] = (month, app)
+        partitions.setdefault(month, []).append(app)
+        touched.add(month)
+        if index >= len(legacy_apps):
+            new_apps.append(app)
+
+    # Months that were open last time but have since closed need sealing
+    for month, name in months.items():
+        if month != UNDATED and month < current_month and name == f"{month}.json":
+            touched.add(month)
+
+    written: Dict[str, List[Dict]] = {}
+    for month in sorted(touched):
+        records = partitions[month]
+        if not records:
+            # Every record moved out: drop the partition rather than publish []
+            remove_shard(os.path.join(directory, months.pop(month)))
+            continue
+        payload = codec.dumps(records)
+
+        if month == UNDATED or month >= current_month:
+            name = f"{month}.json"
+        else:
+            digest = hashlib.sha256(payload).hexdigest()[:10]
+            name = f"{month}.{digest}.json"
+
+        filepath = os.path.join(directory, name)
+        write_atomic(filepath, payload)
+        written[filepath] = records
+
+        previous = months.get(month)
+        if previous and previous != name:
+            remove_shard(os.path.join(directory, previous))
+        months[month] = name
+
+    index_path = os.path.join(directory, PARTITION_INDEX)
+    if not months:
+        # Nothing left in the sector
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    elif touched:
+        write_atomic(index_path, codec.dumps({'months': dict(sorted(months.items()))}))
+
+    if migrate:
+        remove_shard(legacy_path)
+        logger.info(f"Migrated {len(legacy_apps)} applications from {legacy_path} to monthly partitions")
+
+    return new_apps, written
+
+
+def _sector_lock(output_dir: str, sector: str) -> threading.Lock:
+    """Lock serialising rewrites of one sector across writer threads."""
+    with _unsynced_lock:
+        return _sector_locks.setdefault(os.path.join(output_dir, sector), threading.Lock())
+
+
+def _write_sector(output_dir: str, sector: str, apps: List[Dict], compact: bool, layout: str,
+                  remove: Set[str], index, council: str, current_month: Optional[str] = None) -> List[Dict]:
+    """Merge apps into one sector, dropping ids in `remove`. Returns the apps added."""
+    # Imported here as compact depends on this module
+    from .compact import write_compact
+
+    with _sector_lock(output_dir, sector):
+        if layout == LAYOUT_MONTHLY:
+            new_apps, written = write_partitions(output_dir, sector, apps, current_month, remove)
+            if compact:
+                for filepath, records in written.items():
+                    write_compact(filepath, records)
+            directory = sector_dir(output_dir, sector)
+            current = [os.path.join(directory, name) for name in load_partition_index(directory).values()]
+            logger.info(f"Saved {len(new_apps)} new applications to {len(written)} partitions of {sector}")
+        else:
+            filepath = shard_path(output_dir, sector)
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+            # Merge with existing data if file exists (to avoid overwriting history)
+            existing_apps = [app for app in load_shard(filepath) if app['id'] not in remove]
+
+            # Deduplicate based on ID; stored records only take refreshed fields
+            stored = {app['id']: app for app in existing_apps}
+            new_apps = []
+            refreshed = 0
+            for app in apps:
+                if app['id'] in stored:
+                    refreshed += refresh_record(stored[app['id']], app)
+                else:
+                    # Also catches an id repeated within the batch
+                    stored[app['id']] = app
+                    new_apps.append(app)
+
+            combined_apps = existing_apps + new_apps
+            if combined_apps:
+                write_atomic(filepath, codec.dumps(combined_apps)) # Minified
+                if compact:
+                    write_compact(filepath, combined_apps)
+                written, current = {filepath: combined_apps}, [filepath]
+            else:
+                # Every record moved out: drop the shard rather than publish []
+                remove_shard(filepath)
+                written, current = {}, []
+            logger.info(f"Saved {len(new_apps)} new applications to {filepath}"
+                        + (f", refreshed {refreshed}" if refreshed else ""))
+
+        if index is not None:
+            index.update_sector(
+                sector,
+                {relative_shard(output_dir, path): records for path, records in written.items()},
+                [relative_shard(output_dir, path) for path in current],
+                council,
+                {str(app['id']) for app in apps},
+            )
+    return new_apps
+
+
+def seal_closed_months(output_dir: str, compact: bool = False, index=None,
+                       current_month: Optional[str] = None) -> int:
+    """
+    Seal every month that has closed since its sector was last written, so
+    sectors without new records still get immutable, hashed partitions.
+    Only partition indexes are read for sectors with nothing to seal.
+    Returns the number of sectors rewritten.
+    """
+    current_month = current_month or datetime.now().strftime('%Y-%m')
+    if not os.path.isdir(output_dir):
+        return 0
+
+    sealed = 0
+    for area in sorted(os.listdir(output_dir)):
+        area_dir = os.path.join(output_dir, area)
+        if area.startswith('_') or not os.path.isdir(area_dir):
+            continue
+        for sector in sorted(os.listdir(area_dir)):
+            months = load_partition_index(os.path.join(area_dir, sector))
+            if any(month != UNDATED and month < current_month and name == f"{month}.json"
+                   for month, name in months.items()):
+                # write_partitions seals closed months whenever it runs
+                _write_sector(output_dir, sector, [], compact, LAYOUT_MONTHLY, set(), index, '', current_month)
+                sealed += 1
+    if sealed:
+        logger.info(f"Sealed closed months in {sealed} sectors")
+    return sealed
+
+
+def save_applications(data: List[Dict], output_dir: str, compact: bool = False,
+                      layout: str = LAYOUT_SECTOR, index=None, council: str = '') -> List[Dict]:
+    """
+    Merge applications into the shard tree, deduplicating by ID per sector.
+    Returns the applications that were not already stored.
+
+    With an IdIndex (see scraper.id_index), records already stored in a
+    different sector are moved rather than duplicated, and the index is
+    updated for every shard rewritten. `council` attributes the records.
+    """
+    saved = []
+
+    # Group by Postcode Sector (e.g., PO1, PO2)
+    shards: Dict[str, List[Dict]] = {}
+    for app in data:
+        postcode = app.get('postcode')
+        if not postcode:
+            continue
+        shards.setdefault(postcode_sector(postcode), []).append(app)
+
+    # Sectors that records are leaving -> their ids
+    moved: Dict[str, Set[str]] = {}
+    moved_ids = set()
+    if index is not None:
+        for sector, apps in shards.items():
+            for app in apps:
+                previous = index.previous_sector(output_dir, council, app, sector)
+                if previous:
+                    moved.setdefault(previous, set()).add(app['id'])
+                    moved_ids.add(app['id'])
+
+    # Write shards to disk
+    for sector, apps in shards.items():
+        new_apps = _write_sector(output_dir, sector, apps, compact, layout,
+                                 moved.pop(sector, set()), index, council)
+        saved.extend(app for app in new_apps if app['id'] not in moved_ids)
+
+    # Then take moved records out of the sectors they left
+    for sector, ids in moved.items():
+        _write_sector(output_dir, sector, [], compact, layout, ids, index, council)
+    if moved_ids:
+        logger.info(f"Moved {len(moved_ids)} applications to a new sector")
+
+    return saved
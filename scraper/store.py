@@ -0,0 +1,290 @@
+"""
+SQLite-backed canonical application store.
+
+When enabled, scraped applications are bulk-inserted here (in WAL mode) and
+the JSON shards become a published artifact regenerated by the export step.
+Sectors touched by an insert or update are tracked, so an export only
+rewrites the shards that actually changed.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from . import codec
+from .compact import write_compact
+from .shards import (
+    LAYOUT_MONTHLY,
+    PARTITION_INDEX,
+    REFRESHED_FIELDS,
+    is_placeholder,
+    iter_shards,
+    load_partition_index,
+    load_shard,
+    postcode_sector,
+    remove_shard,
+    sector_dir,
+    shard_path,
+    sync_written,
+    write_atomic,
+    write_partitions,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    council TEXT NOT NULL,
+    id TEXT NOT NULL,
+    postcode TEXT,
+    postcode_sector TEXT,
+    date_received TEXT,
+    status TEXT,
+    lat REAL,
+    lng REAL,
+    record TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (council, id)
+);
+CREATE INDEX IF NOT EXISTS idx_applications_sector ON applications (postcode_sector);
+CREATE INDEX IF NOT EXISTS idx_applications_date ON applications (date_received);
+CREATE INDEX IF NOT EXISTS idx_applications_id ON applications (id);
+CREATE VIRTUAL TABLE IF NOT EXISTS applications_geo USING rtree (
+    app_rowid, min_lat, max_lat, min_lng, max_lng
+);
+CREATE TABLE IF NOT EXISTS dirty_sectors (
+    postcode_sector TEXT PRIMARY KEY
+);
+"""
+
+
+
+def imported_council(sector: Optional[str]) -> str:
+    """
+    Placeholder council for rows imported from shards, which don't say which
+    council they came from. Keyed by sector because ids are only unique per
+    shard; the first scrape that sees the id in that sector claims the row.
+    """
+    return f"?{sector or ''}"
+
+
+def content_hash(app: Dict) -> str:
+    """Stable hash of a record's content."""
+    payload = json.dumps(app, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ApplicationStore:
+    """
+    Source-of-truth store for planning applications.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+
+    def upsert_many(self, council: Optional[str], apps: List[Dict]) -> List[Dict]:
+        """
+        Insert or update applications for a council in one transaction.
+        council=None marks rows imported from shards (see imported_council).
+        Returns the applications that were not in the store before.
+        """
+        new_apps = []
+        dirty = set()
+        now = datetime.now().isoformat(timespec='seconds')
+
+        with self.conn:
+            for app in apps:
+                if not app.get('id'):
+                    continue
+
+                postcode = app.get('postcode') or ''
+                sector = postcode_sector(postcode) if postcode else None
+                owner = council if council is not None else imported_council(sector)
+
+                # Prefer this council's row, else claim an imported one
+                row = self.conn.execute(
+                    "SELECT rowid, council, content_hash, postcode_sector, record FROM applications "
+                    "WHERE id = ? AND council IN (?, ?) ORDER BY council = ? DESC LIMIT 1",
+                    (app['id'], owner, imported_council(sector), owner)
+                ).fetchone()
+
+                if row is not None:
+                    # As shards.refresh_record: placeholders don't replace stored values
+                    stored = json.loads(row[4])
+                    kept = {field: stored[field] for field in REFRESHED_FIELDS
+                            if is_placeholder(app.get(field)) and not is_placeholder(stored.get(field))}
+                    if kept:
+                        app = {**app, **kept}
+                digest = content_hash(app)
+
+                values = (
+                    owner, postcode, sector, app.get('date_received'), app.get('status'),
+                    app.get('lat') or None, app.get('lng') or None,
+                    json.dumps(app, separators=(',', ':')), digest, now
+                )
+
+                if row is None:
+                    cursor = self.conn.execute(
+                        "INSERT INTO applications (council, postcode, postcode_sector, date_received, "
+                        "status, lat, lng, record, content_hash, updated_at, id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        values + (app['id'],)
+                    )
+                    rowid = cursor.lastrowid
+                    new_apps.append(app)
+                else:
+                    rowid, old_council, old_hash, old_sector, _ = row
+                    if old_hash == digest and old_council == owner:
+                        continue
+                    self.conn.execute(
+                        "UPDATE applications SET council = ?, postcode = ?, postcode_sector = ?, "
+                        "date_received = ?, status = ?, lat = ?, lng = ?, record = ?, "
+                        "content_hash = ?, updated_at = ? WHERE rowid = ?",
+                        values + (rowid,)
+                    )
+                    if old_sector:
+                        dirty.add(old_sector)
+
+                self._index_point(rowid, app)
+                if sector:
+                    dirty.add(sector)
+
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO dirty_sectors (postcode_sector) VALUES (?)",
+                [(sector,) for sector in dirty]
+            )
+
+        return new_apps
+
+    def _index_point(self, rowid: int, app: Dict):
+        self.conn.execute("DELETE FROM applications_geo WHERE app_rowid = ?", (rowid,))
+        lat, lng = app.get('lat'), app.get('lng')
+        if lat and lng:
+            self.conn.execute(
+                "INSERT INTO applications_geo VALUES (?, ?, ?, ?, ?)",
+                (rowid, lat, lat, lng, lng)
+            )
+
+    def import_shards(self, output_dir: str) -> int:
+        """
+        Seed the store from an existing shard tree. Imported rows belong to
+        no council until a scrape claims them. Returns the number imported.
+        """
+        count = 0
+        for _, filepath in iter_shards(output_dir):
+            count += len(self.upsert_many(None, load_shard(filepath)))
+        # The shards already match the store
+        with self.conn:
+            self.conn.execute("DELETE FROM dirty_sectors")
+        logger.info(f"Imported {count} applications from {output_dir} into {self.path}")
+        return count
+
+    def sector_records(self, sector: str) -> List[Dict]:
+        """All records in a postcode sector, in insertion order."""
+        rows = self.conn.execute(
+            "SELECT record FROM applications WHERE postcode_sector = ? ORDER BY rowid", (sector,)
+        )
+        return [json.loads(record) for (record,) in rows]
+
+    def in_bbox(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> Iterator[Dict]:
+        """Records whose coordinates fall inside a bounding box (R*Tree lookup)."""
+        rows = self.conn.execute(
+            "SELECT a.record FROM applications_geo g JOIN applications a ON a.rowid = g.app_rowid "
+            "WHERE g.min_lat >= ? AND g.max_lat <= ? AND g.min_lng >= ? AND g.max_lng <= ?",
+            (min_lat, max_lat, min_lng, max_lng)
+        )
+        for (record,) in rows:
+            yield json.loads(record)
+
+    def dirty_sectors(self) -> List[str]:
+        return [sector for (sector,) in self.conn.execute(
+            "SELECT postcode_sector FROM dirty_sectors ORDER BY postcode_sector"
+        )]
+
+    def all_sectors(self) -> List[str]:
+        return [sector for (sector,) in self.conn.execute(
+            "SELECT DISTINCT postcode_sector FROM applications "
+            "WHERE postcode_sector IS NOT NULL ORDER BY postcode_sector"
+        )]
+
+    def export(self, output_dir: str, layout: str = 'sector', compact: bool = False,
+               everything: bool = False) -> Dict[str, List[str]]:
+        """
+        Regenerate shards for changed sectors (or all, with everything=True).
+        Returns {sector: [files written]}.
+        """
+        sectors = self.all_sectors() if everything else self.dirty_sectors()
+        exported: Dict[str, List[str]] = {}
+
+        for sector in sectors:
+            records = self.sector_records(sector)
+
+            if layout == LAYOUT_MONTHLY:
+                # Rebuild the partitions; closed months keep their hashed
+                # names when their content is unchanged
+                directory = sector_dir(output_dir, sector)
+                for name in load_partition_index(directory).values():
+                    remove_shard(os.path.join(directory, name))
+                index_path = os.path.join(directory, PARTITION_INDEX)
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                _, written = write_partitions(output_dir, sector, records)
+                exported[sector] = list(written)
+                if compact:
+                    for filepath, partition in written.items():
+                        write_compact(filepath, partition)
+            elif records:
+                filepath = shard_path(output_dir, sector)
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                write_atomic(filepath, codec.dumps(records)) # Minified, byte-identical to save_applications
+                exported[sector] = [filepath]
+                if compact:
+                    write_compact(filepath, records)
+            else:
+                # Every record moved out of the sector
+                remove_shard(shard_path(output_dir, sector))
+                exported[sector] = []
+
+        # Only forget the dirty sectors once their shards are on disk
+        sync_written()
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM dirty_sectors WHERE postcode_sector = ?", [(sector,) for sector in sectors]
+            )
+
+        logger.info(f"Exported {len(exported)} sectors to {output_dir}")
+        return exported
+
+
+def open_store(path: Optional[str], output_dir: str) -> Optional[ApplicationStore]:
+    """
+    Open the store at `path`, seeding it from the shards on first use.
+    Returns None when no path is configured.
+    """
+    if not path:
+        return None
+    store = ApplicationStore(path)
+    if len(store) == 0:
+        store.import_shards(output_dir)
+    return store
@@ -0,0 +1,111 @@
+"""
+Precomputed map tiles for the map view.
+
+Aggregates every geocoded application into a Web Mercator ("slippy map")
+tile pyramid and writes static files under {output_dir}/_tiles/:
+
+    meta.json          zoom range, grid size and tile counts per zoom
+    {z}/{x}/{y}.json   {"count": n, "clusters": [[lat, lng, count], ...]}
+
+Each tile's clusters are the centroids of a GRID x GRID subdivision of the
+tile, so the map can draw national or regional overviews from a handful of
+small files. Tiles at the maximum zoom also list the shards their points come
+from, which is when the client switches to loading raw records.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+from typing import Dict, List, Set, Tuple
+
+from .shards import iter_shards, load_shard
+
+logger = logging.getLogger(__name__)
+
+TILES_DIR = '_tiles'
+MIN_ZOOM = 4
+MAX_ZOOM = 12
+GRID_BITS = 3  # 8 x 8 clusters per tile
+MAX_LAT = 85.05112878  # Web Mercator limit
+
+
+def _world_position(lat: float, lng: float, zoom: int) -> Tuple[int, int]:
+    """Integer tile coordinates of a point at `zoom`."""
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    n = 1 << zoom
+    x = (lng + 180.0) / 360.0 * n
+    lat_rad = math.radians(lat)
+    y = (1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * n
+    return min(n - 1, max(0, int(x))), min(n - 1, max(0, int(y)))
+
+
+def build_tiles(output_dir: str, min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM) -> Dict[int, int]:
+    """
+    Build the tile pyramid from the shard tree and write it.
+    Returns {zoom: number of tiles written}.
+    """
+    finest = max_zoom + GRID_BITS
+    # (zoom, x, y) -> {(cell_x, cell_y): [lat_sum, lng_sum, count]}
+    tiles: Dict[Tuple[int, int, int], Dict[Tuple[int, int], List[float]]] = {}
+    tile_shards: Dict[Tuple[int, int], Set[str]] = {}
+
+    for _, filepath in iter_shards(output_dir):
+        shard = os.path.relpath(filepath, output_dir).replace(os.sep, '/')
+
+        for app in load_shard(filepath):
+            lat, lng = app.get('lat'), app.get('lng')
+            if not lat or not lng or app.get('geo_precision') == 'none':
+                continue
+
+            # Position once at the finest level, then shift for coarser ones
+            fx, fy = _world_position(lat, lng, finest)
+            for zoom in range(min_zoom, max_zoom + 1):
+                tx, ty = fx >> (finest - zoom), fy >> (finest - zoom)
+                cx = (fx >> (max_zoom - zoom)) & ((1 << GRID_BITS) - 1)
+                cy = (fy >> (max_zoom - zoom)) & ((1 << GRID_BITS) - 1)
+
+                cell = tiles.setdefault((zoom, tx, ty), {}).setdefault((cx, cy), [0.0, 0.0, 0])
+                cell[0] += lat
+                cell[1] += lng
+                cell[2] += 1
+
+            tile_shards.setdefault((fx >> GRID_BITS, fy >> GRID_BITS), set()).add(shard)
+
+    tiles_dir = os.path.join(output_dir, TILES_DIR)
+    if os.path.isdir(tiles_dir):
+        shutil.rmtree(tiles_dir)
+
+    counts: Dict[int, int] = {}
+    for (zoom, x, y), cells in tiles.items():
+        clusters = [
+            [round(lat_sum / n, 5), round(lng_sum / n, 5), n]
+            for lat_sum, lng_sum, n in (cells[key] for key in sorted(cells))
+        ]
+        tile = {'count': sum(cluster[2] for cluster in clusters), 'clusters': clusters}
+        if zoom == max_zoom:
+            tile['shards'] = sorted(tile_shards.get((x, y), ()))
+
+        tile_dir = os.path.join(tiles_dir, str(zoom), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f"{y}.json"), 'w', encoding='utf-8') as f:
+            json.dump(tile, f, separators=(',', ':'))
+        counts[zoom] = counts.get(zoom, 0) + 1
+
+    os.makedirs(tiles_dir, exist_ok=True)
+    with open(os.path.join(tiles_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'min_zoom': min_zoom,
+            'max_zoom': max_zoom,
+            'grid': 1 << GRID_BITS,
+            'tiles': {str(zoom): counts[zoom] for zoom in sorted(counts)},
+        }, f, separators=(',', ':'))
+
+    logger.info(f"Wrote {sum(counts.values())} tiles for zooms {min_zoom}-{max_zoom}")
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_tiles(sys.argv[1] if len(sys.argv) > 1 else 'public/data')
@@ -0,0 +1,139 @@
+"""
+Shard persistence off the event loop.
+
+Rewriting a large shard means reading, merging and re-encoding the whole
+file; done inline it stalls every request in flight. ShardWriter runs that
+work in a small dedicated thread pool instead.
+
+Writes are queued per shard. While a shard is being written, further
+batches for it wait; those from the same council are then merged into a
+single rewrite, so a shard is written once per burst rather than once per
+batch. Writes to the same shard never overlap.
+
+Files are replaced atomically and fsynced together at checkpoint(), which
+main calls after each council before saving _metadata.json. Given an
+IdIndex, records that changed sector are moved and the index kept current.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .shards import LAYOUT_SECTOR, postcode_sector, save_applications, sync_written, write_atomic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 2
+
+_Batch = Tuple[List[Dict], str, asyncio.Future]
+
+
+def _checkpoint(files: Dict[str, bytes]) -> int:
+    """Sync queued shard files, then write and sync `files` after them."""
+    synced = sync_written()
+    if files:
+        for path, payload in files.items():
+            write_atomic(path, payload)
+        synced += sync_written()
+    return synced
+
+
+class ShardWriter:
+    """Coalescing, thread-pooled writer for one output tree."""
+
+    def __init__(self, output_dir: str, compact: bool = False, layout: str = LAYOUT_SECTOR,
+                 threads: int = DEFAULT_THREADS, index=None):
+        self.output_dir = output_dir
+        self.compact = compact
+        self.layout = layout
+        self.index = index
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='shard-writer')
+        self._pending: Dict[str, List[_Batch]] = {}
+        self._writing: Dict[str, asyncio.Task] = {}
+        self.writes = 0
+        self.batches = 0
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking call in the writer's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def save(self, apps: List[Dict], council: str = '') -> List[Dict]:
+        """
+        Queue a council's applications for their shards and wait until they
+        are written. Returns those that were not already stored, like
+        save_applications.
+        """
+        by_sector: Dict[str, List[Dict]] = {}
+        for app in apps:
+            postcode = app.get('postcode')
+            if postcode:
+                by_sector.setdefault(postcode_sector(postcode), []).append(app)
+
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for sector, records in by_sector.items():
+            future = loop.create_future()
+            self._pending.setdefault(sector, []).append((records, council, future))
+            self.batches += 1
+            if sector not in self._writing:
+                self._writing[sector] = asyncio.ensure_future(self._drain(sector))
+            waiting.append(future)
+
+        # Shielded: a cancelled caller leaves its records to be written anyway
+        results = await asyncio.gather(*(asyncio.shield(future) for future in waiting))
+        return [app for saved in results for app in saved]
+
+    async def _drain(self, sector: str):
+        """Write a shard until no batches are queued for it."""
+        try:
+            while self._pending.get(sector):
+                # Records are attributed per council, so councils can't share a write
+                queued = self._pending.pop(sector)
+                council = queued[0][1]
+                batches = [batch for batch in queued if batch[1] == council]
+                others = [batch for batch in queued if batch[1] != council]
+                if others:
+                    self._pending[sector] = others
+
+                records = [app for apps, _, _ in batches for app in apps]
+                try:
+                    saved = await self.run(save_applications, records, self.output_dir,
+                                           compact=self.compact, layout=self.layout,
+                                           index=self.index, council=council)
+                except Exception as e:
+                    logger.error(f"Failed to write shard {sector}: {e}")
+                    for _, _, future in batches:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self.writes += 1
+                new = {id(app) for app in saved}
+                for apps, _, future in batches:
+                    if not future.done():
+                        future.set_result([app for app in apps if id(app) in new])
+        finally:
+            del self._writing[sector]
+
+    async def flush(self):
+        """Wait for every queued shard write to finish."""
+        while self._writing:
+            await asyncio.gather(*self._writing.values(), return_exceptions=True)
+
+    async def checkpoint(self, files: Optional[Dict[str, bytes]] = None) -> int:
+        """
+        Finish queued writes and fsync everything replaced since the last
+        checkpoint in one batch. `files` ({path: bytes}, e.g. the metadata)
+        are written only once the shards are durable, so they never refer to
+        data a crash could still lose.
+        """
+        await self.flush()
+        return await self.run(_checkpoint, files or {})
+
+    async def close(self, files: Optional[Dict[str, bytes]] = None):
+        await self.checkpoint(files)
+        self.executor.shutdown(wait=True)
+        if self.batches:
+            logger.info(f"Shard writer: {self.batches} batches in {self.writes} shard writes")
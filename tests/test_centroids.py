@@ -0,0 +1,45 @@
+from scraper.centroids import (
+    PRECISION_ADDRESS,
+    PRECISION_DISTRICT,
+    PRECISION_SECTOR,
+    CentroidTable,
+)
+from scraper.shards import save_applications
+
+
+def _app(app_id, postcode, lat, lng, **fields):
+    app = {'id': app_id, 'postcode': postcode, 'lat': lat, 'lng': lng, 'date_received': '2024-01-10'}
+    app.update(fields)
+    return app
+
+
+def test_build_from_legacy_shards_without_precision(tmp_path):
+    output_dir = str(tmp_path)
+    save_applications([
+        _app('1', 'DN1 2AB', 53.52, -1.13),
+        _app('2', 'DN1 3CD', 53.53, -1.14),
+        _app('3', 'DN1 1AA', 53.0, -1.0),  # Placeholder point
+        _app('4', 'DN2 4EF', 0, 0),        # Never geocoded
+    ], output_dir)
+
+    table = CentroidTable.build(output_dir)
+
+    assert len(table) == 3  # District DN1, sectors DN1 2 and DN1 3
+    lat, lng, precision = table.lookup('DN1')
+    assert precision == PRECISION_DISTRICT
+    assert round(lat, 3) == 53.525 and round(lng, 3) == -1.135
+    assert table.lookup('DN1 2ZZ')[2] == PRECISION_SECTOR
+    assert table.lookup('DN2 4EF') is None
+
+
+def test_build_uses_source_points_but_not_centroids(tmp_path):
+    output_dir = str(tmp_path)
+    save_applications([
+        _app('1', 'DN1 2AB', 53.52, -1.13, geo_precision=PRECISION_ADDRESS),
+        _app('2', 'DN1 5XY', 40.0, 0.5, geo_precision=PRECISION_DISTRICT),
+    ], output_dir)
+
+    table = CentroidTable.build(output_dir)
+
+    assert table.lookup('DN1')[:2] == (53.52, -1.13)
+    assert table.lookup('DN1 5XY')[2] == PRECISION_DISTRICT
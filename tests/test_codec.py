@@ -0,0 +1,32 @@
+import pytest
+
+from scraper.codec import CODECS, get_codec
+
+RECORDS = [
+    {'link': 'https://example.org/1', 'id': '24/0001', 'desc': 'Café — rear extension "two storey"',
+     'postcode': 'PO1 2AB', 'lat': 50.798123, 'lng': -1.091, 'date_received': '2024-01-10',
+     'status': 'Pending', 'geo_precision': 'postcode'},
+    {'id': 1234, 'status': None, 'addr': '2 Street\nPortsmouth', 'lat': 0, 'lng': 0.5, 'extra': [1, 2.25]},
+]
+
+
+@pytest.mark.parametrize('indent', [False, True])
+def test_backends_write_identical_bytes(indent):
+    expected = get_codec('json').dumps(RECORDS, indent)
+    for name in CODECS:
+        assert get_codec(name).dumps(RECORDS, indent) == expected, name
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_decode_keeps_file_key_order(name):
+    backend = get_codec(name)
+    payload = get_codec('json').dumps(RECORDS[:1])
+    records = backend.decode_applications(payload)
+    assert list(records[0]) == list(RECORDS[0])
+    assert backend.dumps(records) == payload
+
+
+@pytest.mark.parametrize('name', sorted(CODECS))
+def test_decode_rejects_records_without_ids(name):
+    with pytest.raises(ValueError):
+        get_codec(name).decode_applications(b'[{"desc":"no id"}]')
@@ -0,0 +1,106 @@
+import gzip
+
+import pytest
+
+from scraper.compact import (COORD_SCALE, columnar_path, decode_columnar, encode_columnar, read_compact,
+                             write_compact)
+
+
+def _apps():
+    return [
+        {'id': '23/00001/FUL', 'postcode': 'PO1 2AB', 'status': 'Pending', 'lat': 50.8, 'lng': -1.09,
+         'geo_precision': 'postcode', 'date_received': '2023-01-05'},
+        {'id': '23/00002/FUL', 'postcode': 'PO1 2AB', 'status': 'Approved', 'lat': 50.81, 'lng': -1.1,
+         'geo_precision': 'postcode', 'date_received': '2023-01-03'},
+        {'id': '23/00003/FUL', 'postcode': 'PO1 3CD', 'status': 'Pending', 'lat': 50.79, 'lng': -1.08,
+         'geo_precision': 'sector', 'date_received': '2023-02-11'},
+    ]
+
+
+def test_round_trip():
+    apps = _apps()
+    assert decode_columnar(encode_columnar(apps)) == apps
+
+
+def test_dictionary_coded_fields():
+    doc = encode_columnar(_apps())
+    assert doc['dict']['status'] == ['Pending', 'Approved']
+    assert doc['cols']['status'] == [0, 1, 0]
+    assert doc['dict']['postcode'] == ['PO1 2AB', 'PO1 3CD']
+    assert doc['cols']['postcode'] == [0, 0, 1]
+
+
+def test_dates_are_deltas():
+    doc = encode_columnar(_apps())
+    assert doc['cols']['date_received'][1:] == [-2, 39]
+
+
+def test_missing_dates_and_coordinates():
+    apps = _apps()
+    del apps[0]['date_received']
+    del apps[1]['lat']
+    del apps[1]['lng']
+    apps[2]['date_received'] = None
+    apps[2]['lat'] = None
+
+    doc = encode_columnar(apps)
+    assert doc['absent']['date_received'] == [0]
+    assert doc['absent']['lat'] == [1]
+    assert decode_columnar(doc) == apps
+
+
+def test_raw_fallback():
+    apps = _apps()
+    apps[0]['date_received'] = '05/01/2023'  # Not ISO
+    apps[1]['date_received'] = '2023-1-3'    # Parses, but wouldn't round-trip
+    apps[1]['status'] = 3                    # Not a string
+    apps[2]['lat'] = True
+
+    doc = encode_columnar(apps)
+    assert doc['raw']['date_received'] == {'0': '05/01/2023', '1': '2023-1-3'}
+    assert doc['raw']['status'] == {'1': 3}
+    assert doc['raw']['lat'] == {'2': True}
+    assert decode_columnar(doc) == apps
+
+
+def test_unknown_fields_are_plain():
+    apps = [{'id': 1, 'extra': {'nested': [1, 2]}}, {'id': 2}]
+    doc = encode_columnar(apps)
+    assert doc['schema']['extra'] == 'plain'
+    assert decode_columnar(doc) == apps
+
+
+def test_coordinates_are_rounded_to_six_decimals():
+    doc = encode_columnar([{'id': 1, 'lat': 50.123456789, 'lng': -1.0000004}])
+    assert doc['cols']['lat'] == [50123457]
+    decoded = decode_columnar(doc)[0]
+    assert decoded['lat'] == pytest.approx(50.123457, abs=1 / COORD_SCALE / 10)
+    assert decoded['lat'] != 50.123456789
+    assert decoded['lng'] == -1.0
+
+
+def test_unsupported_version():
+    doc = encode_columnar(_apps())
+    doc['v'] = 99
+    with pytest.raises(ValueError):
+        decode_columnar(doc)
+
+
+def test_read_compact_gz(tmp_path):
+    apps = _apps()
+    shard = tmp_path / 'PO' / 'PO1.json'
+    shard.parent.mkdir()
+    write_compact(str(shard), apps)
+
+    assert read_compact(f"{shard}.gz") == apps
+    assert read_compact(columnar_path(str(shard))) == apps
+    assert read_compact(f"{columnar_path(str(shard))}.gz") == apps
+
+
+def test_read_compact_gz_is_deterministic(tmp_path):
+    shard = tmp_path / 'PO1.json'
+    write_compact(str(shard), _apps())
+    first = (tmp_path / 'PO1.json.gz').read_bytes()
+    write_compact(str(shard), _apps())
+    assert (tmp_path / 'PO1.json.gz').read_bytes() == first
+    assert gzip.decompress(first).startswith(b'[{')
@@ -0,0 +1,62 @@
+import asyncio
+
+from scraper.idox import ADVANCED, REPROBE_RUNS, WEEKLY_LIST, IdoxScraper
+from scraper.shards import iter_shards, load_shard, save_applications
+
+
+def _app(app_id):
+    return {'id': app_id, 'postcode': 'PO1 2AB', 'date_received': '2024-01-10', 'link': f"https://x/{app_id}"}
+
+
+def _scraper(found):
+    """An IdoxScraper whose searches stream `found[strategy]` as one results page."""
+    scraper = IdoxScraper('https://example.org/online-applications', 'Test')
+    scraper.session = object()
+
+    def search(name):
+        async def run(start_date, end_date):
+            apps = [_app(app_id) for app_id in found[name]]
+            return [] if await scraper._emit_page(apps) else apps
+        return run
+
+    scraper._search_advanced = search(ADVANCED)
+    scraper._search_weekly_list = search(WEEKLY_LIST)
+    return scraper
+
+
+def _scrape(found, output_dir, state=None):
+    """Stream a scrape into output_dir. Returns (scraper, streamed ids, stored ids)."""
+    async def run():
+        # Built inside the loop, as RateLimiter binds to it
+        scraper = _scraper(found)
+        scraper.state = state if state is not None else {}
+        pages = []
+        async for page in scraper.iter_applications('2024-01-01', '2024-01-31'):
+            pages.append(page)
+            save_applications(page, output_dir)
+        return scraper, pages
+    scraper, pages = asyncio.run(run())
+    stored = [app['id'] for _, filepath in iter_shards(output_dir) for app in load_shard(filepath)]
+    return scraper, [app['id'] for page in pages for app in page], stored
+
+
+def test_reprobe_streams_each_record_once(tmp_path):
+    scraper, streamed, stored = _scrape({ADVANCED: ['1', '2', '3'], WEEKLY_LIST: ['1', '2', '3']},
+                                        str(tmp_path), {'runs_since_probe': REPROBE_RUNS})
+    assert streamed == ['1', '2', '3']
+    assert stored == ['1', '2', '3']
+    assert scraper.state['runs_since_probe'] == 0
+
+
+def test_reprobe_passes_on_records_only_the_other_search_found(tmp_path):
+    scraper, streamed, stored = _scrape({ADVANCED: ['1', '2'], WEEKLY_LIST: ['1', '2', '3']},
+                                        str(tmp_path), {'runs_since_probe': REPROBE_RUNS})
+    assert streamed == ['1', '2', '3']
+    assert stored == ['1', '2', '3']
+    assert scraper.state['preferred'] == WEEKLY_LIST
+
+
+def test_fallback_streams_when_preferred_finds_nothing(tmp_path):
+    _, streamed, stored = _scrape({ADVANCED: [], WEEKLY_LIST: ['1', '2']}, str(tmp_path))
+    assert streamed == ['1', '2']
+    assert stored == ['1', '2']
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('aiohttp', 'bs4', 'numpy')
+IMPORT_BUDGET = 1.0  # Seconds; generous, these take well under 0.1s without the heavy modules
+
+
+def _imported_after(statement):
+    """The heavy modules in sys.modules after running `statement` in a fresh interpreter."""
+    code = f"import json, sys; {statement}; print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _import_time(module):
+    """Cumulative seconds `python -X importtime` reports for importing module."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise AssertionError(f"{module} not in -X importtime output")
+
+
+LIGHT_MODULES = ['scraper', 'scraper.registry', 'scraper.merge', 'scraper.compact', 'scraper.export']
+
+
+@pytest.mark.parametrize('module', LIGHT_MODULES)
+def test_import_is_light(module):
+    assert _imported_after(f"import {module}") == []
+
+
+@pytest.mark.parametrize('module', LIGHT_MODULES)
+def test_import_time(module):
+    assert _import_time(module) < IMPORT_BUDGET
+
+
+def test_exports_resolve_lazily():
+    assert 'aiohttp' in _imported_after("import scraper; scraper.Geocoder")
+    assert 'bs4' in _imported_after("from scraper import IdoxScraper")
@@ -0,0 +1,20 @@
+import asyncio
+
+from scraper import health
+from scraper.main import scrape_council
+
+COUNCIL = {'name': 'Leeds', 'type': 'idox', 'url': 'https://publicaccess.leeds.example/online-applications'}
+
+
+def test_short_circuited_run_keeps_durations(tmp_path, monkeypatch):
+    # The portal's half-open probe already failed this run
+    monkeypatch.setitem(health._probed_hosts, 'publicaccess.leeds.example', False)
+    metadata = {'leeds': {'health': {'state': health.OPEN, 'failures': 3},
+                          'last_duration': 300.0, 'avg_duration': 240.0}}
+
+    count = asyncio.run(scrape_council(COUNCIL, None, metadata, output_dir=str(tmp_path)))
+
+    assert count == 0
+    assert metadata['leeds']['last_duration'] == 300.0
+    assert metadata['leeds']['avg_duration'] == 240.0
+    assert metadata['leeds']['health']['failures'] == 4
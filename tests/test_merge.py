@@ -0,0 +1,106 @@
+import json
+import os
+
+from scraper.id_index import PARTIAL_INDEX, IdIndex
+from scraper.merge import SHARD_INFO_KEY, merge_partials
+from scraper.search_index import INDEX_DIR
+from scraper.shards import iter_shards, load_shard, save_applications
+from scraper.store import ApplicationStore
+from scraper.tiles import TILES_DIR
+
+
+def _app(app_id, postcode='LS1 4AB', lat=53.80, lng=-1.55, desc='Rear extension'):
+    return {'id': app_id, 'desc': desc, 'addr': f"1 Street, {postcode}", 'postcode': postcode,
+            'lat': lat, 'lng': lng, 'geo_precision': 'postcode', 'date_received': '2024-03-01',
+            'status': 'Pending', 'link': f"https://example.org/{app_id}"}
+
+
+def _partial(root, name, council, apps, *others):
+    """A worker's output, as written by main --partial-dir. `others` are more (council, apps) pairs."""
+    partial_dir = os.path.join(root, name)
+    scraped = [(council, apps)] + list(others)
+    with IdIndex(os.path.join(partial_dir, PARTIAL_INDEX)) as index:
+        for key, records in scraped:
+            save_applications(records, partial_dir, index=index, council=key)
+    with open(os.path.join(partial_dir, '_metadata.json'), 'w', encoding='utf-8') as f:
+        metadata = {key: {'last_scrape': '2024-03-02'} for key, _ in scraped}
+        metadata.update({'last_run_total': sum(len(records) for _, records in scraped),
+                         SHARD_INFO_KEY: {'index': 0, 'count': 2, 'councils': [key for key, _ in scraped]}})
+        json.dump(metadata, f)
+    return partial_dir
+
+
+def _published(output_dir):
+    return sorted(app['id'] for _, filepath in iter_shards(output_dir) for app in load_shard(filepath))
+
+
+def test_merge_writes_shards_and_metadata(tmp_path):
+    output_dir = str(tmp_path / 'data')
+    partials = [
+        _partial(str(tmp_path), 'p0', 'leeds', [_app('L/1'), _app('L/2', 'LS2 7AA', 53.81, -1.54)]),
+        _partial(str(tmp_path), 'p1', 'bristol', [_app('B/1', 'BS1 5AA', 51.45, -2.59)]),
+    ]
+
+    added = merge_partials(output_dir, partials)
+
+    assert sorted(app['id'] for app in added) == ['B/1', 'L/1', 'L/2']
+    assert _published(output_dir) == ['B/1', 'L/1', 'L/2']
+    with open(os.path.join(output_dir, '_metadata.json'), 'rb') as f:
+        metadata = json.load(f)
+    assert set(metadata) >= {'leeds', 'bristol'}
+    assert SHARD_INFO_KEY not in metadata
+    assert metadata['last_run_total'] == 3
+
+    # Merging the same outputs again adds nothing
+    assert merge_partials(output_dir, partials) == []
+    assert _published(output_dir) == ['B/1', 'L/1', 'L/2']
+
+
+def test_merge_upserts_store_and_rebuilds_index_and_tiles(tmp_path):
+    output_dir = str(tmp_path / 'data')
+    partials = [
+        _partial(str(tmp_path), 'p0', 'leeds', [_app('L/1', desc='Loft conversion')]),
+        _partial(str(tmp_path), 'p1', 'bristol', [_app('B/1', 'BS1 5AA', 51.45, -2.59)]),
+    ]
+
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        added = merge_partials(output_dir, partials, store=store, search_index=True, map_tiles=True)
+        owners = dict(store.conn.execute("SELECT id, council FROM applications"))
+        assert store.dirty_sectors() == []
+
+    assert sorted(app['id'] for app in added) == ['B/1', 'L/1']
+    # Rows belong to the councils (by name, as a single-process run stores them)
+    assert owners == {'L/1': 'Leeds', 'B/1': 'Bristol'}
+    # Shards are exported from the store
+    assert _published(output_dir) == ['B/1', 'L/1']
+    assert os.listdir(os.path.join(output_dir, INDEX_DIR))
+    assert os.listdir(os.path.join(output_dir, TILES_DIR))
+
+
+def _shared_reference_partial(root):
+    """One worker that scraped two councils using the same reference."""
+    return _partial(root, 'p0', 'leeds', [_app('24/0001')],
+                    ('bristol', [_app('24/0001', 'BS1 5AA', 51.45, -2.59)]))
+
+
+def test_merge_attributes_shared_references_to_each_council(tmp_path):
+    output_dir = str(tmp_path / 'data')
+    partials = [_shared_reference_partial(str(tmp_path))]
+
+    with IdIndex(str(tmp_path / 'ids.sqlite')) as index:
+        merge_partials(output_dir, partials, index=index)
+        owners = {(council, sector) for council, sector, *_ in index.lookup('24/0001')}
+
+    assert owners == {('leeds', 'LS1'), ('bristol', 'BS1')}
+
+
+def test_merge_upserts_shared_references_per_council(tmp_path):
+    output_dir = str(tmp_path / 'data')
+    partials = [_shared_reference_partial(str(tmp_path))]
+
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        added = merge_partials(output_dir, partials, store=store)
+        owners = set(store.conn.execute("SELECT council, postcode_sector FROM applications"))
+
+    assert len(added) == 2
+    assert owners == {('Leeds', 'LS1'), ('Bristol', 'BS1')}
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from scraper.base import BaseScraper
+from scraper.geocoder import Geocoder
+from scraper.pipeline import run_pipeline
+from scraper.shards import iter_shards, load_shard
+
+
+class PagedScraper(BaseScraper):
+    """Streams `pages` of located records, as the real scrapers do."""
+
+    def __init__(self, pages):
+        super().__init__('https://example.org', 'Test')
+        self.pages = pages
+        self.returned = None
+
+    async def fetch_applications(self, start_date, end_date):
+        kept = []
+        for page in self.pages:
+            apps = [{'id': app_id, 'postcode': 'PO1 2AB', 'lat': 50.8, 'lng': -1.09,
+                     'date_received': '2024-01-10'} for app_id in page]
+            if not await self._emit_page(apps):
+                kept.extend(apps)
+        self.returned = kept
+        return kept
+
+
+def _run(scraper, output_dir, **kwargs):
+    async def run():
+        return await run_pipeline(scraper, Geocoder(), '2024-01-01', '2024-01-31', output_dir,
+                                  flush_size=2, **kwargs)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('keep_new', [False, True])
+def test_streamed_pages_are_not_kept(tmp_path, keep_new):
+    scraper = PagedScraper([['1', '2'], ['3'], ['4', '5']])
+    stats = _run(scraper, str(tmp_path), keep_new=keep_new)
+
+    assert scraper.returned == []
+    assert stats.scraped == stats.written == stats.new_count == 5
+    if keep_new:
+        assert sorted(app['id'] for app in stats.new_applications) == ['1', '2', '3', '4', '5']
+    else:
+        assert stats.new_applications is None
+    stored = [app['id'] for _, filepath in iter_shards(str(tmp_path)) for app in load_shard(filepath)]
+    assert sorted(stored) == ['1', '2', '3', '4', '5']
+
+
+def test_new_count_skips_stored_records(tmp_path):
+    _run(PagedScraper([['1', '2']]), str(tmp_path))
+    stats = _run(PagedScraper([['2', '3']]), str(tmp_path))
+    assert stats.scraped == 2
+    assert stats.new_count == 1
@@ -0,0 +1,62 @@
+import json
+import os
+
+import numpy as np
+
+from scraper.query import ColumnCache, QueryEngine
+
+
+def _write_shard(output_dir, apps):
+    os.makedirs(os.path.join(output_dir, 'PO'), exist_ok=True)
+    with open(os.path.join(output_dir, 'PO', 'PO1.json'), 'w', encoding='utf-8') as f:
+        json.dump(apps, f)
+
+
+def _app(app_id, lat, lng, date_received='2024-01-01'):
+    return {'id': app_id, 'postcode': 'PO1 2AB', 'lat': lat, 'lng': lng,
+            'date_received': date_received, 'status': 'Pending', 'geo_precision': 'postcode'}
+
+
+def test_radius_and_date(tmp_path):
+    output_dir, cache_dir = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    _write_shard(output_dir, [
+        _app('near', 50.800, -1.090),
+        _app('far', 51.500, -0.120),
+        _app('old', 50.801, -1.091, '2020-01-01'),
+    ])
+    engine = QueryEngine(ColumnCache.open_or_build(output_dir, cache_dir))
+
+    rows, distances = engine.radius(50.800, -1.090, 1)
+    assert [app['id'] for app in engine.records(rows)] == ['near', 'old']
+    assert distances[0] == 0
+
+    rows = engine.date_range(start='2023-01-01')
+    assert sorted(app['id'] for app in engine.records(rows)) == ['far', 'near']
+
+
+def test_rebuilds_after_shard_rewrite(tmp_path):
+    output_dir, cache_dir = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    _write_shard(output_dir, [_app('a', 50.80, -1.09), _app('b', 50.81, -1.10), _app('c', 50.82, -1.11)])
+    engine = QueryEngine(ColumnCache.open_or_build(output_dir, cache_dir))
+    assert len(engine.cache) == 3
+    assert ColumnCache.is_current(output_dir, cache_dir)
+
+    # A record moved out and another arrived: offsets now mean something else
+    _write_shard(output_dir, [_app('c', 50.82, -1.11), _app('d', 50.90, -1.20)])
+    assert not ColumnCache.is_current(output_dir, cache_dir)
+
+    engine = QueryEngine(ColumnCache.open_or_build(output_dir, cache_dir))
+    assert len(engine.cache) == 2
+    rows, _ = engine.radius(50.82, -1.11, 1)
+    assert [app['id'] for app in engine.records(rows)] == ['c']
+    assert [app['id'] for app in engine.records(np.arange(len(engine.cache)))] == ['c', 'd']
+
+
+def test_reuses_current_cache(tmp_path):
+    output_dir, cache_dir = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    _write_shard(output_dir, [_app('a', 50.80, -1.09)])
+    ColumnCache.open_or_build(output_dir, cache_dir)
+    built = os.stat(os.path.join(cache_dir, 'lat.npy')).st_mtime_ns
+
+    ColumnCache.open_or_build(output_dir, cache_dir)
+    assert os.stat(os.path.join(cache_dir, 'lat.npy')).st_mtime_ns == built
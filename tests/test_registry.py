@@ -0,0 +1,21 @@
+from scraper import registry
+from scraper.base import BaseScraper
+
+
+class MinimalScraper(BaseScraper):
+    """A backend that doesn't override __init__."""
+
+    async def fetch_applications(self, start_date, end_date):
+        return []
+
+
+def test_backend_without_its_own_init(monkeypatch):
+    monkeypatch.setitem(registry._loaded, 'minimal', MinimalScraper)
+    council = {'name': 'Test', 'type': 'minimal', 'url': 'https://example.org', 'concurrency': 3}
+
+    scraper = registry.create_scraper(council, mock_mode=True)
+
+    assert isinstance(scraper, MinimalScraper)
+    assert (scraper.base_url, scraper.council_name, scraper.mock_mode) == ('https://example.org', 'Test', True)
+    assert scraper.concurrency == 3
+    assert registry.create_scraper(council).mock_mode is False
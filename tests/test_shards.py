@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from scraper.id_index import IdIndex
+from scraper.shards import (
+    LAYOUT_MONTHLY, LAYOUT_SECTOR, PARTITION_INDEX, iter_shards, load_partition_index, load_shard,
+    save_applications, seal_closed_months, sector_dir, write_partitions
+)
+
+
+def _app(app_id, **fields):
+    app = {'id': app_id, 'postcode': 'PO1 2AB', 'date_received': '2024-01-10', 'status': 'Pending',
+           'lat': 50.8, 'lng': -1.09}
+    app.update(fields)
+    return app
+
+
+def _stored(output_dir):
+    return [app for _, filepath in iter_shards(output_dir) for app in load_shard(filepath)]
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_SECTOR, LAYOUT_MONTHLY])
+def test_refresh_updates_stored_record(tmp_path, layout):
+    output_dir = str(tmp_path)
+    assert len(save_applications([_app('A'), _app('B')], output_dir, layout=layout)) == 2
+
+    refreshed = _app('A', status='Decided', decision='Granted', date_decided='2024-02-01',
+                     case_officer='J Smith', date_received='2024-03-01', lat=0)
+    assert save_applications([refreshed], output_dir, layout=layout) == []
+
+    stored = {app['id']: app for app in _stored(output_dir)}
+    assert len(_stored(output_dir)) == 2
+    assert stored['A']['status'] == 'Decided'
+    assert stored['A']['decision'] == 'Granted'
+    assert stored['A']['date_decided'] == '2024-02-01'
+    assert stored['A']['case_officer'] == 'J Smith'
+    # Only detail fields are refreshed
+    assert stored['A']['date_received'] == '2024-01-10'
+    assert stored['A']['lat'] == 50.8
+    assert stored['B']['status'] == 'Pending'
+
+
+def test_refresh_keeps_values_missing_from_the_new_scrape(tmp_path):
+    output_dir = str(tmp_path)
+    save_applications([_app('A', case_officer='J Smith')], output_dir)
+    save_applications([_app('A', status='')], output_dir)
+    assert _stored(output_dir) == [_app('A', case_officer='J Smith')]
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_SECTOR, LAYOUT_MONTHLY])
+def test_refresh_ignores_placeholder_values(tmp_path, layout):
+    output_dir = str(tmp_path)
+    save_applications([_app('A', status='Approved')], output_dir, layout=layout)
+    # An Idox list row re-scraped without its detail page
+    save_applications([_app('A', status='Unknown')], output_dir, layout=layout)
+    assert _stored(output_dir)[0]['status'] == 'Approved'
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_SECTOR, LAYOUT_MONTHLY])
+def test_ids_repeated_within_a_batch_are_saved_once(tmp_path, layout):
+    output_dir = str(tmp_path)
+    batch = [_app('A'), _app('B'), _app('A', status='Approved'), _app('B')]
+    saved = save_applications(batch, output_dir, layout=layout)
+    assert [app['id'] for app in saved] == ['A', 'B']
+    stored = _stored(output_dir)
+    assert sorted(app['id'] for app in stored) == ['A', 'B']
+    assert {app['id']: app['status'] for app in stored}['A'] == 'Approved'
+
+
+def test_seal_closed_months_seals_sectors_without_new_records(tmp_path):
+    output_dir = str(tmp_path)
+    write_partitions(output_dir, 'PO1', [_app('A')], current_month='2024-01')
+    write_partitions(output_dir, 'PO2', [_app('B', postcode='PO2 1AA', date_received='2024-02-03')],
+                     current_month='2024-02')
+    directory = sector_dir(output_dir, 'PO1')
+    assert load_partition_index(directory) == {'2024-01': '2024-01.json'}
+
+    assert seal_closed_months(output_dir, current_month='2024-02') == 1
+
+    name = load_partition_index(directory)['2024-01']
+    assert name.startswith('2024-01.') and name != '2024-01.json'
+    assert sorted(os.listdir(directory)) == sorted([name, PARTITION_INDEX])
+    assert [app['id'] for app in load_shard(os.path.join(directory, name))] == ['A']
+    # The open month and already sealed ones are left alone
+    assert load_partition_index(sector_dir(output_dir, 'PO2')) == {'2024-02': '2024-02.json'}
+    assert seal_closed_months(output_dir, current_month='2024-02') == 0
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_SECTOR, LAYOUT_MONTHLY])
+def test_moving_the_last_record_out_removes_the_shard(tmp_path, layout):
+    output_dir = str(tmp_path / 'data')
+    with IdIndex(str(tmp_path / 'ids.sqlite')) as index:
+        save_applications([_app('A')], output_dir, compact=True, layout=layout, index=index, council='c')
+        save_applications([_app('A', postcode='PO2 1AA')], output_dir, compact=True, layout=layout,
+                          index=index, council='c')
+        assert [sector for _, sector, *_ in index.lookup('A')] == ['PO2']
+
+    assert [sector for sector, _ in iter_shards(output_dir)] == ['PO2']
+    # Compressed and columnar siblings go too
+    assert not [name for name in os.listdir(os.path.join(output_dir, 'PO')) if name.startswith('PO1')]
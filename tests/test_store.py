@@ -0,0 +1,66 @@
+import os
+
+from scraper import codec
+from scraper.shards import LAYOUT_MONTHLY, save_applications, shard_path
+from scraper.store import ApplicationStore
+
+
+def _apps():
+    return [
+        {'id': '24/0001', 'desc': 'Extension — rear, café conversion', 'addr': '1 Rue, Ém Road',
+         'postcode': 'PO1 2AB', 'lat': 50.8, 'lng': -1.09, 'date_received': '2024-01-10', 'status': 'Pending'},
+        {'id': '24/0002', 'desc': 'Loft', 'addr': '2 Street', 'postcode': 'PO1 3CD',
+         'lat': 50.81, 'lng': -1.1, 'date_received': '2024-02-11', 'status': 'Approved'},
+    ]
+
+
+def test_export_matches_codec_written_shards(tmp_path):
+    direct, exported = str(tmp_path / 'direct'), str(tmp_path / 'exported')
+    save_applications(_apps(), direct)
+
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        store.upsert_many('Portsmouth', _apps())
+        store.export(exported)
+
+    with open(shard_path(direct, 'PO1'), 'rb') as f:
+        expected = f.read()
+    with open(shard_path(exported, 'PO1'), 'rb') as f:
+        assert f.read() == expected
+    assert expected == codec.dumps(_apps())
+    assert 'café'.encode('utf-8') in expected
+
+
+def test_monthly_export_matches_codec_written_partitions(tmp_path):
+    direct, exported = str(tmp_path / 'direct'), str(tmp_path / 'exported')
+    save_applications(_apps(), direct, layout=LAYOUT_MONTHLY)
+
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        store.upsert_many('Portsmouth', _apps())
+        store.export(exported, layout=LAYOUT_MONTHLY)
+
+    sector_files = lambda root: sorted(os.listdir(os.path.join(root, 'PO', 'PO1')))
+    assert sector_files(exported) == sector_files(direct)
+    for name in sector_files(direct):
+        with open(os.path.join(direct, 'PO', 'PO1', name), 'rb') as a, \
+                open(os.path.join(exported, 'PO', 'PO1', name), 'rb') as b:
+            assert a.read() == b.read()
+
+
+def test_upsert_keeps_stored_values_over_placeholders(tmp_path):
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        store.upsert_many('Portsmouth', [dict(_apps()[0], status='Approved')])
+        store.upsert_many('Portsmouth', [dict(_apps()[0], status='Unknown', desc='Amended')])
+        (record,) = store.sector_records('PO1')
+    assert record['status'] == 'Approved'
+    assert record['desc'] == 'Amended'
+
+
+def test_export_removes_sectors_left_empty(tmp_path):
+    output_dir = str(tmp_path / 'data')
+    with ApplicationStore(str(tmp_path / 'store.sqlite')) as store:
+        store.upsert_many('Portsmouth', _apps()[:1])
+        store.export(output_dir)
+        store.upsert_many('Portsmouth', [dict(_apps()[0], postcode='PO2 1AA')])
+        store.export(output_dir)
+
+    assert os.listdir(os.path.join(output_dir, 'PO')) == ['PO2.json']